@@ -0,0 +1,324 @@
+# ghost/modules/api_governor.py
+"""Shared traffic control for every OpenAI call G.H.O.S.T. makes.
+
+`memory`, `utils`, `context_manager`, `speak`, `transcribe` and `chat_engine`
+all use `config.client`, each on its own: no concurrency limits, no rate
+limiting, and identical requests (the same text embedded twice in one turn)
+all went over the wire. `ApiGovernor` is the httpx transport under that
+client, so every module gets the following without call-site changes:
+
+1. **Per-endpoint concurrency** – a semaphore per endpoint (`embeddings`,
+   `chat/completions`, `audio/speech`, …); streamed responses hold their slot
+   until the body is consumed or closed, with a finalizer as a backstop for
+   streams that are dropped unclosed. Waiting for a slot gives up after
+   `acquire_timeout` seconds (`httpx.PoolTimeout`) instead of hanging.
+2. **Token-bucket rate limiting** – optional `rate` (requests/s) and `burst`
+   per endpoint; callers wait for a token instead of collecting 429s.
+3. **Singleflight** – on endpoints with `coalesce` (only the idempotent
+   `embeddings` by default), identical concurrent non-streaming requests (same
+   method, path and body) share one upstream call. With `linger_sec` a
+   finished response is also reused briefly.
+4. **Counters** – calls, coalesced calls, errors, latency, bytes in/out and
+   time spent throttled per endpoint, via `snapshot()`.
+
+Configured through config.json (all optional):
+    "openai_limits": {"embeddings": {"concurrency": 4, "rate": 20, "burst": 40},
+                      "chat/completions": {"concurrency": 2, "acquire_timeout": 60}}
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+import weakref
+from dataclasses import dataclass, fields
+from typing import Dict, Iterator, Optional
+
+import httpx
+
+
+@dataclass
+class EndpointLimits:
+    concurrency: int = 8
+    rate: float = 0.0        # requests per second; 0 = unlimited
+    burst: int = 0           # bucket size; 0 = max(1, rate)
+    coalesce: bool = False   # singleflight identical non-streaming requests (idempotent endpoints only)
+    linger_sec: float = 0.0  # reuse a finished identical response this long
+    acquire_timeout: float = 120.0  # give up waiting for a concurrency slot after this
+
+    @classmethod
+    def from_config(cls, cfg: dict, base: "EndpointLimits | None" = None) -> "EndpointLimits":
+        merged = dict(base.__dict__) if base else {}
+        merged.update({k: v for k, v in cfg.items() if k in cls.__dataclass_fields__})
+        return cls(**merged)
+
+
+_DEFAULT_LIMITS = {
+    "embeddings": EndpointLimits(concurrency=4, coalesce=True, linger_sec=2.0),
+    "chat/completions": EndpointLimits(concurrency=4),
+    "audio/speech": EndpointLimits(concurrency=2),
+    "audio/transcriptions": EndpointLimits(concurrency=2),
+}
+
+
+@dataclass
+class EndpointStats:
+    calls: int = 0            # requests that reached the upstream transport
+    coalesced: int = 0        # requests served by another in-flight / recent call
+    errors: int = 0           # transport errors and HTTP status >= 400
+    latency_ms: float = 0.0   # summed time to response headers (body for shared calls)
+    max_latency_ms: float = 0.0
+    throttled_ms: float = 0.0  # time waiting for a concurrency slot or rate token
+    bytes_out: int = 0
+    bytes_in: int = 0
+
+    def to_dict(self) -> dict:
+        out = {f.name: getattr(self, f.name) for f in fields(self)}
+        out["mean_latency_ms"] = round(self.latency_ms / self.calls, 1) if self.calls else None
+        for k in ("latency_ms", "max_latency_ms", "throttled_ms"):
+            out[k] = round(out[k], 1)
+        return out
+
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire` blocks until a token is available."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst or int(rate) or 1)
+        self._tokens = float(self.capacity)
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._t) * self.rate)
+            self._t = now
+            self._tokens -= 1  # reserve; a negative balance is a queue position
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+def endpoint_name(request: httpx.Request) -> str:
+    """``/v1/audio/speech`` → ``audio/speech`` (works behind a base_url prefix)."""
+    path = request.url.path
+    _, sep, tail = path.rpartition("/v1/")
+    return tail if sep else path.lstrip("/")
+
+
+class _Flight:
+    """One upstream call shared by identical requests."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.expires_at = 0.0
+        self.status = 0
+        self.headers: Optional[httpx.Headers] = None
+        self.raw = b""
+        self.error: Optional[BaseException] = None
+
+    def response_for(self, request: httpx.Request) -> httpx.Response:
+        if self.error is not None:
+            raise self.error
+        return httpx.Response(self.status, headers=self.headers, stream=httpx.ByteStream(self.raw), request=request)
+
+
+class _Endpoint:
+    def __init__(self, limits: EndpointLimits):
+        self.limits = limits
+        self.slots = threading.BoundedSemaphore(max(1, limits.concurrency))
+        self.bucket = TokenBucket(limits.rate, limits.burst) if limits.rate > 0 else None
+        self.stats = EndpointStats()
+        self.lock = threading.Lock()
+
+
+class _Slot:
+    """One held concurrency slot; `release` is idempotent."""
+
+    def __init__(self, sem: threading.BoundedSemaphore):
+        self._sem = sem
+        self._lock = threading.Lock()
+        self._held = True
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        self._sem.release()
+
+
+class _CountingStream(httpx.SyncByteStream):
+    """Counts streamed bytes and frees the endpoint slot when the body is done.
+
+    A stream that is dropped without being read to the end or closed (e.g. a
+    caller that bails out mid-stream) frees its slot when it is collected.
+    """
+
+    def __init__(self, inner: httpx.SyncByteStream, ep: _Endpoint, slot: _Slot):
+        self._inner = inner
+        self._ep = ep
+        self._slot = slot
+        weakref.finalize(self, slot.release)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._inner:
+            with self._ep.lock:
+                self._ep.stats.bytes_in += len(chunk)
+            yield chunk
+        self._slot.release()  # body fully read; don't wait for close()
+
+    def close(self) -> None:
+        try:
+            self._inner.close()
+        finally:
+            self._slot.release()
+
+
+class ApiGovernor(httpx.BaseTransport):
+    """httpx transport enforcing per-endpoint limits in front of *inner*."""
+
+    def __init__(self, inner: httpx.BaseTransport, limits: Dict[str, dict] | None = None):
+        self.inner = inner
+        self._config = limits or {}
+        self._endpoints: Dict[str, _Endpoint] = {}
+        self._endpoints_lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+
+    def _endpoint(self, name: str) -> _Endpoint:
+        with self._endpoints_lock:
+            ep = self._endpoints.get(name)
+            if ep is None:
+                base = _DEFAULT_LIMITS.get(name, EndpointLimits())
+                ep = self._endpoints[name] = _Endpoint(
+                    EndpointLimits.from_config(self._config.get(name, {}), base)
+                )
+            return ep
+
+    # ------------------------------------------------------------------
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        ep = self._endpoint(endpoint_name(request))
+        body = request.read()
+        with ep.lock:
+            ep.stats.bytes_out += len(body)
+
+        key = self._flight_key(request, body) if ep.limits.coalesce else None
+        if key is None:
+            return self._send(ep, request, shared=False)
+
+        now = time.monotonic()
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            expired = flight is not None and flight.done.is_set() and (
+                flight.error is not None or now > flight.expires_at
+            )
+            leader = flight is None or expired
+            if leader:
+                flight = self._flights[key] = _Flight()
+                if len(self._flights) > 256:
+                    self._prune(now)
+
+        if not leader:
+            flight.done.wait()
+            with ep.lock:
+                ep.stats.coalesced += 1
+            return flight.response_for(request)
+
+        try:
+            response = self._send(ep, request, shared=True)
+            flight.status, flight.headers = response.status_code, response.headers
+            flight.raw = b"".join(response.stream)  # raw bytes; each sharer decodes its own copy
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            flight.expires_at = time.monotonic() + ep.limits.linger_sec
+            flight.done.set()
+            if flight.error is not None or ep.limits.linger_sec <= 0 or flight.status >= 400:
+                with self._flights_lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+        return flight.response_for(request)
+
+    def _send(self, ep: _Endpoint, request: httpx.Request, shared: bool) -> httpx.Response:
+        t0 = time.perf_counter()
+        if not ep.slots.acquire(timeout=ep.limits.acquire_timeout):
+            with ep.lock:
+                ep.stats.errors += 1
+                ep.stats.throttled_ms += (time.perf_counter() - t0) * 1000
+            raise httpx.PoolTimeout(
+                f"No free {endpoint_name(request)} slot after {ep.limits.acquire_timeout:g}s", request=request
+            )
+        try:
+            if ep.bucket is not None:
+                ep.bucket.acquire()
+            t1 = time.perf_counter()
+            response = self.inner.handle_request(request)
+        except BaseException:
+            ep.slots.release()
+            with ep.lock:
+                ep.stats.errors += 1
+            raise
+
+        if shared:
+            # Read the raw (still encoded) body so every sharer can decode it
+            try:
+                raw = b"".join(response.stream)
+            finally:
+                response.stream.close()
+                ep.slots.release()
+            response = httpx.Response(response.status_code, headers=response.headers,
+                                      stream=httpx.ByteStream(raw), request=request)
+            with ep.lock:
+                ep.stats.bytes_in += len(raw)
+        else:
+            response.stream = _CountingStream(response.stream, ep, _Slot(ep.slots))
+
+        ms = (time.perf_counter() - t1) * 1000
+        with ep.lock:
+            st = ep.stats
+            st.calls += 1
+            st.errors += response.status_code >= 400
+            st.latency_ms += ms
+            st.max_latency_ms = max(st.max_latency_ms, ms)
+            st.throttled_ms += (t1 - t0) * 1000
+        return response
+
+    @staticmethod
+    def _flight_key(request: httpx.Request, body: bytes) -> Optional[str]:
+        if request.method != "POST":
+            return None
+        if request.headers.get("content-type", "").startswith("application/json"):
+            try:
+                if json.loads(body).get("stream"):
+                    return None  # streamed tokens are consumed live; never share
+            except (ValueError, AttributeError):
+                return None
+        digest = hashlib.sha1(body).hexdigest()
+        return f"{request.url.path}:{digest}"
+
+    def _prune(self, now: float) -> None:
+        for k, fl in list(self._flights.items()):
+            if fl.done.is_set() and now > fl.expires_at:
+                del self._flights[k]
+
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per-endpoint counters, e.g. for logging or the replay report."""
+        with self._endpoints_lock:
+            endpoints = dict(self._endpoints)
+        out = {}
+        for name, ep in sorted(endpoints.items()):
+            with ep.lock:
+                out[name] = ep.stats.to_dict()
+        return out
+
+    def close(self) -> None:
+        self.inner.close()
@@ -1,18 +1,48 @@
 # ghost/modules/audio_capture.py
-import os, time, wave, queue
-import pyaudio, webrtcvad, numpy as np, noisereduce as nr
+import os
+from typing import Callable
+import pyaudio, noisereduce as nr
 import soundfile as sf
 
 from ghost.modules.openai_client import config
+from ghost.modules.replay import current_recorder
+from ghost.modules.tracing import record, span
+from ghost.modules.segmenter import MIN_RMS_THRESHOLD, Endpointing, Segment, Segmenter
+
+# Reused across calls so the adaptive noise floor / pause profile carry over
+_segmenter: Segmenter | None = None
+_segmenter_key: tuple | None = None
+
+
+def _get_segmenter(key: tuple, **params) -> Segmenter:
+    global _segmenter, _segmenter_key
+    if _segmenter is None or _segmenter_key != key:
+        _segmenter = Segmenter(**params)
+        _segmenter_key = key
+    _segmenter.reset()
+    return _segmenter
 
 
 def capture_audio(
     filename: str | None = None,
     max_record: float = 15.0,
     pre_speech_ms: int = 300,
-    silence_timeout_ms: int = 1200
+    silence_timeout_ms: int = 1200,
+    on_speech_start: Callable[[], None] | None = None,
+    playing: Callable[[], bool] | None = None
 ) -> str | None:
-    """Capture clean speech only using WebRTC-VAD and denoise with noisereduce."""
+    """Capture clean speech only using WebRTC-VAD and denoise with noisereduce.
+
+    *on_speech_start* fires the moment recording triggers – used for barge-in
+    so assistant playback stops as soon as the user starts talking.
+
+    Endpointing is adaptive unless ``config["endpointing"]["adaptive"]`` is
+    false, in which case the fixed *silence_timeout_ms* applies; in adaptive
+    mode it caps the per-utterance timeout.
+    *playing* reports whether the assistant's own reply is audible; while it
+    is, the trigger needs louder and longer speech (see `Segmenter.echo`) so
+    the speaker's echo does not barge in on the reply.
+    """
 
     # ── Audio settings ─────────────────────────────────────────────────
     RATE = 16000
@@ -20,9 +50,6 @@ def capture_audio(
     FRAME_SAMPLES = RATE * FRAME_MS // 1000
     CHANNELS = 1
 
-    # RMS threshold to avoid false triggers (e.g., keyboard clicks)
-    MIN_RMS_THRESHOLD = 300  # adjust between 300-600 as needed
-
     # ── File setup ─────────────────────────────────────────────────────
     default_path = config.get("file_paths", {}).get(
         "input_audio", "audio/input.wav"
@@ -31,7 +58,22 @@ def capture_audio(
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
     # ── Initialize modules ─────────────────────────────────────────────
-    vad = webrtcvad.Vad(3)  # aggressiveness: 0-3
+    ep_cfg = config.get("endpointing", {})
+    endpointing = Endpointing.from_config(ep_cfg) if ep_cfg.get("adaptive", True) else None
+    echo = (ep_cfg.get("echo_rms_factor", 3.0), ep_cfg.get("echo_onset_ms", 150))
+    segmenter = _get_segmenter(
+        (pre_speech_ms, silence_timeout_ms, max_record, endpointing, echo),
+        rate=RATE,
+        frame_ms=FRAME_MS,
+        min_rms=MIN_RMS_THRESHOLD,
+        pre_speech_ms=pre_speech_ms,
+        silence_timeout_ms=silence_timeout_ms,
+        max_segment_ms=int(max_record * 1000),
+        batch_frames=1,
+        endpointing=endpointing,
+        echo_rms_factor=echo[0],
+        echo_onset_ms=echo[1],
+    )
     pa = pyaudio.PyAudio()
     stream = pa.open(
         format=pyaudio.paInt16,
@@ -41,47 +83,36 @@ def capture_audio(
         frames_per_buffer=FRAME_SAMPLES
     )
 
-    ring = queue.deque(maxlen=pre_speech_ms // FRAME_MS)
-    recorded: list[bytes] = []
-
     print("…waiting for speech…", end="", flush=True)
-    recording = False
-    silence_ms = 0
-    start_time = time.time()
+    segment: Segment | None = None
+    max_ms = max_record * 1000
+    rec = current_recorder()
+    raw_frames: list[bytes] = []  # only while recording a session (replay.py)
 
     try:
         while True:
             raw = stream.read(FRAME_SAMPLES, exception_on_overflow=False)
-            # Voice activity detection
-            is_speech = vad.is_speech(raw, RATE)
-
-            # Compute RMS safely
-            samples = np.frombuffer(raw, dtype=np.int16)
-            if samples.size == 0:
-                continue
-            with np.errstate(invalid='ignore'):
-                rms = np.sqrt(np.mean(samples.astype(np.float32) ** 2))
-            if np.isnan(rms):
-                continue
-
-            # Trigger recording only if VAD and RMS threshold met
-            if not recording:
-                ring.append(raw)
-                if is_speech and rms > MIN_RMS_THRESHOLD:
-                    print("\n🎙 Voice detected, recording…")
-                    recording = True
-                    recorded.extend(ring)
-                    ring.clear()
-                    silence_ms = 0
-            else:
-                recorded.append(raw)
-                silence_ms = 0 if is_speech else silence_ms + FRAME_MS
-                if silence_ms > silence_timeout_ms:
-                    print("⏹ Speech ended.")
-                    break
-
-            if time.time() - start_time > max_record:
+            if rec is not None:
+                raw_frames.append(raw)
+            if playing is not None:
+                segmenter.echo = playing()
+            was_recording = segmenter.recording
+            done = segmenter.feed(raw)
+
+            if not was_recording and segmenter.recording:
+                print("\n🎙 Voice detected, recording…")
+                if on_speech_start:
+                    on_speech_start()
+
+            if done:
+                segment = done[0]
+                print("⏹ Speech ended.")
+                break
+
+            # Frame-counted clock: the stream delivers audio in real time
+            if segmenter.elapsed_ms > max_ms:
                 print("⏹ Max duration reached.")
+                segment = (segmenter.flush() or [None])[0]
                 break
 
     finally:
@@ -89,20 +120,24 @@ def capture_audio(
         stream.close()
         pa.terminate()
 
-    if len(recorded) < 5:
+    if segment is None or segment.n_frames < 5:
         print("⚠️ Not enough speech recorded.")
         return None
+    if rec is not None:
+        rec.note_capture(b"".join(raw_frames), RATE)
+    record("vad_end", segment.eot_ms, reason=segment.reason, speech_ms=segment.end_ms - segment.start_ms)
 
     # ── Convert and denoise ────────────────────────────────────────────
-    audio_data = b"".join(recorded)
-    audio_np = np.frombuffer(audio_data, dtype=np.int16)
+    audio_np = segment.audio
 
     print("🔧 Suppressing noise…")
-    denoised = nr.reduce_noise(y=audio_np, sr=RATE)
+    with span("denoise"):
+        denoised = nr.reduce_noise(y=audio_np, sr=RATE)
 
     # ── Save to WAV ────────────────────────────────────────────────────
     try:
-        sf.write(filename, denoised, RATE, subtype="PCM_16")
+        with span("wav_write"):
+            sf.write(filename, denoised, RATE, subtype="PCM_16")
         print(f"💾 Saved → {filename}")
         return filename
     except Exception as e:
@@ -5,8 +5,9 @@ Major improvements vs. original version
 --------------------------------------
 1. **Better noise detection** – delegates entirely to `looks_intelligible`, no
    hard cutoff on length ("hi" is now accepted) and ignores leading emojis.
-2. **Conversation window management** – trims history to fit within a token
-   budget so we never exceed the model context, even on long sessions.
+2. **Conversation window management** – history is a bounded `Conversation`
+   (ring buffer + rolling summary, see `conversation.py`) so we never exceed
+   the model context, even on long sessions.
 3. **Robust OpenAI call** – retries with exponential back‑off on transient
    errors and yields a fallback message if all attempts fail.
 4. **Streaming helper** – isolates streaming logic in `_stream_completion` for
@@ -16,7 +17,7 @@ Major improvements vs. original version
 7. **Richer memory query** – uses regex so "מה אתה זוכר על" / "what do you know
    about me" variants are also detected.
 
-Usage remains identical: `for token in stream_chat(user_text, convo): ...`
+Usage: `convo = Conversation(seed)`, then `for token in stream_chat(user_text, convo): ...`
 """
 
 from __future__ import annotations
@@ -24,18 +25,16 @@ from __future__ import annotations
 import itertools
 import re
 import time
-from dataclasses import dataclass, field
 from typing import Iterable, List
 
-from ghost.modules.memory import (
-    extract_fact,
-    load_all_facts,
-    replace_or_add_fact,
-    retrieve,
-)
+from ghost.modules.memory import load_all_facts
+from ghost.modules.memory_analysis import get_analyzer
 from ghost.modules.openai_client import config as _config
 from ghost.modules.utils import looks_intelligible
 from ghost.modules.context_manager import build_context
+from ghost.modules.conversation import Conversation, Message
+from ghost.modules.tracing import record
+from ghost.modules.replay import current_recorder, foreground
 
 # ---------------------------------------------------------------------------
 #                               CONFIG ACCESS
@@ -74,15 +73,6 @@ _MEMORY_PATTERNS = re.compile(
 )
 
 
-@dataclass
-class Message:
-    role: str  # "system" | "user" | "assistant"
-    content: str
-
-    def to_dict(self):
-        return {"role": self.role, "content": self.content}
-
-
 # ---------------------------------------------------------------------------
 #                              NOISE FILTER
 # ---------------------------------------------------------------------------
@@ -111,19 +101,32 @@ def _stream_completion(messages: List[Message]) -> Iterable[str]:
     last_err: str | None = None
 
     for attempt in range(1, _MAX_RETRIES + 1):
+        t0 = time.perf_counter()  # per attempt: back-off is recorded on its own
         try:
             response = client.chat.completions.create(
                 model=_cfg("model_chat", "gpt-4o"),
                 messages=[m.to_dict() for m in messages],
                 stream=True,
             )
-            for chunk in response:
-                yield chunk.choices[0].delta.content or ""
+            first = True
+            try:
+                for chunk in response:
+                    token = chunk.choices[0].delta.content or ""
+                    if first and token:
+                        first = False
+                        record("llm_ttft", (time.perf_counter() - t0) * 1000, attempt=attempt)
+                    yield token
+            finally:
+                # Frees the connection and its chat/completions slot on errors
+                # mid-stream and when the caller stops early (barge-in)
+                response.close()
+            record("llm_total", (time.perf_counter() - t0) * 1000, attempt=attempt)
             return  # success, exit function
         except OpenAIError as exc:  # pragma: no cover
             last_err = str(exc)
             sleep = _BACKOFF_BASE ** attempt
             time.sleep(sleep)
+            record("llm_backoff", sleep * 1000, attempt=attempt, error=type(exc).__name__)
     # if we reach here, all retries failed
     yield _UNCLEAR_PROMPT + f" (api‑error: {last_err})"
 
@@ -132,8 +135,19 @@ def _stream_completion(messages: List[Message]) -> Iterable[str]:
 #                           PUBLIC ENTRY POINT
 # ---------------------------------------------------------------------------
 
-def stream_chat(user_text: str, conversation: list[dict]) -> Iterable[str]:
+def stream_chat(user_text: str, conversation: Conversation) -> Iterable[str]:
     """Stream response tokens for *user_text* while updating *conversation*."""
+    if rec := current_recorder():
+        rec.note_turn(user_text)
+    try:
+        with foreground():  # replay counts these calls against the turn
+            yield from _stream_chat(user_text, conversation)
+    finally:
+        if rec:
+            rec.note_turn_end()
+
+
+def _stream_chat(user_text: str, conversation: Conversation) -> Iterable[str]:
 
     # 0️⃣ Memory inspection command
     if _MEMORY_PATTERNS.search(user_text.lower()):
@@ -153,18 +167,16 @@ def stream_chat(user_text: str, conversation: list[dict]) -> Iterable[str]:
     # 2️⃣ Build full context (system + long-term + short-term or summary + user msg)
     messages = build_context(user_text, conversation)
 
-    # 3️⃣ Stream LLM response
+    # 3️⃣ Stream LLM response (memory analysis waits while we do)
+    analyzer = get_analyzer()
     full_reply = ""
-    for token in _stream_completion(messages):
-        full_reply += token
-        yield token
-
-    # 4️⃣ Persist short‑term history
-    conversation.extend([
-        Message("user", user_text).to_dict(),
-        Message("assistant", full_reply).to_dict(),
-    ])
-
-    # 5️⃣ Possible fact extraction
-    if fact := extract_fact(user_text, full_reply):
-        replace_or_add_fact(fact)
+    with analyzer.hold():
+        for token in _stream_completion(messages):
+            full_reply += token
+            yield token
+
+    # 4️⃣ Persist short‑term history (the only place turns are recorded)
+    conversation.add_turn(user_text, full_reply)
+
+    # 5️⃣ Fact extraction – one batched background call (memory_analysis)
+    analyzer.submit(user_text, full_reply)
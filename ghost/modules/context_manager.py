@@ -1,22 +1,28 @@
 # ghost/modules/context_manager.py
 
 from __future__ import annotations
-from typing import List
-from ghost.modules.memory import retrieve
+from typing import List, Optional, Sequence
+from ghost.modules.conversation import Conversation, Message
+from ghost.modules.retrieval_cache import get_retrieval_cache
 from ghost.modules.openai_client import config as _cfg
-
-# סף אורך לשיחה הקצרה לפני שמסכמים
-MAX_SHORT_CONVO_CHARS = 2000
+from ghost.modules.tracing import traced
 
 client = _cfg.client
 
 
-def summarize_short_term(conversation: List[dict]) -> str:
-    """סיכום של השיחה הקצרה כשהיא מתארכת מדי."""
-    text = ""
-    for msg in conversation:
-        prefix = "User" if msg["role"] == "user" else "Assistant"
-        text += f"{prefix}: {msg['content']}\n"
+@traced("summarize")
+def summarize_short_term(previous: Optional[str], messages: Sequence[Message], dropped: int = 0) -> Optional[str]:
+    """סיכום מתגלגל: הסיכום הקודם + ההודעות שנשפכו מחוץ לחלון השיחה.
+
+    *dropped* – כמה הודעות נזרקו בלי סיכום (כשהסיכום נכשל שוב ושוב).
+    מחזיר None בכישלון, כדי שהסיכום הקודם וההודעות שנשפכו יישמרו וינוסו שוב.
+    """
+    text = f"Summary so far: {previous}\n" if previous else ""
+    if dropped:
+        text += f"({dropped} earlier messages were lost and are not included.)\n"
+    for msg in messages:
+        prefix = "User" if msg.role == "user" else "Assistant"
+        text += f"{prefix}: {msg.content}\n"
 
     prompt = [
         {"role": "system", "content": (
@@ -33,36 +39,29 @@ def summarize_short_term(conversation: List[dict]) -> str:
             max_tokens=256,
             temperature=0.3
         )
-        return resp.choices[0].message.content.strip()
+        return (resp.choices[0].message.content or "").strip() or None
     except Exception as e:
         print(f"❌ Short-term summarization failed: {e}")
-        return "שיחה קודמת עם המשתמש התקבלה אך לא סוכמה בהצלחה."
+        return None
 
 
-def build_context(user_text: str, short_term: List[dict]) -> List:
+def build_context(user_text: str, short_term: Conversation) -> List[Message]:
     """יוצר את רשימת ההודעות (context) שישלחו ל־LLM, כולל זיכרון ארוך + שיחה קצרה / סיכום."""
-    # Lazy import to avoid circular dependency
-    from ghost.modules.chat_engine import Message
-
     messages: List[Message] = []
     base_prompt = _cfg.get("base_system_prompt", "אתה עוזר אישי חכם.")
 
     # 1. Prompt ראשי
     messages.append(Message("system", base_prompt))
 
-    # 2. סיכום של הזיכרון הארוך
-    memories = retrieve(user_text)
+    # 2. סיכום של הזיכרון הארוך (דרך ה-cache של הסשן, ראה retrieval_cache.py);
+    #    ההודעה + הודעות המשתמש האחרונות בקריאת embedding אחת, כדי ש"ומה איתה?" ימצא משהו
+    history = short_term.recent_text() if _cfg.get("retrieve_multi_query", True) else None
+    memories = get_retrieval_cache().retrieve(user_text, history=history)
     if memories:
-        messages.extend(Message(**m) for m in memories)
+        messages.extend(Message(m["role"], m["content"]) for m in memories)
 
-    # 3. אם השיחה קצרה → מוסיפים את כולה
-    total_chars = sum(len(m["content"]) for m in short_term)
-    if total_chars <= MAX_SHORT_CONVO_CHARS:
-        messages.extend(Message(**m) for m in short_term)
-    else:
-        # אם ארוכה מדי → סיכום במקום
-        summary = summarize_short_term(short_term)
-        messages.append(Message("system", f"[short-term summary] {summary}"))
+    # 3. השיחה הקצרה: חלון מוגבל + סיכום מתגלגל של מה שנשפך ממנו (conversation.py)
+    messages.extend(short_term.window())
 
     # 4. הודעת המשתמש הנוכחית
     messages.append(Message("user", user_text))
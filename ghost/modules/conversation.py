@@ -0,0 +1,256 @@
+# ghost/modules/conversation.py
+"""Bounded short-term conversation store.
+
+History used to be a plain ``list[dict]`` that `stream_chat` extended and
+`main.handle_interaction` appended to again, so every turn was stored twice.
+`build_context` rebuilt a `Message` dataclass from every dict on every turn,
+summarised the *whole* history on every turn once it passed the size limit,
+and the list itself grew for as long as the session lasted.
+
+1. **Single owner** – `Conversation.add_turn()` is the only way turns enter
+   history, and `stream_chat` is its only caller.
+2. **Compact messages** – `Message` uses ``__slots__`` and caches its length
+   and estimated token count, so budgets are running sums.
+3. **Ring buffer + rolling summary** – verbatim turns live in a deque bounded
+   by `max_chars` / `max_messages`. The oldest turns spill out into a pending
+   list that a background job folds into `summary` (previous summary + spilled
+   turns). Until that finishes, the most recent spilled turns stay in the
+   window verbatim, as far as `max_chars` allows, so no summary call sits on
+   the reply path. A failed summary (the summariser raises or returns None)
+   keeps both the previous summary and the spilled turns and is retried with
+   back-off. The pending list holds at most `max_messages`; while summaries
+   keep failing the oldest are dropped, and the next summary is told how
+   many. Each summary call gets at most `max_messages` / `max_chars` of it.
+4. **O(1) views** – `append` only touches the ends of the deque, and `window()`
+   returns a tuple cached until the next change.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Optional, Sequence, Tuple
+
+from ghost.modules.openai_client import config
+from ghost.modules.tracing import bind
+
+# (previous summary, spilled messages, messages dropped unsummarised) → the new
+# summary, or None (or raises) when it could not be produced
+Summarizer = Callable[[Optional[str], Sequence["Message"], int], Optional[str]]
+
+_SUMMARY_RETRIES = 3
+_SUMMARY_BACKOFF = 2.0
+
+
+class Message:
+    __slots__ = ("role", "content", "chars", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role  # "system" | "user" | "assistant"
+        self.content = content
+        self.chars = len(content)
+        self.tokens = (self.chars + 3) // 4  # 4 chars ≈ 1 token, as in chat_engine
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self) -> str:
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+
+class Conversation:
+    """Short-term history for one conversation: pinned context, ring, summary."""
+
+    def __init__(
+        self,
+        seed: Iterable[dict] = (),
+        *,
+        max_chars: int | None = None,
+        max_messages: int | None = None,
+        summarize: Summarizer | None = None,
+    ):
+        cfg = config.get("conversation", {})
+        self.max_chars = max_chars or cfg.get("max_chars", 2000)
+        self.max_messages = max_messages or cfg.get("max_messages", 40)
+        self._summarize = summarize
+        # Long-term memory seeded at the start of the conversation; never spilled
+        self.pinned: Tuple[Message, ...] = tuple(Message(m["role"], m["content"]) for m in seed)
+        self.summary: Optional[str] = None
+
+        self._ring: Deque[Message] = deque()
+        self._spill: List[Message] = []
+        self._dropped = 0  # spilled messages discarded before they were summarised
+        self._chars = 0
+        self._lock = threading.RLock()
+        self._view: Optional[Tuple[Message, ...]] = None
+        self._summarizing = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    # ------------------------------------------------------------------
+    #                              WRITES
+    # ------------------------------------------------------------------
+
+    def append(self, role: str, content: str) -> Message:
+        msg = Message(role, content)
+        with self._lock:
+            self._ring.append(msg)
+            self._chars += msg.chars
+            while len(self._ring) > 2 and (
+                self._chars > self.max_chars or len(self._ring) > self.max_messages
+            ):
+                old = self._ring.popleft()
+                self._chars -= old.chars
+                self._spill.append(old)
+            if len(self._spill) > self.max_messages:
+                # The summariser is failing or far behind: keep the pending list bounded
+                excess = len(self._spill) - self.max_messages
+                del self._spill[:excess]
+                self._dropped += excess
+            self._view = None
+            spilled = bool(self._spill)
+        if spilled:
+            self._schedule_summary()
+        return msg
+
+    def add_turn(self, user_text: str, reply: str) -> None:
+        """Record one finished user / assistant exchange."""
+        self.append("user", user_text)
+        self.append("assistant", reply)
+
+    # ------------------------------------------------------------------
+    #                               VIEWS
+    # ------------------------------------------------------------------
+
+    def window(self) -> Tuple[Message, ...]:
+        """Messages for the prompt: pinned, summary, not-yet-summarised, ring."""
+        with self._lock:
+            if self._view is None:
+                head = list(self.pinned)
+                if self.summary:
+                    head.append(Message("system", f"[short-term summary] {self.summary}"))
+                # Newest not-yet-summarised turns that still fit in max_chars;
+                # older ones are folded into the summary, just not repeated
+                room, start = self.max_chars - self._chars, len(self._spill)
+                while start and self._spill[start - 1].chars <= room:
+                    start -= 1
+                    room -= self._spill[start].chars
+                self._view = (*head, *self._spill[start:], *self._ring)
+            return self._view
+
+    def __len__(self) -> int:
+        return len(self.window())
+
+    def __iter__(self):
+        return iter(self.window())
+
+    @property
+    def chars(self) -> int:
+        return self._chars
+
+    @property
+    def tokens(self) -> int:
+        return sum(m.tokens for m in self.window())
+
+    def to_dicts(self) -> List[dict]:
+        return [m.to_dict() for m in self.window()]
+
+    def state(self) -> dict:
+        """JSON-able snapshot (pinned, summary, spill, ring) for warm restarts."""
+        with self._lock:
+            return {
+                "pinned": [[m.role, m.content] for m in self.pinned],
+                "summary": self.summary,
+                "spill": [[m.role, m.content] for m in self._spill],
+                "dropped": self._dropped,
+                "ring": [[m.role, m.content] for m in self._ring],
+            }
+
+    @classmethod
+    def from_state(cls, state: dict, **kwargs) -> "Conversation":
+        convo = cls(({"role": r, "content": c} for r, c in state.get("pinned", ())), **kwargs)
+        convo.summary = state.get("summary")
+        spill = [Message(r, c) for r, c in state.get("spill", ())]
+        convo._spill = spill[-convo.max_messages:]
+        convo._dropped = state.get("dropped", 0) + len(spill) - len(convo._spill)
+        for r, c in state.get("ring", ()):
+            msg = Message(r, c)
+            convo._ring.append(msg)
+            convo._chars += msg.chars
+        if convo._spill:
+            convo._schedule_summary()
+        return convo
+
+    def recent_text(self, turns: int = 2, max_chars: int = 200) -> str:
+        """The last few user messages, each cut to *max_chars*, as one text.
+
+        Used as a retrieval query. Assistant replies are left out: they are
+        long, and a tail of the joined text would be little else.
+        """
+        with self._lock:
+            recent = [m for m in (*self._spill, *self._ring) if m.role == "user"][-turns:]
+        return " ".join(m.content[:max_chars] for m in recent)
+
+    # ------------------------------------------------------------------
+    #                         ROLLING SUMMARY
+    # ------------------------------------------------------------------
+
+    def _schedule_summary(self) -> None:
+        with self._lock:
+            if self._summarizing:
+                return
+            self._summarizing = True
+            self._idle.clear()
+        threading.Thread(target=bind(self._summary_job), name="ghost-summary", daemon=True).start()
+
+    def _summary_job(self) -> None:
+        summarize = self._summarize
+        if summarize is None:
+            from ghost.modules.context_manager import summarize_short_term as summarize
+        failures = 0
+        while True:
+            with self._lock:
+                batch = self._next_batch()
+                previous, dropped = self.summary, self._dropped
+                if not batch:
+                    self._summarizing = False
+                    self._idle.set()
+                    return
+            try:
+                summary = summarize(previous, batch, dropped)
+            except Exception as e:
+                print(f"❌ Rolling summary failed: {e}")
+                summary = None
+            if summary is None:
+                # Keep the previous summary and the spilled turns for the retry
+                failures += 1
+                if failures >= _SUMMARY_RETRIES:
+                    with self._lock:
+                        self._summarizing = False  # retried on the next spill
+                        self._idle.set()
+                    return
+                time.sleep(_SUMMARY_BACKOFF ** failures)
+                continue
+            failures = 0
+            with self._lock:
+                # By identity: append() may have dropped some of the batch meanwhile
+                done = {id(m) for m in batch}
+                self._spill = [m for m in self._spill if id(m) not in done]
+                self._dropped = max(self._dropped - dropped, 0)
+                self.summary = summary
+                self._view = None
+
+    def _next_batch(self) -> List[Message]:
+        """Oldest pending messages, at most `max_messages` / `max_chars` (at least one)."""
+        batch, chars = [], 0
+        for m in self._spill[:self.max_messages]:
+            if batch and chars + m.chars > self.max_chars:
+                break
+            batch.append(m)
+            chars += m.chars
+        return batch
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until spilled turns have been folded into the summary."""
+        return self._idle.wait(timeout)
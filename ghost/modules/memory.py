@@ -20,22 +20,56 @@ Key upgrades vs. original implementation
 4. **Safe file writes** – tmp file + atomic replace to avoid corruption.
 
 5. **Config hot-reload** – same pattern as new chat_engine.
+
+6. **Pluggable embeddings** – `EmbeddingBackend` with an OpenAI implementation
+   and local CPU ones (`LocalModelEmbedder`: NumPy token-vector model loaded
+   from an `.npz`; `HashingEmbedder`: hashed word + char n-gram projection, no
+   files at all). Each record stores the backend that produced its vector
+   (`"b"`); vectors from another backend are ignored until migrated with
+   `python -m ghost.modules.memory reembed`.
+
+7. **In-process index** – the store is parsed once into a normalised vector
+   matrix and reused until the file changes, so `retrieve` is one embedding
+   plus one matrix-vector product (sub-millisecond with a local backend).
+
+8. **Bounded retention** – retrieve hits are counted (`hits` / `last`) and a
+   background `Retainer` (see `retention.py`) evicts the lowest keep-score,
+   unpinned facts in small batches whenever the store exceeds its item or
+   byte budget.
+
+9. **Multi-process safety** – reads come from versioned, immutable mmap
+   snapshots and all writes go through `store.VersionedStore`'s single queued
+   writer under a cross-process file lock; the index refreshes only when a new
+   version is announced.
+
+10. **Compact vectors** – embeddings stay as raw JSON in the mmap snapshot
+    (`RawJSON`) instead of Python float lists. `embed_quantize` ("float32",
+    "float16" or "int8") sets the precision of the in-RAM scan matrix;
+    quantised scans shortlist and the shortlist is rescored at full precision.
+    `python -m ghost.modules.memory quant-bench` reports the trade-off.
 """
 
 from __future__ import annotations
 
-import json
 import re
-import tempfile
+import sys
+import threading
 import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from pathlib import Path
-from typing import Final, List, Tuple
+from typing import Callable, Dict, Final, List, Tuple
 
 import numpy as np
 from difflib import SequenceMatcher
 from unidecode import unidecode
 
 from ghost.modules.openai_client import config as _cfg
+from ghost.modules.retention import Retainer, RetentionPolicy, plan_eviction
+from ghost.modules.store import RawJSON, VersionedStore
+from ghost.modules.text_index import TextIndex
+from ghost.modules.tracing import traced
 
 # ---------------------------------------------------------------------------
 #                              CONFIG & CONSTANTS
@@ -49,6 +83,9 @@ client = _cfg.client
 EMBED_MODEL: Final = C("model_embed", "text-embedding-3-small")
 DB_FILE: Final = Path(C("memory_store_path", "ghost/memory_store.jsonl"))
 
+# Records written before backends were tracked all came from OpenAI
+_LEGACY_BACKEND: Final = f"openai:{EMBED_MODEL}"
+
 # ---------------------------------------------------------------------------
 #                               TEXT UTILS
 # ---------------------------------------------------------------------------
@@ -65,9 +102,131 @@ def _fingerprint(text: str) -> str:
 #                           EMBEDDING & SIMILARITY
 # ---------------------------------------------------------------------------
 
+class EmbeddingBackend(ABC):
+    """Turns texts into L2-normalised float32 vectors, shape ``(n, dim)``."""
+
+    name: str = "base"
+    # Similarity scales differ per backend, so each carries its own cut-offs
+    retrieve_threshold: float = 0.75
+    dedup_threshold: float = 0.82
+    cache_radius: float = 0.92  # queries this close share retrieval results
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+
+def _normalise(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+class OpenAIEmbedder(EmbeddingBackend):
+    def __init__(self, model: str = EMBED_MODEL):
+        self.model = model
+        self.name = f"openai:{model}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        resp = client.embeddings.create(model=self.model, input=list(texts))
+        mat = np.array([d.embedding for d in resp.data], dtype=np.float32)
+        return _normalise(mat)
+
+
+class HashingEmbedder(EmbeddingBackend):
+    """Signed feature hashing of words + char n-grams; needs no model file."""
+
+    retrieve_threshold = 0.3
+    dedup_threshold = 0.7
+    cache_radius = 0.8
+
+    def __init__(self, dim: int = 512, ngrams: Tuple[int, ...] = (3, 4)):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.name = f"hash-ngram:{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _fingerprint(text).split()
+        feats = [f"w:{w}" for w in words]
+        for w in words:
+            padded = f" {w} "
+            for n in self.ngrams:
+                feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return feats
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            h = np.fromiter(
+                (zlib.crc32(f.encode()) for f in self._features(text)), dtype=np.uint32
+            )
+            if not h.size:
+                continue
+            sign = np.where(h & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], (h % self.dim).astype(np.intp), sign)
+        return _normalise(out)
+
+
+class LocalModelEmbedder(EmbeddingBackend):
+    """Static token-vector model (``.npz`` with ``tokens`` and ``vectors``).
+
+    Tokens are matched on the same ASCII-folded fingerprint used for dedup and
+    mean-pooled; texts with no known token fall back to feature hashing in the
+    same dimension.
+    """
+
+    retrieve_threshold = 0.5
+    dedup_threshold = 0.85
+
+    def __init__(self, path: str | Path):
+        data = np.load(path, allow_pickle=False)
+        self.vectors = data["vectors"].astype(np.float32)
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(data["tokens"].tolist())}
+        self.name = f"local:{Path(path).stem}:{self.vectors.shape[1]}"
+        self._fallback = HashingEmbedder(dim=self.vectors.shape[1])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.vectors.shape[1]), dtype=np.float32)
+        for row, text in enumerate(texts):
+            ids = [self.vocab[w] for w in _fingerprint(text).split() if w in self.vocab]
+            if ids:
+                out[row] = self.vectors[ids].mean(axis=0)
+            else:
+                out[row] = self._fallback.embed([text])[0]
+        return _normalise(out)
+
+
+def make_backend(kind: str | None = None) -> EmbeddingBackend:
+    """Build the backend named by *kind* (default: ``config["embed_backend"]``)."""
+    kind = kind or C("embed_backend", "openai")
+    if kind == "openai":
+        return OpenAIEmbedder()
+    if kind == "local":
+        path = C("embed_model_path", None)
+        if path and Path(path).exists():
+            return LocalModelEmbedder(path)
+        return HashingEmbedder(dim=C("embed_hash_dim", 512))
+    if kind == "hash":
+        return HashingEmbedder(dim=C("embed_hash_dim", 512))
+    raise ValueError(f"Unknown embedding backend: {kind}")
+
+
+_backend: EmbeddingBackend | None = None
+
+
+def get_backend() -> EmbeddingBackend:
+    global _backend
+    if _backend is None:
+        _backend = make_backend()
+    return _backend
+
+
+@traced("embed")
+def _embed_vec(text: str) -> np.ndarray:
+    return get_backend().embed([text])[0]
+
 def _embed(text: str) -> List[float]:
-    resp = client.embeddings.create(model=EMBED_MODEL, input=[text])
-    return resp.data[0].embedding
+    return _embed_vec(text).tolist()
 
 def _cosine(a: List[float], b: List[float]) -> float:
     a, b = np.array(a), np.array(b)
@@ -79,65 +238,450 @@ def _cosine(a: List[float], b: List[float]) -> float:
 #                               DATA MODEL
 # ---------------------------------------------------------------------------
 
-SIM_THRESHOLD = 0.82  # semantic similarity for replacement
+SIM_THRESHOLD = 0.82  # semantic similarity for replacement (OpenAI backend)
 FUZZY_THRESHOLD = 0.85  # cheap ratio before embedding
 
+def _as_vec(v) -> np.ndarray:
+    """Stored vector (list, array or lazy `RawJSON`) as float32."""
+    if isinstance(v, RawJSON):
+        v = v.load()
+    return np.asarray(v, dtype=np.float32)
+
+
 class MemoryItem(dict):
     """Convenience wrapper so we can write item.slot etc."""
     @property
     def text(self) -> str:
         return self["text"]
     @property
-    def v(self) -> List[float]:
-        return self["v"]
+    def v(self) -> np.ndarray:
+        return _as_vec(self["v"])
     @property
     def slot(self) -> str:
         return self.get("slot", "generic")
     @property
     def fp(self) -> str:
         return self["fp"]
+    @property
+    def backend(self) -> str:
+        return self.get("b", _LEGACY_BACKEND)
 
 # ---------------------------------------------------------------------------
 #                         LOW-LEVEL FILE READ / WRITE
 # ---------------------------------------------------------------------------
 
+# Versioned, multi-process safe store (see store.py). Readers use immutable
+# mmap snapshots; every write is a mutation applied by the single writer to
+# the latest version under a cross-process file lock.
+_store = VersionedStore(DB_FILE, factory=MemoryItem, raw_fields=("v",))
+_store.on_commit(TextIndex(DB_FILE).sync)  # keyword index for memory_browser
+
+
 def _load_all() -> List[MemoryItem]:
-    if not DB_FILE.exists():
-        return []
-    return [MemoryItem(json.loads(line)) for line in DB_FILE.read_text("utf-8").splitlines()]
+    """Fresh (shallow-copied) items, served from the in-process index."""
+    return [MemoryItem(it) for it in _index().items]
+
+
+def _write(fn: Callable[[List[MemoryItem]], bool]) -> bool:
+    """Apply *fn* to the latest items via the store's writer; True if it changed them."""
+    def mutate(items: List[MemoryItem]) -> bool:
+        changed = fn(items)
+        if changed:
+            _apply_access(items)
+        return changed
+    return _store.update(mutate)
+
+# ---------------------------------------------------------------------------
+#                      RETENTION: access stats & eviction
+# ---------------------------------------------------------------------------
 
-def _atomic_write(items: List[MemoryItem]):
-    with tempfile.NamedTemporaryFile("w", delete=False, encoding="utf-8") as tmp:
+_access_lock = threading.Lock()
+_access: Dict[str, List[float]] = {}  # fp → [pending hits, last access]
+_access_pending = 0
+_ACCESS_FLUSH_EVERY = 50  # persist hit counters after this many hits
+
+
+def _note_access(items: List[MemoryItem]) -> None:
+    """Count retrieve hits in memory; they are persisted with the next write."""
+    global _access_pending
+    now = time.time()
+    with _access_lock:
         for it in items:
-            tmp.write(json.dumps(it) + "\n")
-    Path(tmp.name).replace(DB_FILE)
+            rec = _access.setdefault(it.fp, [0, now])
+            rec[0] += 1
+            rec[1] = now
+        _access_pending += len(items)
+        dirty = _access_pending >= _ACCESS_FLUSH_EVERY
+    if dirty:
+        _retainer.notify()
+
+
+def _apply_access(items: List[MemoryItem]) -> None:
+    global _access_pending
+    with _access_lock:
+        if not _access:
+            return
+        pending = dict(_access)
+        _access.clear()
+        _access_pending = 0
+    for it in items:
+        rec = pending.get(it.get("fp"))
+        if rec:
+            it["hits"] = it.get("hits", 0) + int(rec[0])
+            it["last"] = max(it.get("last", 0.0), rec[1])
+
+
+def _evict_batch(limit: int) -> int:
+    """One incremental retention pass; returns the number of facts evicted."""
+    idx = _index()
+    drop = {idx.items[i].fp for i in plan_eviction(idx.items, idx.sizes, _retention, limit=limit)}
+    with _access_lock:
+        flush = _access_pending >= _ACCESS_FLUSH_EVERY
+    if not drop and not flush:
+        return 0
+
+    removed = 0
+
+    def mutate(items: List[MemoryItem]) -> bool:
+        nonlocal removed
+        before = len(items)
+        items[:] = [it for it in items if it.get("fp") not in drop]
+        removed = before - len(items)
+        return bool(removed) or flush
+
+    _write(mutate)
+    return removed
+
+
+_retention = RetentionPolicy.from_config(C("retention", {}))
+_retainer = Retainer(_retention, _evict_batch)
 
 # ---------------------------------------------------------------------------
-#                        PUBLIC WRITE: replace_or_add_fact
+#                           IN-PROCESS VECTOR INDEX
 # ---------------------------------------------------------------------------
 
-def replace_or_add_fact(fact: str) -> bool:
-    """
-    Insert or replace *fact* based on slot & similarity.
-    Returns True if a new fact was added or an existing one overwritten; False if skipped.
+# Scan matrix precision: "float32" (exact), "float16" or "int8" (per-row scale)
+_QUANTIZE: Final = C("embed_quantize", "float32")
+_DTYPES: Final = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# How far a quantised score may undershoot the exact one (shortlist slack)
+_MARGIN: Final = {"float32": 0.0, "float16": 0.005, "int8": 0.02}
+_SCAN_CHUNK = 2048   # rows widened to float32 at a time (stays in cache)
+_RESCORE_MIN = 32     # shortlist size for exact rescoring in retrieve
+
+_vec_cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+_vec_cache_lock = threading.Lock()
+_VEC_CACHE_SIZE = 2048
+
+
+def _quantize(mat: np.ndarray, kind: str) -> Tuple[np.ndarray, np.ndarray | None]:
+    """Normalised float32 rows → (scan matrix, per-row scale or None)."""
+    if kind == "int8":
+        scale = np.abs(mat).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        return np.rint(mat / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+    return mat.astype(_DTYPES[kind], copy=False), None
+
+
+class _Index:
+    """Parsed store + compact matrix of the vectors made by the active backend.
+
+    Items keep their embeddings as lazy `RawJSON`; only the scan matrix lives
+    in RAM. With `kind` float16 / int8 the scan just shortlists, and `search`
+    rescores the shortlist with full-precision vectors parsed on demand.
+    Rows whose (fp, backend) were in the previous index are copied from it
+    rather than re-parsed, so a rebuild after one write is cheap.
     """
-    # Step 1 – fingerprint & quick exact/fuzzy dedup
-    fp = _fingerprint(fact)
-    items = _load_all()
 
-    # אם כבר קיים fingerprint מדויק – דילוג
-    if any(it.fp == fp for it in items):
+    def __init__(
+        self,
+        items: List[MemoryItem],
+        sizes: List[int],
+        backend: str,
+        version: int = 0,
+        kind: str = "float32",
+        prev: "_Index | None" = None,
+    ):
+        self.items = items
+        self.sizes = sizes
+        self.backend = backend
+        self.version = version
+        self.kind = kind
+        self.margin = _MARGIN[kind]
+        if prev is not None and (prev.kind != kind or prev.backend != backend):
+            prev = None
+        dim = prev.mat.shape[1] if prev is not None and prev.mat.size else None
+
+        keep: List[int] = []
+        reuse_src: List[int] = []
+        reuse_dst: List[int] = []
+        fresh: List[np.ndarray] = []
+        fresh_dst: List[int] = []
+        for i, it in enumerate(items):
+            if it.backend != backend or "v" not in it:
+                continue
+            p = prev.pos.get((it.get("fp"), backend)) if prev is not None else None
+            if p is not None:
+                reuse_src.append(p)
+                reuse_dst.append(len(keep))
+            else:
+                vec = it.v
+                dim = dim or vec.size
+                if vec.size != dim or not vec.any():
+                    continue
+                fresh.append(vec)
+                fresh_dst.append(len(keep))
+            keep.append(i)
+
+        n = len(keep)
+        self.rows = np.array(keep, dtype=np.intp)
+        self.mat = np.zeros((n, dim or 0), dtype=_DTYPES[kind])
+        self.scale = np.ones(n, dtype=np.float32) if kind == "int8" else None
+        if reuse_src:
+            self.mat[reuse_dst] = prev.mat[reuse_src]
+            if self.scale is not None:
+                self.scale[reuse_dst] = prev.scale[reuse_src]
+        if fresh:
+            q, scale = _quantize(_normalise(np.stack(fresh)), kind)
+            self.mat[fresh_dst] = q
+            if scale is not None:
+                self.scale[fresh_dst] = scale
+        self.t = np.array([items[i]["t"] for i in keep], dtype=np.float64)
+        self._finish()
+
+    def _finish(self) -> None:
+        self.pos = {(self.items[i].get("fp"), self.backend): j for j, i in enumerate(self.rows)}
+        self.stale = len(self.items) - len(self.rows)
+
+    @classmethod
+    def restore(cls, items, sizes, backend, version, kind, arrays: Dict[str, np.ndarray]) -> "_Index":
+        """Rebuild from arrays saved by `index_state` without touching any vector."""
+        self = cls.__new__(cls)
+        self.items, self.sizes, self.backend, self.version = items, sizes, backend, version
+        self.kind, self.margin = kind, _MARGIN[kind]
+        self.rows, self.mat, self.t = arrays["rows"], arrays["mat"], arrays["t"]
+        self.scale = arrays.get("scale")
+        self._finish()
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        return self.mat.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def scan(self, qvecs: np.ndarray) -> np.ndarray:
+        """Approximate (exact for float32) cosine of every row with each query, ``(n, m)``."""
+        if self.kind == "float32":
+            return self.mat @ qvecs.T
+        out = np.empty((len(self.mat), len(qvecs)), dtype=np.float32)
+        for lo in range(0, len(self.mat), _SCAN_CHUNK):
+            block = self.mat[lo:lo + _SCAN_CHUNK].astype(np.float32)
+            out[lo:lo + len(block)] = block @ qvecs.T
+        if self.scale is not None:
+            out *= self.scale[:, None]
+        return out
+
+    def vectors(self, js: np.ndarray) -> np.ndarray:
+        """Full-precision normalised vectors for index rows *js* (parsed + cached)."""
+        if self.kind == "float32":
+            return self.mat[js]
+        vecs = []
+        for j in js:
+            it = self.items[self.rows[j]]
+            key = (it.get("fp"), self.backend)
+            with _vec_cache_lock:
+                vec = _vec_cache.get(key)
+                if vec is not None:
+                    _vec_cache.move_to_end(key)
+            if vec is None:
+                vec = _normalise(it.v[None, :])[0]
+                with _vec_cache_lock:
+                    _vec_cache[key] = vec
+                    if len(_vec_cache) > _VEC_CACHE_SIZE:
+                        _vec_cache.popitem(last=False)
+            vecs.append(vec)
+        return np.stack(vecs) if vecs else np.zeros((0, self.mat.shape[1]), dtype=np.float32)
+
+    def search(
+        self,
+        qvecs: np.ndarray,
+        threshold: float,
+        limit: int | None = None,
+        weights: np.ndarray | None = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Index rows whose exact fused similarity ≥ *threshold*: ``(rows, sims, vectors)``.
+
+        *qvecs* holds one query per row; scores are fused by weighted max
+        (see `_fuse`). At most *limit* rows, best approximate scores first,
+        survive the scan; quantised kinds shortlist with `margin` slack and
+        rescore the shortlist exactly.
+        """
+        qvecs = np.atleast_2d(qvecs)
+        if not self.rows.size:
+            return self.rows, np.zeros(0, dtype=np.float32), np.zeros((0, qvecs.shape[1]), dtype=np.float32)
+        approx = _fuse(self.scan(qvecs), weights)
+        js = np.flatnonzero(approx >= threshold - self.margin)
+        if limit is not None and js.size > limit:
+            js = js[np.argpartition(-approx[js], limit - 1)[:limit]]
+        vecs = self.vectors(js)
+        if self.kind == "float32":
+            return js, approx[js], vecs
+        sims = _fuse(vecs @ qvecs.T, weights)
+        ok = sims >= threshold
+        return js[ok], sims[ok], vecs[ok]
+
+
+def _fuse(sims: np.ndarray, weights: np.ndarray | None) -> np.ndarray:
+    """``(n, m)`` per-query similarities → ``(n,)``: best weighted match per row."""
+    if weights is None:
+        return sims.max(axis=1)
+    return (sims * weights).max(axis=1)
+
+
+def _mmr(relevance: np.ndarray, vecs: np.ndarray, k: int, lam: float) -> np.ndarray:
+    """Greedy maximal-marginal-relevance order of the first *k* candidates.
+
+    One ``C×C`` similarity product up front; each step is a vector update of
+    every candidate's redundancy (max similarity to anything picked so far).
+    """
+    n = len(relevance)
+    if lam >= 1.0 or n <= 1:
+        return np.argsort(-relevance, kind="stable")[:k]
+    sim = vecs @ vecs.T
+    first = int(np.argmax(relevance))
+    chosen = [first]
+    redundancy = sim[first].copy()
+    open_ = np.ones(n, dtype=bool)
+    open_[first] = False
+    while len(chosen) < min(k, n):
+        score = lam * relevance - (1.0 - lam) * redundancy
+        score[~open_] = -np.inf
+        j = int(np.argmax(score))
+        chosen.append(j)
+        open_[j] = False
+        np.maximum(redundancy, sim[j], out=redundancy)
+    return np.array(chosen, dtype=np.intp)
+
+
+_index_lock = threading.Lock()
+_index_cache: _Index | None = None
+_index_dirty = True
+_warned_stale = False
+
+
+def _on_new_version(version: int) -> None:
+    """Store change notification: refresh lazily, then let retention look."""
+    global _index_dirty
+    _index_dirty = True
+    _retainer.notify()
+
+
+_store.subscribe(_on_new_version)
+
+
+def _index() -> _Index:
+    """Return the cached index; rebuilt only after a new store version lands."""
+    global _index_cache, _index_dirty, _warned_stale
+    backend = get_backend().name
+    with _index_lock:
+        if _index_cache is None or _index_dirty or _index_cache.backend != backend:
+            _store.watch(C("memory_watch_interval", 0.5))
+            _index_dirty = False
+            snap = _store.snapshot()
+            _index_cache = _Index(snap.items, snap.sizes, backend, snap.version, _QUANTIZE, prev=_index_cache)
+            if _index_cache.stale and not _warned_stale:
+                _warned_stale = True
+                print(
+                    f"⚠️ {_index_cache.stale} memories were embedded by another backend and are "
+                    f"ignored; run `python -m ghost.modules.memory reembed` to migrate."
+                )
+        return _index_cache
+
+def index_state() -> Tuple[dict, Dict[str, np.ndarray]]:
+    """The current index as ``(JSON-able meta, arrays)``.
+
+    Items are saved without their vectors: a `RawJSON` vector is stored as
+    its byte span in the snapshot file it came from, together with that
+    file's size and mtime (`Snapshot.file_id`).
+    """
+    idx = _index()
+    snap = _store.snapshot()
+    file_id = snap.file_id if snap.version == idx.version else None
+    items, spans = [], []
+    for it in idx.items:
+        v = it.get("v")
+        meta = {k: x for k, x in it.items() if k != "v"}
+        if isinstance(v, RawJSON):
+            spans.append(list(v.span))
+        else:
+            spans.append(None)
+            if v is not None:
+                meta["v"] = np.asarray(v).tolist()
+        items.append(meta)
+    meta = {
+        "store": str(DB_FILE), "version": idx.version, "backend": idx.backend, "kind": idx.kind,
+        "items": items, "spans": spans, "sizes": list(idx.sizes),
+        "file": list(file_id) if file_id else None,
+    }
+    arrays = {"mat": idx.mat, "rows": idx.rows, "t": idx.t}
+    if idx.scale is not None:
+        arrays["scale"] = idx.scale
+    return meta, arrays
+
+
+def vec_cache_state() -> Tuple[List[str], np.ndarray | None]:
+    """Rescoring vectors of the active backend: ``([fingerprint, ...], (n, dim))``."""
+    backend = get_backend().name
+    with _vec_cache_lock:
+        cached = [(fp, v) for (fp, b), v in _vec_cache.items() if b == backend]
+    if not cached:
+        return [], None
+    return [fp for fp, _ in cached], np.stack([v for _, v in cached])
+
+
+def restore_vec_cache(backend: str, fps: List[str], vecs: np.ndarray) -> None:
+    with _vec_cache_lock:
+        for fp, v in zip(fps, vecs):
+            _vec_cache[(fp, backend)] = v
+        while len(_vec_cache) > _VEC_CACHE_SIZE:
+            _vec_cache.popitem(last=False)
+
+
+def restore_index(meta: dict, arrays: Dict[str, np.ndarray]) -> bool:
+    """Install an index saved by `index_state`; True if it matches the store as is.
+
+    A saved index from an older store version is still installed, marked
+    dirty: the next `_index()` rebuild copies every unchanged row from it and
+    parses only the vectors that are new. Saved byte spans are reused only
+    if the snapshot file is still the one they were taken from: the same
+    version *and* size / mtime, since version 0 is the mutable legacy file.
+    """
+    global _index_cache, _index_dirty
+    backend = get_backend().name
+    if meta.get("store") != str(DB_FILE) or meta.get("backend") != backend or meta.get("kind") != _QUANTIZE:
         return False
+    snap = _store.snapshot()
+    fresh = (
+        snap.version == meta["version"]
+        and snap.file_id is not None
+        and list(snap.file_id) == meta.get("file")
+    )
+    items = []
+    for m, span in zip(meta["items"], meta["spans"]):
+        it = MemoryItem(m)
+        if span is not None and fresh:
+            it["v"] = snap.raw(*span)
+        items.append(it)
+    idx = _Index.restore(items, meta["sizes"], backend, meta["version"], _QUANTIZE, arrays)
+    with _index_lock:
+        _store.watch(C("memory_watch_interval", 0.5))
+        _index_cache = idx
+        _index_dirty = not fresh
+    return fresh
 
-    # בדיקת דמיון fuzzy לפני embedding
-    for it in items:
-        if SequenceMatcher(None, fp, it.fp).ratio() >= FUZZY_THRESHOLD:
-            it["text"] = fact  # overwrite wording
-            it["fp"] = fp
-            _atomic_write(items)
-            return True
+# ---------------------------------------------------------------------------
+#                        PUBLIC WRITE: replace_or_add_fact
+# ---------------------------------------------------------------------------
 
-    # Step 2 – קבלת slot
+def _classify_slot(fact: str) -> str:
     slot_prompt = [
         {"role": "system", "content": (
             "Classify the user fact into a SHORT slot label like NAME, LOCATION, PREF, HABIT, OTHER. "
@@ -152,86 +696,322 @@ def replace_or_add_fact(fact: str) -> bool:
             max_tokens=1,
             temperature=0,
         )
-        slot = resp.choices[0].message.content.strip().upper() or "GENERIC"
+        return resp.choices[0].message.content.strip().upper() or "GENERIC"
     except Exception:
-        slot = "GENERIC"
+        return "GENERIC"
 
-    # Step 3 – semantic dedup בתוך אותו slot
-    new_vec = _embed(fact)
-    for it in items:
-        if it.slot == slot and _cosine(new_vec, it.v) >= SIM_THRESHOLD:
-            it["text"] = fact
-            it["v"] = new_vec
-            it["fp"] = fp
-            _atomic_write(items)
-            return True
 
-    # Step 4 – אף בדיקה לא התאימה, מוסיף חדש
-    items.append(MemoryItem({"t": time.time(), "text": fact, "v": new_vec, "slot": slot, "fp": fp}))
-    _atomic_write(items)
-    return True
+@traced("replace_or_add_fact")
+def replace_or_add_fact(fact: str, slot: str | None = None) -> bool:
+    """
+    Insert or replace *fact* based on slot & similarity.
+    Returns True if a new fact was added or an existing one overwritten; False if skipped.
+
+    Pass *slot* when it is already known (e.g. from `memory_analysis`) to skip
+    the slot-classifier round trip.
+
+    Checks run against the current snapshot without locking; the network work
+    (slot label, embedding) happens before the write, and the final mutation
+    re-validates against the latest version inside the store's writer.
+    """
+    # Step 1 – fingerprint & quick exact/fuzzy dedup
+    fp = _fingerprint(fact)
+    items = _index().items
+
+    # אם כבר קיים fingerprint מדויק – דילוג
+    if any(it.fp == fp for it in items):
+        return False
+
+    # בדיקת דמיון fuzzy לפני embedding
+    for it in items:
+        if SequenceMatcher(None, fp, it.fp).ratio() >= FUZZY_THRESHOLD:
+            target = it.fp
+
+            def reword(latest: List[MemoryItem]) -> bool:
+                if any(x.fp == fp for x in latest):
+                    return False
+                for x in latest:
+                    if x.fp == target:
+                        x["text"] = fact  # overwrite wording
+                        x["fp"] = fp
+                        return True
+                return False
+
+            return _write(reword)
+
+    # Step 2 – קבלת slot (unless the caller already knows it)
+    slot = slot.strip().upper() if slot else _classify_slot(fact)
+
+    backend = get_backend().name
+    sim_threshold = get_backend().dedup_threshold
+    qvec = _embed_vec(fact)
+    new_vec = qvec.tolist()
+
+    # Step 3a – semantic candidates from the index (first match in store order)
+    idx = _index()
+    js, _, _ = idx.search(qvec, sim_threshold)
+    same_slot = sorted(int(idx.rows[j]) for j in js if idx.items[idx.rows[j]].slot == slot)
+    target = idx.items[same_slot[0]].fp if same_slot else None
+
+    def overwrite(it: MemoryItem) -> bool:
+        it["text"] = fact
+        it["v"] = new_vec
+        it["fp"] = fp
+        it["b"] = backend
+        return True
+
+    def upsert(latest: List[MemoryItem]) -> bool:
+        if any(it.fp == fp for it in latest):
+            return False
+        # Step 3b – semantic dedup בתוך אותו slot (facts newer than the index checked directly)
+        for it in latest:
+            if target is not None and it.get("fp") == target:
+                return overwrite(it)
+        for it in latest:
+            if (it.get("fp"), backend) in idx.pos or it.slot != slot or it.backend != backend:
+                continue
+            if _cosine(new_vec, it.v) >= sim_threshold:
+                return overwrite(it)
+        # Step 4 – אף בדיקה לא התאימה, מוסיף חדש
+        latest.append(MemoryItem({"t": time.time(), "text": fact, "v": new_vec, "slot": slot, "fp": fp, "b": backend}))
+        return True
+
+    return _write(upsert)
 
 # ---------------------------------------------------------------------------
 #                           PUBLIC READ: retrieve
 # ---------------------------------------------------------------------------
 
-def retrieve(query: str, k: int = 4, threshold: float = 0.75):
-    qvec = _embed(query)
-    items = _load_all()
-    scored: List[Tuple[float, MemoryItem]] = []
-    for it in items:
-        sim = _cosine(qvec, it.v)
-        if sim >= threshold:
-            age_factor = 1.0 - min((time.time() - it["t"]) / (30 * 24 * 3600), 1.0) * 0.02
-            scored.append((sim * age_factor, it))
-    scored.sort(key=lambda x: x[0], reverse=True)
+@traced("embed")
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """Normalised query vectors from the active backend, one batched call."""
+    return get_backend().embed(list(texts))
+
+
+def store_version() -> int:
+    """Version of the store the in-process index currently reflects."""
+    return _index().version
+
+
+def on_store_change(callback: Callable[[int], None]) -> None:
+    """*callback(version)* runs (on a store thread) whenever the store changes."""
+    _store.subscribe(callback)
+
+
+def search(
+    qvecs: np.ndarray,
+    k: int = 4,
+    threshold: float | None = None,
+    weights: List[float] | None = None,
+    mmr_lambda: float | None = None,
+) -> Tuple[int, List[MemoryItem]]:
+    """Top-*k* unique facts for one or more query vectors, with the store version.
 
+    Each row of *qvecs* is a query (e.g. the current message and the recent
+    turns, embedded in one batch); a fact's relevance is its best weighted
+    similarity to any of them, times a small age factor. The final *k* are
+    picked by MMR so reworded near-duplicates don't fill every slot
+    (``mmr_lambda`` 1.0 = plain ranking).
+
+    Does not count as an access; `use_memories` does that for facts that
+    actually reach a prompt.
+    """
+    if threshold is None:
+        threshold = C("retrieve_threshold", get_backend().retrieve_threshold)
+    if mmr_lambda is None:
+        mmr_lambda = C("retrieve_mmr_lambda", 0.7)
+    w = None if weights is None else np.asarray(weights, dtype=np.float32)
+    idx = _index()
+    if not idx.rows.size:
+        return idx.version, []
+    hits, sims, vecs = idx.search(qvecs, threshold, limit=max(k * 8, _RESCORE_MIN), weights=w)
+    age_factor = 1.0 - np.minimum((time.time() - idx.t[hits]) / (30 * 24 * 3600), 1.0) * 0.02
+    scores = sims * age_factor
+
+    # One candidate per fingerprint (the best scoring), then diversify
+    order = np.argsort(-scores, kind="stable")
     seen_fps = set()
-    out = []
-    for _, it in scored:
-        if it.fp in seen_fps:
-            continue
-        out.append({"role": "system", "content": f"[memory] {it.text}"})
-        seen_fps.add(it.fp)
-        if len(out) >= k:
-            break
-    return out
+    keep = []
+    for r in order:
+        fp = idx.items[idx.rows[hits[r]]].fp
+        if fp not in seen_fps:
+            seen_fps.add(fp)
+            keep.append(r)
+    keep = np.array(keep, dtype=np.intp)
+    picked = keep[_mmr(scores[keep], vecs[keep], k, mmr_lambda)] if keep.size else keep
+    return idx.version, [idx.items[idx.rows[hits[r]]] for r in picked]
+
+
+def use_memories(items: List[MemoryItem]) -> List[dict]:
+    """Prompt messages for *items*, counting each as a retrieve hit."""
+    if items:
+        _note_access(items)
+    return [{"role": "system", "content": f"[memory] {it.text}"} for it in items]
+
+
+@traced("retrieve")
+def retrieve(query: str, k: int = 4, threshold: float | None = None):
+    if not _index().rows.size:
+        return []
+    _, items = search(_embed_vec(query), k, threshold)
+    return use_memories(items)
 
 # ---------------------------------------------------------------------------
-#                    FACT EXTRACTION
+#                                UTIL: dump
 # ---------------------------------------------------------------------------
 
-def extract_fact(user_msg: str, assistant_msg: str) -> str | None:
-    prompt = [
-        {
-            "role": "system",
-            "content": C(
-                "memory_extraction_prompt",
-                (
-                    "You're a memory engine. If the user or assistant message contains a stable, useful personal "
-                    "fact about the user (name, location, preference, etc.), extract it as one concise sentence; "
-                    "otherwise reply NULL."
-                ),
-            ),
-        },
-        {"role": "user", "content": f"User: {user_msg}\nAssistant: {assistant_msg}"},
-    ]
-    try:
-        resp = client.chat.completions.create(
-            model=C("model_memory_extract", "gpt-4o"),
-            messages=prompt,
-            max_tokens=32,
-            temperature=0,
-        )
-        result = resp.choices[0].message.content.strip()
-        return None if result.lower() == "null" else result
-    except Exception as e:
-        print(f"❌ Memory extraction error: {e}")
-        return None
+def load_all_facts() -> List[str]:
+    return [it.text for it in _index().items]
 
 # ---------------------------------------------------------------------------
-#                                UTIL: dump
+#                     MIGRATION: re-embed with a backend
 # ---------------------------------------------------------------------------
 
-def load_all_facts() -> List[str]:
-    return [it.text for it in _load_all()]
+def reembed_store(backend: EmbeddingBackend | None = None, batch: int = 64) -> int:
+    """Re-embed every fact not yet produced by *backend*; returns how many changed.
+
+    Only the store changes: queries keep using `get_backend()` (the configured
+    ``embed_backend``), so point the config at *backend* to search with it.
+    """
+    backend = backend or get_backend()
+    todo = [it for it in _index().items if it.backend != backend.name]
+    vecs: Dict[str, list] = {}
+    for lo in range(0, len(todo), batch):
+        chunk = todo[lo:lo + batch]
+        for it, v in zip(chunk, backend.embed([it.text for it in chunk])):
+            vecs[it.fp] = v.tolist()
+
+    def mutate(items: List[MemoryItem]) -> bool:
+        changed = False
+        for it in items:
+            v = vecs.get(it.get("fp"))
+            if v is not None and it.backend != backend.name:
+                it["v"] = v
+                it["b"] = backend.name
+                changed = True
+        return changed
+
+    if vecs:
+        _write(mutate)
+    return len(todo)
+
+
+def set_pinned(query: str, pinned: bool = True) -> int:
+    """Pin / unpin every fact whose text contains *query*; pinned facts are never evicted."""
+    needle = _fingerprint(query)
+    hits = 0
+
+    def mutate(items: List[MemoryItem]) -> bool:
+        nonlocal hits
+        matched = [it for it in items if needle in it.get("fp", "")]
+        for it in matched:
+            if pinned:
+                it["pin"] = True
+            else:
+                it.pop("pin", None)
+        hits = len(matched)
+        return bool(matched)
+
+    _write(mutate)
+    return hits
+
+
+def enforce_retention() -> int:
+    """Run eviction to completion in the foreground; returns facts evicted."""
+    total = 0
+    while (removed := _evict_batch(_retention.batch)):
+        total += removed
+    return total
+
+
+def quant_bench(n: int = 50_000, dim: int = 1536, queries: int = 200, k: int = 5) -> Dict[str, dict]:
+    """RAM, scan latency and top-k agreement of each scan precision on synthetic data."""
+    import json
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(n // 50, 1), dim)).astype(np.float32)
+    vecs = _normalise(centers[rng.integers(0, len(centers), n)]
+                      + 0.5 * rng.standard_normal((n, dim)).astype(np.float32))
+    now = time.time()
+    items = [MemoryItem({"t": now, "fp": f"f{i}", "b": "bench", "v": vecs[i]}) for i in range(n)]
+    picks = rng.integers(0, n, queries)
+    qs = _normalise(vecs[picks] + 0.8 * rng.standard_normal((queries, dim)).astype(np.float32))
+    truth = [set(np.argsort(-(vecs @ q))[:k]) for q in qs]
+    limit = max(k * 8, _RESCORE_MIN)
+
+    # What the pre-quantisation store held per fact: a list of Python floats
+    as_list = vecs[0].tolist()
+    list_bytes = sys.getsizeof(as_list) + sum(sys.getsizeof(x) for x in as_list)
+    raw = json.dumps(as_list).encode()
+    t0 = time.perf_counter()
+    for _ in range(50):
+        RawJSON(raw, 0, len(raw)).load()
+    parse_ms = (time.perf_counter() - t0) / 50 * 1000
+
+    out: Dict[str, dict] = {"python-list": {"mb_per_100k": round(list_bytes * 100_000 / 2**20)}}
+    for kind in _DTYPES:
+        _vec_cache.clear()
+        idx = _Index(items, [0] * n, "bench", kind=kind)
+        t0 = time.perf_counter()
+        approx = [idx.scan(q[None, :])[:, 0] for q in qs]
+        scan_ms = (time.perf_counter() - t0) / queries * 1000
+        plain = sum(len(set(np.argsort(-a)[:k]) & t) for a, t in zip(approx, truth)) / (k * queries)
+        t0 = time.perf_counter()
+        found = []
+        for q in qs:
+            js, sims, _ = idx.search(q, -1.0, limit)
+            found.append(set(js[np.argsort(-sims)[:k]]))
+        search_ms = (time.perf_counter() - t0) / queries * 1000
+        rescored = sum(len(f & t) for f, t in zip(found, truth)) / (k * queries)
+        out[kind] = {
+            "mb_per_100k": round(idx.nbytes / n * 100_000 / 2**20),
+            "scan_ms": round(scan_ms, 2),
+            "search_ms": round(search_ms, 2),
+            f"top{k}_agreement": round(plain, 4),
+            f"top{k}_rescored": round(rescored, 4),
+        }
+        if kind != "float32":
+            # Rescoring parses shortlist vectors from the snapshot on a cache miss
+            out[kind]["cold_rescore_ms"] = round(parse_ms * limit, 1)
+    return out
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="G.H.O.S.T. long-term memory maintenance.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    re_ap = sub.add_parser("reembed", help="re-embed the store with an embedding backend")
+    re_ap.add_argument("--backend", choices=("openai", "local", "hash"), default=None,
+                       help="default: config['embed_backend']")
+    for name, help_ in (("pin", "never evict matching facts"), ("unpin", "make matching facts evictable")):
+        p = sub.add_parser(name, help=help_)
+        p.add_argument("text", help="substring of the fact text")
+    sub.add_parser("trim", help="evict down to the retention budget now")
+    qb = sub.add_parser("quant-bench", help="compare float32 / float16 / int8 scan matrices")
+    qb.add_argument("--n", type=int, default=50_000)
+    qb.add_argument("--dim", type=int, default=1536)
+    qb.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "reembed":
+        backend = make_backend(args.backend)
+        t0 = time.perf_counter()
+        n = reembed_store(backend)
+        print(f"✅ Re-embedded {n} facts with {backend.name} in {time.perf_counter() - t0:.2f}s")
+        if backend.name != get_backend().name:
+            print(f"ℹ️ Queries still use {get_backend().name}; set \"embed_backend\" in config.json to switch.")
+    elif args.cmd in ("pin", "unpin"):
+        n = set_pinned(args.text, args.cmd == "pin")
+        print(f"📌 {args.cmd}ned {n} facts")
+    elif args.cmd == "trim":
+        n = enforce_retention()
+        print(f"🧹 Evicted {n} facts; {len(_index().items)} remain")
+    elif args.cmd == "quant-bench":
+        for kind, row in quant_bench(args.n, args.dim, args.queries).items():
+            print(f"{kind:<12} " + "  ".join(f"{k}={v}" for k, v in row.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
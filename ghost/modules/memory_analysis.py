@@ -0,0 +1,417 @@
+# ghost/modules/memory_analysis.py
+"""One post-turn LLM call for everything memory needs from a turn.
+
+Before, every turn paid for up to three memory round trips – `extract_fact`
+(gpt-4o, 32 tokens), the slot classifier in `replace_or_add_fact` (gpt-3.5)
+and an embedding – and the extraction ran twice because both `stream_chat`
+and `main.handle_interaction` did it.
+
+1. **Consolidated call** – one JSON-mode request returns zero or more facts,
+   each with its slot: ``{"facts": [{"text": "...", "slot": "NAME"}]}``. The
+   slot goes straight into `replace_or_add_fact(fact, slot=...)`, so the slot
+   classifier is never called.
+2. **Background + batching** – `MemoryAnalyzer.submit()` only queues the turn.
+   A worker thread defers analysis while the assistant is busy (a reply is
+   streaming, see `hold()`, or audio is playing, see `busy`) and then
+   analyses every queued turn – up to `max_batch` – in a single request.
+3. **Fake backend** – `FakeAnalysisBackend` extracts a few common fact shapes
+   with regexes and estimates tokens from the prompt the real backend would
+   send, so call / token savings can be measured offline:
+       python -m ghost.modules.memory_analysis bench --turns 20
+
+Configured through config.json:
+    "memory_analysis": {"backend": "openai", "max_batch": 4, "max_defer_sec": 20}
+The prompt is the top-level "memory_analysis_prompt"; an older
+"memory_extraction_prompt" override still applies, with the JSON reply format
+appended.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ghost.modules.openai_client import config
+from ghost.modules.replay import current_recorder
+from ghost.modules.tracing import span
+
+client = config.client
+
+SLOTS = ("NAME", "LOCATION", "PREF", "HABIT", "OTHER")
+
+_REPLY_FORMAT = (
+    "Label each fact with one slot: " + ", ".join(SLOTS) + ". Do not repeat a fact. Reply with JSON only: "
+    '{"facts": [{"text": "...", "slot": "..."}]} – an empty list if there is nothing worth remembering.'
+)
+_SYSTEM_PROMPT = (
+    "You're a memory engine. For each conversation turn below, find stable, useful personal facts about "
+    "the user (name, location, preferences, habits, etc.). Write each fact as one concise sentence. "
+    + _REPLY_FORMAT
+)
+
+Turn = Tuple[str, str]  # (user message, assistant reply)
+
+
+@dataclass
+class Fact:
+    text: str
+    slot: str = "OTHER"
+
+
+@dataclass
+class AnalysisStats:
+    calls: int = 0
+    turns: int = 0
+    facts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def per_turn(self) -> Dict[str, float]:
+        n = max(self.turns, 1)
+        return {
+            "calls": self.calls / n,
+            "prompt_tokens": self.prompt_tokens / n,
+            "completion_tokens": self.completion_tokens / n,
+        }
+
+
+def system_prompt() -> str:
+    """``memory_analysis_prompt``, else an existing ``memory_extraction_prompt``
+    override (from the old one-fact extractor) with the JSON reply format
+    appended, else the built-in prompt."""
+    prompt = config.get("memory_analysis_prompt")
+    if prompt:
+        return prompt
+    legacy = config.get("memory_extraction_prompt")
+    return f"{legacy}\n\n{_REPLY_FORMAT}" if legacy else _SYSTEM_PROMPT
+
+
+def build_messages(turns: Sequence[Turn]) -> List[dict]:
+    body = "\n\n".join(
+        f"Turn {i}:\nUser: {user}\nAssistant: {assistant}" for i, (user, assistant) in enumerate(turns, 1)
+    )
+    return [
+        {"role": "system", "content": system_prompt()},
+        {"role": "user", "content": body},
+    ]
+
+
+def parse_facts(raw: str) -> List[Fact]:
+    """Facts from the model's JSON reply; malformed entries are dropped."""
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        return []
+    entries = data.get("facts", []) if isinstance(data, dict) else []
+    facts: List[Fact] = []
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        text = str(entry.get("text", "")).strip()
+        if not text or text.casefold() in seen:
+            continue
+        seen.add(text.casefold())
+        slot = str(entry.get("slot", "OTHER")).strip().upper()
+        facts.append(Fact(text, slot if slot in SLOTS else "OTHER"))
+    return facts
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)  # same 4 chars ≈ 1 token heuristic as chat_engine
+
+
+# ---------------------------------------------------------------------------
+#                                BACKENDS
+# ---------------------------------------------------------------------------
+
+class AnalysisBackend(ABC):
+    """Turns a batch of turns into facts, accounting calls and tokens."""
+
+    name: str = "base"
+
+    def __init__(self):
+        self.stats = AnalysisStats()
+
+    @abstractmethod
+    def analyze(self, turns: Sequence[Turn]) -> List[Fact]:
+        ...
+
+
+class OpenAIAnalysisBackend(AnalysisBackend):
+    def __init__(self, model: str | None = None, max_tokens: int = 256):
+        super().__init__()
+        self.model = model or config.get("model_memory_extract", "gpt-4o")
+        self.max_tokens = max_tokens
+        self.name = f"openai:{self.model}"
+
+    def analyze(self, turns: Sequence[Turn]) -> List[Fact]:
+        resp = client.chat.completions.create(
+            model=self.model,
+            messages=build_messages(turns),
+            max_tokens=self.max_tokens,
+            temperature=0,
+            response_format={"type": "json_object"},
+        )
+        self.stats.calls += 1
+        if resp.usage is not None:
+            self.stats.prompt_tokens += resp.usage.prompt_tokens
+            self.stats.completion_tokens += resp.usage.completion_tokens
+        return parse_facts(resp.choices[0].message.content or "")
+
+
+class FakeAnalysisBackend(AnalysisBackend):
+    """Local regex extractor; token counts are estimates of the real request."""
+
+    name = "fake"
+
+    _PATTERNS = [
+        (re.compile(r"(?i)\bmy name is ([\w'-]+)"), "The user's name is {}.", "NAME"),
+        (re.compile(r"(?:קוראים לי|השם שלי(?: הוא)?) (\S+)"), "The user's name is {}.", "NAME"),
+        (re.compile(r"(?i)\bi live in ([\w' -]+?)(?:[.,!?]|$)"), "The user lives in {}.", "LOCATION"),
+        (re.compile(r"אני גר(?:ה)? ב(\S+)"), "The user lives in {}.", "LOCATION"),
+        (re.compile(r"(?i)\bi (?:really )?(?:like|love|prefer) ([\w' -]+?)(?:[.,!?]|$)"), "The user likes {}.", "PREF"),
+        (re.compile(r"אני אוהב(?:ת)? ([^.,!?]+)"), "The user likes {}.", "PREF"),
+        (re.compile(r"(?i)\bevery (morning|evening|day|night) i ([\w' -]+?)(?:[.,!?]|$)"),
+         "Every {} the user {}.", "HABIT"),
+    ]
+
+    def analyze(self, turns: Sequence[Turn]) -> List[Fact]:
+        messages = build_messages(turns)
+        facts: List[Fact] = []
+        for user, _ in turns:
+            for pattern, template, slot in self._PATTERNS:
+                for m in pattern.finditer(user):
+                    facts.append(Fact(template.format(*(g.strip() for g in m.groups())), slot))
+        reply = json.dumps({"facts": [f.__dict__ for f in facts]}, ensure_ascii=False)
+        self.stats.calls += 1
+        self.stats.prompt_tokens += sum(_estimate_tokens(m["content"]) for m in messages)
+        self.stats.completion_tokens += _estimate_tokens(reply)
+        return parse_facts(reply)
+
+
+def make_backend(kind: str | None = None) -> AnalysisBackend:
+    """Build the backend named by *kind* (default: ``config["memory_analysis"]["backend"]``)."""
+    kind = kind or config.get("memory_analysis", {}).get("backend", "openai")
+    if kind == "openai":
+        return OpenAIAnalysisBackend()
+    if kind == "fake":
+        return FakeAnalysisBackend()
+    raise ValueError(f"Unknown memory analysis backend: {kind}")
+
+
+# ---------------------------------------------------------------------------
+#                                ANALYZER
+# ---------------------------------------------------------------------------
+
+def _store_facts(facts: List[Fact]) -> None:
+    from ghost.modules.memory import replace_or_add_fact  # heavy; only when storing
+
+    for fact in facts:
+        if replace_or_add_fact(fact.text, slot=fact.slot):
+            print(f"\n📌 New fact: {fact.text}")
+
+
+class MemoryAnalyzer:
+    """Queues finished turns and analyses them in batches on a worker thread."""
+
+    def __init__(
+        self,
+        backend: AnalysisBackend,
+        max_batch: int = 4,
+        max_defer_sec: float = 20.0,
+        sink: Callable[[List[Fact]], None] = _store_facts,
+        busy: Optional[Callable[[], bool]] = None,  # e.g. lambda: get_player().busy
+    ):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_defer_sec = max_defer_sec
+        self.sink = sink
+        self.busy = busy
+        # Each turn with the context it was submitted in (its trace turn id)
+        self._queue: "queue.Queue[Tuple[Turn, contextvars.Context]]" = queue.Queue()
+        self._holds = 0
+        self._holds_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # guards _pending, _idle and the thread start
+        self._pending = 0              # turns submitted and not yet analysed
+        self._idle = threading.Event()
+        self._idle.set()
+
+    @classmethod
+    def from_config(cls) -> "MemoryAnalyzer":
+        cfg = config.get("memory_analysis", {})
+        return cls(
+            make_backend(cfg.get("backend")),
+            max_batch=cfg.get("max_batch", 4),
+            max_defer_sec=cfg.get("max_defer_sec", 20.0),
+        )
+
+    # ------------------------------------------------------------------
+
+    def submit(self, user_msg: str, assistant_msg: str) -> None:
+        """Queue a finished turn; analysis happens on the worker thread."""
+        with self._lock:
+            self._pending += 1
+            self._idle.clear()
+            self._queue.put(((user_msg, assistant_msg), contextvars.copy_context()))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ghost-memory-analysis", daemon=True)
+                self._thread.start()
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        """Mark the assistant busy (e.g. while a reply streams); analysis waits."""
+        with self._holds_lock:
+            self._holds += 1
+        try:
+            yield
+        finally:
+            with self._holds_lock:
+                self._holds -= 1
+
+    def is_busy(self) -> bool:
+        return self._holds > 0 or bool(self.busy and self.busy())
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until every submitted turn has been analysed."""
+        return self._idle.wait(timeout)
+
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_defer_sec
+            while self.is_busy() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Traced under the turn that opened the batch
+            ctx = batch[0][1]
+            ctx.run(self._analyze, [turn for turn, _ in batch])
+            with self._lock:
+                self._pending -= len(batch)
+                if self._pending == 0:
+                    self._idle.set()
+
+    def analyze_now(self, batch: List[Turn]) -> None:
+        """Analyse *batch* on the calling thread (replay reproduces recorded batches)."""
+        self._analyze(batch)
+
+    def _analyze(self, batch: List[Turn]) -> None:
+        if rec := current_recorder():
+            rec.note_analysis(len(batch))
+        try:
+            with span("memory_analysis", turns=len(batch)):
+                facts = self.backend.analyze(batch)
+            self.backend.stats.turns += len(batch)
+            self.backend.stats.facts += len(facts)
+            if facts:
+                self.sink(facts)
+        except Exception as e:
+            print(f"❌ Memory analysis error: {e}")
+
+
+_analyzer: MemoryAnalyzer | None = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer() -> MemoryAnalyzer:
+    """Return the shared analyzer, creating it from config on first use."""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = MemoryAnalyzer.from_config()
+        return _analyzer
+
+
+# ---------------------------------------------------------------------------
+#                               BENCHMARK
+# ---------------------------------------------------------------------------
+
+_BENCH_TURNS = [
+    ("Hi, my name is Dana.", "Nice to meet you, Dana!"),
+    ("What's the weather like today?", "I can't check live weather, but I can help you find out."),
+    ("I live in Haifa, near the port.", "Haifa is lovely – the port area has great food."),
+    ("Tell me a joke.", "Why did the developer go broke? Because he used up all his cache."),
+    ("I really like jazz and strong coffee.", "Great combination. Any favourite artists?"),
+    ("Every morning I run five kilometres.", "Impressive routine!"),
+    ("What time is it in Tokyo?", "It's about seven hours ahead of Israel."),
+    ("אני אוהבת שוקולד מריר", "בחירה מצוינת."),
+]
+
+
+def _legacy_estimate(turns: Sequence[Turn], facts_per_turn: List[int]) -> AnalysisStats:
+    """Estimated cost of the old path: extract + slot per fact, extraction done twice."""
+    stats = AnalysisStats(turns=len(turns))
+    extract_system = config.get("memory_extraction_prompt", None) or (
+        "You're a memory engine. If the user or assistant message contains a stable, useful personal "
+        "fact about the user (name, location, preference, etc.), extract it as one concise sentence; "
+        "otherwise reply NULL."
+    )
+    slot_system = (
+        "Classify the user fact into a SHORT slot label like NAME, LOCATION, PREF, HABIT, OTHER. "
+        "Return only the label in uppercase letters."
+    )
+    for (user, assistant), n_facts in zip(turns, facts_per_turn):
+        extract_prompt = _estimate_tokens(extract_system) + _estimate_tokens(f"User: {user}\nAssistant: {assistant}")
+        for _ in range(2):  # stream_chat and handle_interaction both extracted
+            stats.calls += 1
+            stats.prompt_tokens += extract_prompt
+            stats.completion_tokens += 12 if n_facts else 1
+            if n_facts:
+                stats.calls += 1
+                stats.prompt_tokens += _estimate_tokens(slot_system) + 12
+                stats.completion_tokens += 1
+    return stats
+
+
+def bench(n_turns: int = 20, batch: int = 4) -> Tuple[AnalysisStats, AnalysisStats]:
+    turns = [_BENCH_TURNS[i % len(_BENCH_TURNS)] for i in range(n_turns)]
+    per_turn = [len(FakeAnalysisBackend().analyze([t])) for t in turns]
+    legacy = _legacy_estimate(turns, per_turn)
+
+    backend = FakeAnalysisBackend()
+    for lo in range(0, n_turns, batch):
+        chunk = turns[lo:lo + batch]
+        facts = backend.analyze(chunk)
+        backend.stats.turns += len(chunk)
+        backend.stats.facts += len(facts)
+    return legacy, backend.stats
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Consolidated memory analysis tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="compare API calls/tokens per turn against the old path (fake backend)")
+    b.add_argument("--turns", type=int, default=20)
+    b.add_argument("--batch", type=int, default=4, help="turns per analysis call when the assistant is busy")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "bench":
+        legacy, new = bench(args.turns, args.batch)
+        print(f"{'path':<24}{'calls/turn':>12}{'prompt tok/turn':>18}{'completion tok/turn':>22}")
+        for label, stats in (("old (extract ×2 + slot)", legacy), (f"consolidated, batch {args.batch}", new)):
+            pt = stats.per_turn()
+            print(f"{label:<24}{pt['calls']:>12.2f}{pt['prompt_tokens']:>18.1f}{pt['completion_tokens']:>22.1f}")
+        print(f"📌 {new.facts} facts from {new.turns} turns (embedding calls unchanged: one per stored fact)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
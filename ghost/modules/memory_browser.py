@@ -0,0 +1,194 @@
+# ghost/modules/memory_browser.py
+"""Streaming, searchable browser for the long-term memory store.
+
+`show_memories.py` used to `readlines()` the whole store and `json.loads`
+every record – 1536-float embedding included – just to print `text`, from a
+hard-coded path. This browser:
+
+1. **Streams** the current snapshot line by line from its memory map and stops
+   as soon as the requested page is full.
+2. **Decodes lazily** – the `"v"` array is cut out of the raw line before
+   parsing, and the slot filter is checked on the raw bytes first.
+3. **Filters** by slot (`--slot NAME`) and time (`--since 7d`, `--until
+   2025-01-31`).
+4. **Searches** keywords through the persisted inverted index
+   (`text_index.py`) that the memory module updates on every write.
+
+    python show_memories.py --search "tel aviv" --slot LOCATION --page 2
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Set, Tuple
+
+from ghost.modules.store import VersionedStore
+from ghost.modules.text_index import TextIndex
+
+
+def _store_path() -> Path:
+    """`memory_store_path` from config.json, read directly.
+
+    Going through `openai_client.config` would build an OpenAI client and
+    require an API key just to browse a local file.
+    """
+    default = "ghost/memory_store.jsonl"
+    try:
+        with open("config.json", "r", encoding="utf-8") as f:
+            return Path(json.load(f).get("memory_store_path", default))
+    except (OSError, ValueError):
+        return Path(default)
+
+
+DB_FILE = _store_path()
+
+_VECTOR = re.compile(rb',\s*"v":\s*\[[^\]]*\]')
+_FP = re.compile(rb'"fp":\s*"([^"\\]*)"')
+_RELATIVE = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def decode(line: bytes) -> dict:
+    """Parse one JSONL record without materialising its embedding."""
+    try:
+        return json.loads(_VECTOR.sub(b"", line, count=1))
+    except json.JSONDecodeError:
+        return json.loads(line)  # unusual key order; pay for the full parse
+
+
+def parse_time(value: str | None) -> Optional[float]:
+    """Epoch seconds from an ISO date/time or a relative age like ``12h`` / ``7d``."""
+    if not value:
+        return None
+    m = _RELATIVE.match(value.strip())
+    if m:
+        return time.time() - float(m.group(1)) * _UNITS[m.group(2)]
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def _search_hits(store: VersionedStore, version: int, query: str) -> Set[str]:
+    """Fingerprints matching *query*; (re)builds the index if it lags the store."""
+    index = TextIndex(store.path)
+    if not index.refresh(version):
+        with store.lock:
+            snap = store.snapshot()
+            index.rebuild(snap.version, (decode(line) for line in snap.lines()))
+    return index.search(query)
+
+
+def browse(
+    path: str | Path = DB_FILE,
+    *,
+    query: str | None = None,
+    slot: str | None = None,
+    since: float | None = None,
+    until: float | None = None,
+) -> Iterator[Tuple[int, Optional[dict]]]:
+    """Yield ``(ordinal, record)`` for matching facts in store order.
+
+    *record* is None for a line that failed to decode. Records never carry
+    their `"v"` vector.
+    """
+    store = VersionedStore(path)
+    snap = store.snapshot()
+    hits = _search_hits(store, snap.version, query) if query else None
+    if hits is not None and not hits:
+        return
+    # Search hits not yet reached; counted whether or not the slot / time
+    # filters keep them, so the scan stops at the last hit either way
+    remaining = len(hits) if hits is not None else -1
+    slot_bytes = json.dumps(slot.upper()).encode() if slot else None
+    try:
+        for i, line in enumerate(snap.lines(), 1):
+            if remaining == 0:
+                return  # every search hit has been seen
+            counted = False
+            if hits is not None:
+                m = _FP.search(line)
+                if m is not None:
+                    if m.group(1).decode("utf-8", "replace") not in hits:
+                        continue
+                    remaining -= 1
+                    counted = True
+            if slot_bytes is not None and slot_bytes not in line:
+                continue
+            try:
+                rec = decode(line)
+            except json.JSONDecodeError:
+                if hits is None and slot is None and since is None and until is None:
+                    yield i, None
+                continue
+            if hits is not None and not counted:
+                if rec.get("fp") not in hits:
+                    continue
+                remaining -= 1
+            if slot is not None and rec.get("slot", "").upper() != slot.upper():
+                continue
+            t = rec.get("t", 0.0)
+            if (since is not None and t < since) or (until is not None and t > until):
+                continue
+            yield i, rec
+    finally:
+        snap.close()
+
+
+def _format(i: int, rec: Optional[dict]) -> str:
+    if rec is None:
+        return f"[{i}] ⚠️ שגיאה בפענוח השורה"
+    when = datetime.fromtimestamp(rec.get("t", 0)).strftime("%Y-%m-%d %H:%M")
+    pin = " 📌" if rec.get("pin") else ""
+    return f"[{i}] {when}  {rec.get('slot', '-'):<9} {rec.get('text', '[ללא טקסט]')}{pin}"
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Browse and search G.H.O.S.T. long-term memory.")
+    ap.add_argument("--search", "-s", help="keywords (all must match; last one as prefix)")
+    ap.add_argument("--slot", help="only facts in this slot, e.g. NAME, LOCATION")
+    ap.add_argument("--since", help="ISO date/time or age like 12h, 7d")
+    ap.add_argument("--until", help="ISO date/time or age like 12h, 7d")
+    ap.add_argument("--page", type=int, default=1)
+    ap.add_argument("--page-size", type=int, default=20)
+    ap.add_argument("--store", type=Path, default=DB_FILE, help="default: config['memory_store_path']")
+    args = ap.parse_args(argv)
+
+    if not args.store.exists() and not args.store.with_name(args.store.name + ".d").exists():
+        print("❌ קובץ הזיכרון לא קיים.")
+        return 1
+
+    matches = browse(
+        args.store,
+        query=args.search,
+        slot=args.slot,
+        since=parse_time(args.since),
+        until=parse_time(args.until),
+    )
+    skip = (max(args.page, 1) - 1) * args.page_size
+    shown = 0
+    more = False
+    for n, (i, rec) in enumerate(matches):
+        if n < skip:
+            continue
+        if shown == args.page_size:
+            more = True  # one look-ahead match is enough to know
+            break
+        if shown == 0:
+            print(f"\n📚 זיכרונות שמורים (עמוד {args.page}):\n")
+        print(_format(i, rec))
+        shown += 1
+
+    if not shown:
+        print("⚠️ אין כרגע זיכרונות שמתאימים לחיפוש.")
+    elif more:
+        print(f"\n➡️  עוד תוצאות: --page {args.page + 1}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
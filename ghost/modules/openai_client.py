@@ -1,14 +1,73 @@
 # ghost/openai_client.py
 import json
+import os
+
+import httpx
 import openai
 
+from ghost.modules import tracing
+from ghost.modules.api_governor import ApiGovernor
+
+
+class SwitchableTransport(httpx.BaseTransport):
+    """HTTP transport whose backend can be swapped at runtime.
+
+    Modules keep a reference to `config.client` from import time, so session
+    recording / replay (see `ghost.modules.replay`) installs itself here
+    instead of replacing the client.
+    """
+
+    def __init__(self, inner: httpx.BaseTransport | None = None):
+        self.inner: httpx.BaseTransport = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.inner.handle_request(request)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
 class Config:
     def __init__(self):
         with open("config.json", "r", encoding="utf-8") as f:
             self._data = json.load(f)
-        self.client = openai.OpenAI(api_key=self._data["openai_api_key"])
+        http = self._data.get("openai_http", {})
+        # One pooled, keep-alive connection set shared by every module
+        self.transport = SwitchableTransport(httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=http.get("max_connections", 20),
+                max_keepalive_connections=http.get("max_keepalive", 10),
+                keepalive_expiry=http.get("keepalive_expiry", 60.0),
+            ),
+            retries=http.get("connect_retries", 1),
+        ))
+        # Per-endpoint concurrency / rate limits, singleflight and counters
+        self.governor = ApiGovernor(self.transport, self._data.get("openai_limits", {}))
+        self.client = openai.OpenAI(
+            api_key=self._data["openai_api_key"],
+            base_url=self._data.get("openai_base_url"),
+            timeout=httpx.Timeout(http.get("timeout", 60.0), connect=http.get("connect_timeout", 5.0)),
+            max_retries=http.get("max_retries", 2),
+            http_client=openai.DefaultHttpxClient(transport=self.governor),
+        )
 
     def get(self, key: str, default=None):
         return self._data.get(key, default)
 
+    def install_transport(self, transport: httpx.BaseTransport) -> httpx.BaseTransport:
+        """Route every API call through *transport*; returns the previous one."""
+        prev, self.transport.inner = self.transport.inner, transport
+        return prev
+
+    def api_stats(self) -> dict:
+        """Per-endpoint call / latency / byte counters (see `ApiGovernor`)."""
+        return self.governor.snapshot()
+
 config = Config()
+tracing.configure(**config.get("tracing", {}))
+
+# Opt-in session recording (config "record_sessions": "<dir>" or GHOST_RECORD=<dir>)
+_record_dir = os.environ.get("GHOST_RECORD") or config.get("record_sessions")
+if _record_dir:
+    from ghost.modules.replay import start_recording
+    start_recording(_record_dir, config)
@@ -0,0 +1,212 @@
+# ghost/modules/playback.py
+"""Persistent, low-latency audio playback for G.H.O.S.T.
+
+The old `speak` re-initialised the pygame mixer for every utterance, wrote the
+TTS response to a timestamped WAV under `audio/`, and busy-polled
+`get_busy()` with a fresh `pygame.time.Clock()` per iteration.
+
+This module keeps **one** mixer and **one** worker thread alive for the whole
+process:
+
+1. **In-memory PCM** – segments are raw 16-bit mono PCM bytes (the TTS
+   `"pcm"` response format) handed straight to `pygame.mixer.Sound(buffer=…)`.
+   Nothing touches the disk.
+2. **Segment queue** – `play()` only enqueues and returns immediately, so the
+   caller can keep producing audio (e.g. sentence by sentence) while earlier
+   segments are already audible.
+3. **Non-blocking control** – `play()` / `stop()` / `wait()` / `busy`.
+4. **Barge-in** – `stop()` drops everything queued and silences the channel at
+   once. The capture side calls it as soon as the user starts talking so the
+   next turn does not wait for the assistant to finish; it reads `busy` to
+   gate its trigger against the reply's own echo (`Segmenter.echo`).
+
+Usage:
+    player = get_player()
+    player.play(pcm_bytes)      # returns immediately
+    player.wait()               # optional: block until drained
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+import pygame
+
+from ghost.modules.tracing import bind, record
+
+# TTS "pcm" output: 24 kHz, signed 16-bit little-endian, mono
+PCM_RATE = 24000
+PCM_CHANNELS = 1
+
+# How often the worker checks a playing channel for completion / interrupts
+_POLL_SEC = 0.01
+
+
+class PlaybackEngine:
+    """Long-lived mixer + worker thread that plays queued PCM segments."""
+
+    def __init__(self, rate: int = PCM_RATE, channels: int = PCM_CHANNELS):
+        self.rate = rate
+        self.channels = channels
+
+        self._queue: "queue.Queue[tuple[int, bytes, float | None, Optional[Callable]] | None]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._interrupt = threading.Event()
+        self._generation = 0  # bumped by stop(); stale segments are dropped
+        self._pending = 0     # segments queued or playing
+        self._channel: Optional[pygame.mixer.Channel] = None
+        self._mixer_fmt: tuple[int, int, int] | None = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    #                            LIFECYCLE
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Initialise the mixer once and spawn the worker (idempotent)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            if not pygame.mixer.get_init():
+                pygame.mixer.init(frequency=self.rate, size=-16, channels=self.channels)
+            self._mixer_fmt = pygame.mixer.get_init()
+            self._channel = pygame.mixer.Channel(0)
+            self._thread = threading.Thread(
+                target=self._run, name="ghost-playback", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop playback, terminate the worker and release the mixer."""
+        self.stop()
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        if pygame.mixer.get_init():
+            pygame.mixer.quit()
+
+    # ------------------------------------------------------------------
+    #                          PUBLIC CONTROL
+    # ------------------------------------------------------------------
+
+    def play(self, pcm: bytes, requested_at: float | None = None) -> None:
+        """Queue one PCM segment for playback and return immediately.
+
+        *requested_at* (``time.perf_counter()``) is when the caller started
+        producing this audio; the first segment after silence reports
+        request → first audible sample as the ``tts_first_audio`` span.
+        """
+        if not pcm:
+            return
+        self.start()
+        with self._lock:
+            if self._pending == 0 and requested_at is None:
+                requested_at = time.perf_counter()
+            elif self._pending:
+                requested_at = None  # not the first audio of this utterance
+            self._pending += 1
+            self._idle.clear()
+            gen = self._generation
+        # The span is written on the worker thread, under the caller's turn id
+        report = bind(record) if requested_at is not None else None
+        self._queue.put((gen, pcm, requested_at, report))
+
+    def stop(self) -> None:
+        """Barge-in: drop queued segments and silence the current one now."""
+        with self._lock:
+            self._generation += 1
+            self._interrupt.set()
+            while True:
+                try:
+                    seg = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if seg is not None:
+                    self._pending -= 1
+            if self._channel is not None:
+                self._channel.stop()
+            if self._pending <= 0:
+                self._pending = 0
+                self._idle.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until every queued segment has played (or was stopped)."""
+        return self._idle.wait(timeout)
+
+    @property
+    def busy(self) -> bool:
+        return not self._idle.is_set()
+
+    # ------------------------------------------------------------------
+    #                              WORKER
+    # ------------------------------------------------------------------
+
+    def _to_sound(self, pcm: bytes) -> pygame.mixer.Sound:
+        """Wrap raw PCM in a Sound, adapting to the mixer format if needed."""
+        freq, _size, channels = self._mixer_fmt or (self.rate, -16, self.channels)
+        if freq == self.rate and channels == self.channels:
+            return pygame.mixer.Sound(buffer=pcm)
+
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if freq != self.rate:
+            n_out = int(len(samples) * freq / self.rate)
+            x_old = np.arange(len(samples), dtype=np.float32)
+            x_new = np.linspace(0, len(samples) - 1, n_out, dtype=np.float32)
+            samples = np.interp(x_new, x_old, samples).astype(np.int16)
+        if channels != self.channels:
+            samples = np.repeat(samples, channels)
+        return pygame.mixer.Sound(buffer=samples.tobytes())
+
+    def _run(self) -> None:
+        while True:
+            seg = self._queue.get()
+            if seg is None:
+                return
+            gen, pcm, requested_at, report = seg
+            try:
+                sound = self._to_sound(pcm) if gen == self._generation else None
+                with self._lock:
+                    # Checked, cleared and started under the lock stop() takes,
+                    # so a barge-in can't land between the check and play()
+                    started = sound is not None and gen == self._generation
+                    if started:
+                        self._interrupt.clear()
+                        self._channel.play(sound)
+                if started:
+                    if report is not None:
+                        report("tts_first_audio", (time.perf_counter() - requested_at) * 1000)
+                    while self._channel.get_busy():
+                        if self._interrupt.wait(_POLL_SEC):
+                            break
+            except Exception as e:
+                print(f"❌ Audio playback failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if self._pending <= 0:
+                        self._pending = 0
+                        self._idle.set()
+
+
+# ---------------------------------------------------------------------------
+#                           PROCESS-WIDE INSTANCE
+# ---------------------------------------------------------------------------
+
+_player: Optional[PlaybackEngine] = None
+_player_lock = threading.Lock()
+
+
+def get_player() -> PlaybackEngine:
+    """Return the shared playback engine, creating it on first use."""
+    global _player
+    with _player_lock:
+        if _player is None:
+            _player = PlaybackEngine()
+        return _player
@@ -0,0 +1,388 @@
+# ghost/modules/profiler.py
+"""On-demand sampling profiler for the live assistant loop.
+
+When a box got slow there was no way to tell whether the time went into
+numpy in `capture_audio`, JSON parsing of the store, `SequenceMatcher` in
+`replace_or_add_fact` or a blocking network call, short of restarting under
+a profiler. `SamplingProfiler` can be switched on and off while the
+conversation keeps running:
+
+1. **Sampling, not tracing** – a daemon thread reads `sys._current_frames()`
+   every `interval_ms` (default 5 ms) and counts each thread's stack. Nothing
+   is hooked into the profiled code, so the cost is the sampler's own
+   ~tens of µs per tick, and zero when stopped. Samples are wall-clock:
+   a thread blocked in a socket read is counted too, which is how blocking
+   network calls show up. Under heavy CPU load ticks are slower than
+   `interval_ms`, because the sampler has to wait for the GIL.
+2. **Attribution** – every sample is keyed by thread name and pipeline stage.
+   The stage is the innermost open `tracing` span on that thread
+   (`tracing.current_stage`), tracked while the profiler runs even if trace
+   logging is off.
+3. **Output** – `dump()` writes ``<out_dir>/profile-<time>.collapsed``
+   (``thread;stage;frame;...;frame count`` lines for flamegraph.pl /
+   speedscope / inferno) and a ``.txt`` summary: samples per thread and
+   stage, plus the top-N functions by self and inclusive samples.
+4. **Control** – a signal (`SIGUSR2`, `SIGBREAK` on Windows), the stdin
+   commands ``/profile start|stop|dump|status`` in the console, or a line
+   protocol on a loopback socket:
+
+       python -m ghost.modules.profiler start
+       python -m ghost.modules.profiler stop      # stops and dumps
+
+Configured through config.json (all optional):
+    "profiler": {"interval_ms": 5, "port": 47800, "signal": true,
+                 "out_dir": "logs/profiles", "top": 25}
+(the socket listens on 127.0.0.1 only; "port": 0 turns it off)
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+from ghost.modules import tracing
+from ghost.modules.openai_client import config
+
+_MAX_DEPTH = 128
+
+
+def _cfg() -> dict:
+    return config.get("profiler", {})
+
+
+class SamplingProfiler:
+    """Samples every thread's stack on a timer; start / stop / dump at will."""
+
+    def __init__(self, interval_ms: float = 5.0, out_dir: str | Path = "logs/profiles", top: int = 25):
+        self.interval = interval_ms / 1000
+        self.out_dir = Path(out_dir)
+        self.top = top
+        self._stacks: Counter = Counter()  # (thread, stage, frames) → samples
+        self._labels: Dict[CodeType, str] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples = 0
+        self.ticks = 0
+        self.sampler_sec = 0.0  # time spent inside the sampler itself
+        self.started_at: Optional[float] = None
+        self.elapsed = 0.0
+
+    @classmethod
+    def from_config(cls) -> "SamplingProfiler":
+        cfg = _cfg()
+        return cls(cfg.get("interval_ms", 5.0), cfg.get("out_dir", "logs/profiles"), cfg.get("top", 25))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ------------------------------------------------------------------
+    #                              CONTROL
+    # ------------------------------------------------------------------
+
+    def start(self) -> bool:
+        """Start sampling (keeps earlier samples until `reset`); False if already on."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stop.clear()
+            tracing.track_stages(True)
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="ghost-profiler", daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self) -> bool:
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return False
+            self._stop.set()
+            self._thread = None
+        thread.join()
+        tracing.track_stages(False)
+        self.elapsed += time.perf_counter() - self.started_at
+        return True
+
+    def toggle(self) -> str:
+        """Start, or stop and dump; returns a status line."""
+        if self.start():
+            return "🔬 profiler started"
+        self.stop()
+        paths = self.dump()
+        return f"🔬 profiler stopped → {paths[0]}" if paths else "🔬 profiler stopped (no samples)"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = self.ticks = 0
+            self.sampler_sec = self.elapsed = 0.0
+
+    # ------------------------------------------------------------------
+    #                              SAMPLING
+    # ------------------------------------------------------------------
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+        return label
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            t0 = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            batch: List[Tuple[str, str, Tuple[str, ...]]] = []
+            frame = f = None
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack: List[str] = []
+                f: Optional[FrameType] = frame
+                while f is not None and len(stack) < _MAX_DEPTH:
+                    stack.append(self._label(f.f_code))
+                    f = f.f_back
+                stack.reverse()
+                batch.append((names.get(tid, f"thread-{tid}"), tracing.current_stage(tid) or "-", tuple(stack)))
+            frame = f = None  # don't keep the last stacks alive between ticks
+            with self._lock:
+                self._stacks.update(batch)
+                self.samples += len(batch)
+                self.ticks += 1
+                self.sampler_sec += time.perf_counter() - t0
+
+    # ------------------------------------------------------------------
+    #                               OUTPUT
+    # ------------------------------------------------------------------
+
+    def collapsed(self) -> List[str]:
+        """``thread;stage;outer;...;inner count`` lines (Brendan Gregg's format)."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        clean = lambda s: s.replace(";", ":").replace(" ", "_")  # noqa: E731 – keep fields intact
+        return [
+            ";".join([clean(thread), f"[{clean(stage)}]", *map(clean, frames)]) + f" {n}"
+            for (thread, stage, frames), n in sorted(stacks, key=lambda kv: -kv[1])
+        ]
+
+    def summary(self, top: int | None = None) -> str:
+        top = top or self.top
+        with self._lock:
+            stacks = list(self._stacks.items())
+            samples, ticks, own = self.samples, self.ticks, self.sampler_sec
+        elapsed = self.elapsed + (time.perf_counter() - self.started_at if self.running else 0.0)
+        by_thread: Counter = Counter()
+        by_stage: Counter = Counter()
+        self_time: Counter = Counter()
+        inclusive: Counter = Counter()
+        for (thread, stage, frames), n in stacks:
+            by_thread[thread] += n
+            by_stage[stage] += n
+            if frames:
+                self_time[frames[-1]] += n
+            for label in set(frames):
+                inclusive[label] += n
+
+        def table(title: str, counts: Counter, limit: int) -> List[str]:
+            rows = [f"\n{title}"]
+            for key, n in counts.most_common(limit):
+                rows.append(f"  {n:>7}  {100 * n / max(samples, 1):5.1f}%  {key}")
+            return rows
+
+        lines = [
+            f"🔬 {samples} samples from {ticks} ticks over {elapsed:.1f}s "
+            f"(interval {self.interval * 1000:g} ms, sampler {100 * own / max(elapsed, 1e-9):.2f}% of one core)",
+        ]
+        lines += table("per thread", by_thread, top)
+        lines += table("per stage (innermost tracing span)", by_stage, top)
+        lines += table(f"top {top} self", self_time, top)
+        lines += table(f"top {top} inclusive", inclusive, top)
+        return "\n".join(lines)
+
+    def dump(self, out_dir: str | Path | None = None) -> List[Path]:
+        """Write the collapsed stacks and the summary; returns their paths."""
+        lines = self.collapsed()
+        if not lines:
+            return []
+        out = Path(out_dir or self.out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        stem = out / f"profile-{time.strftime('%Y%m%d-%H%M%S')}"
+        collapsed = stem.with_suffix(".collapsed")
+        report = stem.with_suffix(".txt")
+        collapsed.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        report.write_text(self.summary() + "\n", encoding="utf-8")
+        return [collapsed, report]
+
+    # ------------------------------------------------------------------
+    #                             COMMANDS
+    # ------------------------------------------------------------------
+
+    def command(self, line: str) -> str:
+        """``start`` | ``stop`` (and dump) | ``toggle`` | ``dump`` | ``status`` | ``reset``."""
+        cmd = line.strip().lower()
+        if cmd == "start":
+            self.reset()
+            return "🔬 profiler started" if self.start() else "🔬 already running"
+        if cmd == "stop":
+            if not self.stop():
+                return "🔬 not running"
+            paths = self.dump()
+            return f"🔬 profiler stopped → {paths[0]}" if paths else "🔬 profiler stopped (no samples)"
+        if cmd == "toggle":
+            return self.toggle()
+        if cmd == "dump":
+            paths = self.dump()
+            return f"🔬 dumped → {paths[0]}" if paths else "🔬 no samples yet"
+        if cmd == "status":
+            return self.summary(10)
+        if cmd == "reset":
+            self.reset()
+            return "🔬 samples cleared"
+        return "🔬 commands: start | stop | toggle | dump | status | reset"
+
+
+_profiler: SamplingProfiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler:
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler.from_config()
+        return _profiler
+
+
+# ---------------------------------------------------------------------------
+#                            CONTROL CHANNELS
+# ---------------------------------------------------------------------------
+
+STDIN_PREFIX = "/profile"
+
+
+def handle_console(text: str) -> Optional[str]:
+    """Reply for a ``/profile …`` console line, or None if it isn't one."""
+    text = text.strip()
+    if not text.startswith(STDIN_PREFIX):
+        return None
+    return get_profiler().command(text[len(STDIN_PREFIX):] or "toggle")
+
+
+def watch_stdin() -> threading.Thread:
+    """Read ``/profile …`` commands from stdin on a daemon thread (voice mode)."""
+    def loop():
+        for line in sys.stdin:
+            reply = handle_console(line)
+            if reply is not None:
+                print(reply)
+
+    thread = threading.Thread(target=loop, name="ghost-profiler-stdin", daemon=True)
+    thread.start()
+    return thread
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for raw in self.rfile:
+            reply = get_profiler().command(raw.decode("utf-8", "replace"))
+            self.wfile.write(reply.encode("utf-8") + b"\n\0\n")
+
+
+def serve(port: int, host: str = "127.0.0.1") -> socketserver.ThreadingTCPServer:
+    """Loopback control socket: one command per line, replies end with a NUL line."""
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    server = socketserver.ThreadingTCPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ghost-profiler-ctl", daemon=True).start()
+    return server
+
+
+def watch_signal(sig: int) -> threading.Thread:
+    """Toggle on *sig*; the toggle itself runs on a daemon thread.
+
+    The handler interrupts the main thread wherever it is, possibly inside
+    `toggle()` or a print, so it only queues a request: `SimpleQueue.put` is
+    reentrant, unlike the profiler's lock, the sampler join and file writes.
+    """
+    requests: "queue.SimpleQueue[int]" = queue.SimpleQueue()
+
+    def loop():
+        while True:
+            requests.get()
+            print(f"\n{get_profiler().toggle()}")
+
+    thread = threading.Thread(target=loop, name="ghost-profiler-signal", daemon=True)
+    thread.start()
+    signal.signal(sig, lambda signum, _frame: requests.put(signum))
+    return thread
+
+
+def install(stdin: bool = False) -> None:
+    """Wire up the configured control channels; call once from the main thread."""
+    cfg = _cfg()
+    sig = getattr(signal, "SIGUSR2", None) or getattr(signal, "SIGBREAK", None)
+    if cfg.get("signal", True) and sig is not None and threading.current_thread() is threading.main_thread():
+        watch_signal(sig)
+    port = cfg.get("port", 47800)  # 0 disables the socket
+    if port:
+        try:
+            serve(int(port))
+        except OSError as e:
+            print(f"⚠️ Profiler control port {port} unavailable: {e}")
+    if stdin:
+        watch_stdin()
+
+
+def send(command: str, port: int | None = None, host: str = "127.0.0.1") -> str:
+    """Send one command to a running assistant's control socket."""
+    port = port or _cfg().get("port", 47800)
+    with socket.create_connection((host, port), timeout=10) as s:
+        s.sendall(command.encode("utf-8") + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n\0\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+    return buf.removesuffix(b"\n\0\n").decode("utf-8", "replace")
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Control the profiler of a running G.H.O.S.T. process.")
+    ap.add_argument("command", choices=("start", "stop", "toggle", "dump", "status", "reset"))
+    ap.add_argument("--port", type=int, default=None, help="default: config['profiler']['port']")
+    ap.add_argument("--pid", type=int, default=None, help="toggle via signal instead of the socket")
+    args = ap.parse_args(argv)
+
+    if args.pid:
+        sig = getattr(signal, "SIGUSR2", None)
+        if sig is None:
+            print("❌ No SIGUSR2 on this platform; use the control socket.")
+            return 1
+        os.kill(args.pid, sig)
+        print(f"🔬 toggled profiler in pid {args.pid}")
+        return 0
+    try:
+        print(send(args.command, args.port))
+    except OSError as e:
+        print(f"❌ No profiler control socket: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
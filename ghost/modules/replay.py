@@ -0,0 +1,541 @@
+# ghost/modules/replay.py
+"""Session record / replay harness for end-to-end latency regressions.
+
+Until now a full G.H.O.S.T. turn could only be reproduced with a microphone
+and the live OpenAI API. This module makes turns reproducible offline:
+
+1. **Recorder** – with `"record_sessions": "<dir>"` in config.json (or
+   ``GHOST_RECORD=<dir>``) every API request / response passes through
+   `RecordingTransport`, which logs the request body, response headers and
+   every response chunk with its time offset, tagged with the turn current
+   when the request started and whether it was made on the reply path
+   (inside `stream_chat` / `transcribe_audio`, see `foreground()`) or in the
+   background (memory analysis, summaries, TTS). `stream_chat` and
+   `transcribe_audio` mark turn boundaries; `MemoryAnalyzer` notes the size
+   of every analysis batch. For each voice turn the denoised
+   WAV sent for transcription is copied next to the log, together with the
+   raw microphone frames `capture_audio` read for it. One directory per
+   session:
+
+       recordings/20261019-142501/
+           session.jsonl     # turn / api / audio events, in order
+           turn_001.wav      # denoised speech segment (transcribed)
+           turn_001.raw.wav  # raw capture (re-run through the VAD)
+
+2. **Local OpenAI stand-in** – `ReplayTransport` answers the client's HTTP
+   calls from the recording, matching on (method, path, body) with a
+   per-endpoint FIFO fallback, and reproduces the original time-to-headers and
+   chunk timing (optionally scaled with ``--speed``).
+
+3. **Replay runner** – seeds the conversation like a live one, drives
+   `chat_engine.stream_chat` (or `main.handle_interaction` with
+   ``--entry main``) turn by turn, including transcription and a VAD pass over
+   the raw capture of voice turns, and reports per-turn latency and API
+   calls. Memory analysis is replayed with the recorded batches. It exits
+   non-zero when a turn makes more reply-path API calls than the recording
+   did, the session makes more background calls in total, a turn makes more
+   than one embedding call on the reply path, a request has no recorded
+   response, or a turn exceeds ``--max-turn-ms``, so a slowdown fails a
+   local run.
+
+    python -m ghost.modules.replay recordings/20261019-142501 --speed 1
+    python -m ghost.modules.replay recordings/20261019-142501 --speed 0 --json
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import shutil
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+
+SESSION_FILE = "session.jsonl"
+
+# Headers that must not be replayed verbatim
+_DROP_HEADERS = {"set-cookie", "date", "transfer-encoding", "connection"}
+
+
+# ---------------------------------------------------------------------------
+#                                 HELPERS
+# ---------------------------------------------------------------------------
+
+def _body_key(request: httpx.Request) -> str:
+    """Stable fingerprint of a request body (JSON canonicalised)."""
+    body = request.content
+    ctype = request.headers.get("content-type", "")
+    if ctype.startswith("application/json"):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode()
+        except ValueError:
+            pass
+    elif ctype.startswith("multipart/"):
+        # Boundaries are random; only the endpoint is meaningful
+        body = b""
+    return hashlib.sha1(body).hexdigest()
+
+
+def _endpoint(request: httpx.Request) -> str:
+    return f"{request.method} {request.url.path}"
+
+
+_local = threading.local()
+
+
+@contextmanager
+def foreground() -> Iterator[None]:
+    """Mark API calls made on this thread as the current turn's reply path."""
+    _local.depth = getattr(_local, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _local.depth -= 1
+
+
+def in_foreground() -> bool:
+    return getattr(_local, "depth", 0) > 0
+
+
+# ---------------------------------------------------------------------------
+#                                RECORDER
+# ---------------------------------------------------------------------------
+
+class SessionRecorder:
+    """Append-only writer for one recorded session directory."""
+
+    def __init__(self, root: str | Path):
+        self.dir = Path(root) / datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.dir / SESSION_FILE, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._turn = 0
+        self._audio_turn = False  # current turn was opened by note_audio
+        self._raw: Optional[tuple[bytes, int]] = None  # last capture, until its WAV is noted
+
+    def _now_ms(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def write(self, event: dict) -> None:
+        with self._lock:
+            event.setdefault("t", self._now_ms())
+            event.setdefault("turn", self._turn)
+            self._fh.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._fh.flush()
+
+    def note_capture(self, pcm: bytes, rate: int) -> None:
+        """Raw int16 mono frames of the capture that produced the next WAV."""
+        with self._lock:
+            self._raw = (pcm, rate)
+
+    def note_audio(self, path: str) -> None:
+        """Voice turn: keep a copy of the captured WAV (and its raw frames)."""
+        with self._lock:
+            self._turn += 1
+            self._audio_turn = True
+            name = f"turn_{self._turn:03d}.wav"
+            raw, self._raw = self._raw, None
+        try:
+            shutil.copyfile(path, self.dir / name)
+        except OSError:
+            return
+        event = {"type": "audio", "file": name}
+        if raw is not None:
+            import numpy as np
+            import soundfile as sf
+
+            event["raw"] = f"turn_{self._turn:03d}.raw.wav"
+            sf.write(self.dir / event["raw"], np.frombuffer(raw[0], dtype=np.int16), raw[1], subtype="PCM_16")
+        self.write(event)
+
+    def note_turn(self, text: str) -> None:
+        """Start of a chat turn (after transcription for voice turns)."""
+        with self._lock:
+            if not self._audio_turn:
+                self._turn += 1
+            self._audio_turn = False
+        self.write({"type": "turn", "text": text})
+
+    def note_turn_end(self) -> None:
+        self.write({"type": "turn_end"})
+
+    def note_analysis(self, turns: int) -> None:
+        """One memory-analysis call covering the next *turns* submitted turns."""
+        self.write({"type": "analysis", "turns": turns})
+
+    @property
+    def turn(self) -> int:
+        with self._lock:
+            return self._turn
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    def __init__(self, inner: httpx.SyncByteStream, t0: float, on_done):
+        self._inner = inner
+        self._t0 = t0
+        self._chunks: List[tuple[float, str]] = []
+        self._on_done = on_done
+        self._done = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._inner:
+            offset = round((time.perf_counter() - self._t0) * 1000, 3)
+            self._chunks.append((offset, base64.b64encode(chunk).decode("ascii")))
+            yield chunk
+
+    def close(self) -> None:
+        self._inner.close()
+        if not self._done:
+            self._done = True
+            self._on_done(self._chunks)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """Pass-through transport that logs every exchange to a SessionRecorder."""
+
+    def __init__(self, inner: httpx.BaseTransport, recorder: SessionRecorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        t0 = time.perf_counter()
+        started = self.recorder._now_ms()
+        turn, fg = self.recorder.turn, in_foreground()  # at request start, not when the body is done
+        resp = self.inner.handle_request(request)
+        ttfb = round((time.perf_counter() - t0) * 1000, 3)
+        headers = [(k, v) for k, v in resp.headers.multi_items() if k.lower() not in _DROP_HEADERS]
+
+        def on_done(chunks):
+            self.recorder.write({
+                "type": "api",
+                "t": started,
+                "turn": turn,
+                "fg": fg,
+                "endpoint": _endpoint(request),
+                "key": _body_key(request),
+                "status": resp.status_code,
+                "headers": headers,
+                "ttfb_ms": ttfb,
+                "chunks": chunks,
+            })
+
+        return httpx.Response(
+            resp.status_code,
+            headers=resp.headers,
+            stream=_RecordingStream(resp.stream, t0, on_done),
+            extensions=resp.extensions,
+        )
+
+
+_recorder: Optional[SessionRecorder] = None
+
+
+def start_recording(root: str | Path, cfg=None) -> SessionRecorder:
+    """Begin recording this process's API traffic and turns under *root*."""
+    global _recorder
+    if cfg is None:
+        from ghost.modules.openai_client import config as cfg
+    _recorder = SessionRecorder(root)
+    cfg.install_transport(RecordingTransport(cfg.transport.inner, _recorder))
+    print(f"⏺ Recording session → {_recorder.dir}")
+    return _recorder
+
+
+def current_recorder() -> Optional[SessionRecorder]:
+    return _recorder
+
+
+# ---------------------------------------------------------------------------
+#                         LOCAL OPENAI STAND-IN
+# ---------------------------------------------------------------------------
+
+class _ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks: List[list], speed: float, t0: float):
+        self._chunks = chunks
+        self._speed = speed
+        self._t0 = t0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for offset, data in self._chunks:
+            if self._speed:
+                delay = offset * self._speed / 1000 - (time.perf_counter() - self._t0)
+                if delay > 0:
+                    time.sleep(delay)
+            yield base64.b64decode(data)
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """Serves recorded responses with their original (or scaled) timing."""
+
+    def __init__(self, api_events: List[dict], speed: float = 1.0):
+        self.speed = speed
+        self._by_key: Dict[tuple, deque] = defaultdict(deque)
+        self._by_endpoint: Dict[str, deque] = defaultdict(deque)
+        for ev in api_events:
+            self._by_key[(ev["endpoint"], ev["key"])].append(ev)
+            self._by_endpoint[ev["endpoint"]].append(ev)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.unmatched: Dict[str, int] = defaultdict(int)
+        # Reply-path calls (see `foreground()`), as opposed to background
+        # analysis / summaries / cache refreshes
+        self.fg_calls: Dict[str, int] = defaultdict(int)
+
+    def _take(self, endpoint: str, key: str) -> Optional[dict]:
+        with self._lock:
+            self.calls[endpoint] += 1
+            if in_foreground():
+                self.fg_calls[endpoint] += 1
+            exact = self._by_key.get((endpoint, key))
+            ev = exact.popleft() if exact else None
+            if ev is None:
+                fifo = self._by_endpoint.get(endpoint)
+                ev = fifo.popleft() if fifo else None
+                if ev is not None:
+                    same = self._by_key[(endpoint, ev["key"])]
+                    if ev in same:
+                        same.remove(ev)
+            else:
+                self._by_endpoint[endpoint].remove(ev)
+            if ev is None:
+                self.unmatched[endpoint] += 1
+            return ev
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+    def fg_total(self, suffix: str = "") -> int:
+        """Reply-path calls so far (to endpoints ending in *suffix*)."""
+        with self._lock:
+            return sum(n for ep, n in self.fg_calls.items() if ep.endswith(suffix))
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        t0 = time.perf_counter()
+        endpoint = _endpoint(request)
+        ev = self._take(endpoint, _body_key(request))
+        if ev is None:
+            return httpx.Response(
+                404,
+                json={"error": {"message": f"replay: no recorded response for {endpoint}",
+                                "type": "replay_miss"}},
+            )
+        if self.speed:
+            time.sleep(ev["ttfb_ms"] * self.speed / 1000)
+        return httpx.Response(
+            ev["status"],
+            headers=ev["headers"],
+            stream=_ReplayStream(ev["chunks"], self.speed, t0),
+        )
+
+
+# ---------------------------------------------------------------------------
+#                              REPLAY RUNNER
+# ---------------------------------------------------------------------------
+
+def load_session(path: str | Path) -> tuple[List[dict], List[dict], List[int]]:
+    """Return (turns, api_events, analysis batch sizes) from a recorded session directory.
+
+    A turn's ``api_calls`` counts its reply-path calls; background calls are
+    only meaningful as a session total (recordings from before the ``fg``
+    tag count every call against its turn).
+    """
+    path = Path(path)
+    events = [json.loads(l) for l in (path / SESSION_FILE).read_text("utf-8").splitlines() if l.strip()]
+    api = [e for e in events if e["type"] == "api"]
+    batches = [e["turns"] for e in events if e["type"] == "analysis"]
+
+    turns: Dict[int, dict] = {}
+    for e in events:
+        n = e.get("turn", 0)
+        if n == 0:
+            continue
+        turn = turns.setdefault(n, {"turn": n, "text": None, "audio": None, "raw": None,
+                                    "api_calls": 0, "start": None, "end": None})
+        if e["type"] == "audio":
+            turn["audio"] = str(path / e["file"])
+            turn["raw"] = str(path / e["raw"]) if e.get("raw") else None
+            turn["start"] = turn["start"] if turn["start"] is not None else e["t"]
+        elif e["type"] == "turn":
+            turn["text"] = e["text"]
+            turn["start"] = turn["start"] if turn["start"] is not None else e["t"]
+        elif e["type"] == "turn_end":
+            turn["end"] = e["t"]
+        elif e["type"] == "api" and e.get("fg", True):
+            turn["api_calls"] += 1
+    for t in turns.values():
+        t["recorded_ms"] = (t["end"] - t["start"]) if t["end"] is not None and t["start"] is not None else None
+    return [turns[n] for n in sorted(turns)], api, batches
+
+
+def run_replay(path: str | Path, speed: float = 1.0, entry: str = "chat") -> List[dict]:
+    """Replay a recorded session through the real pipeline; return per-turn results."""
+    from ghost.modules import tracing
+    from ghost.modules.openai_client import config
+
+    turns, api, batches = load_session(path)
+    # Recordings from before the fg tag: compare every call per turn, as before
+    tagged = any("fg" in e for e in api)
+    recorded_bg = sum(1 for e in api if not e.get("fg", True)) if tagged else None
+    transport = ReplayTransport(api, speed=speed)
+    prev = config.install_transport(transport)
+    try:
+        from ghost.modules.chat_engine import stream_chat
+        from ghost.modules.conversation import Conversation
+        from ghost.modules.memory_analysis import get_analyzer
+        from ghost.modules.retrieval_cache import get_retrieval_cache
+        from ghost.modules.segmenter import Endpointing, segment_file
+        from ghost.modules.transcribe import transcribe_audio
+
+        if entry == "main":
+            import main as ghost_main
+            ghost_main.MODE = "text"
+
+            def drive(text, conversation):
+                ghost_main.handle_interaction(text, conversation)
+        else:
+            def drive(text, conversation):
+                for _ in stream_chat(text, conversation):
+                    pass
+
+        # Same endpointing as capture_audio, same seed as main.new_conversation
+        ep_cfg = config.get("endpointing", {})
+        endpointing = Endpointing.from_config(ep_cfg) if ep_cfg.get("adaptive", True) else None
+        conversation = Conversation(get_retrieval_cache().retrieve("user memory"))
+
+        # Memory analysis: the live worker batched turns by timing; replay the
+        # recorded batches instead (sessions without them: one per turn)
+        analyzer = get_analyzer()
+        submitted: List[tuple] = []
+        pending_batches = deque(batches)
+        if batches:
+            analyzer.submit = lambda user_msg, reply: submitted.append((user_msg, reply))
+
+        def analyze_recorded_batches():
+            if not batches:
+                analyzer.flush(timeout=30)
+            while pending_batches and len(submitted) >= pending_batches[0]:
+                n = pending_batches.popleft()
+                analyzer.analyze_now(submitted[:n])
+                del submitted[:n]
+
+        count_calls = transport.fg_total if tagged else transport.total_calls
+        results = []
+        for turn in turns:
+            tracing.new_turn()  # spans of this turn and its background work
+            calls_before = count_calls()
+            embeds_before = transport.fg_total("/embeddings")
+            t0 = time.perf_counter()
+            vad = None
+            text = turn["text"]
+            if turn["raw"]:
+                # The denoised WAV is already a segment; only raw frames say anything about VAD
+                vad = segment_file(turn["raw"], endpointing=endpointing)
+            if turn["audio"]:
+                text = transcribe_audio(turn["audio"]) or text
+            if text:
+                drive(text, conversation)
+            latency_ms = round((time.perf_counter() - t0) * 1000, 1)
+            embed_calls = transport.fg_total("/embeddings") - embeds_before
+            if tagged:
+                calls = count_calls() - calls_before
+            analyze_recorded_batches()
+            get_retrieval_cache().flush(timeout=30)
+            conversation.flush(timeout=30)
+            if not tagged:
+                calls = count_calls() - calls_before
+            results.append({
+                "turn": turn["turn"],
+                "text": text,
+                "latency_ms": latency_ms,
+                "recorded_ms": turn["recorded_ms"],
+                "api_calls": calls,
+                "recorded_api_calls": turn["api_calls"],
+                "embed_calls": embed_calls,
+                "vad_segments": len(vad.get("segments", ())) if vad else None,
+            })
+        if batches:
+            del analyzer.submit
+        bg_calls = transport.total_calls() - transport.fg_total()
+        results.append({"unmatched": dict(transport.unmatched), "calls": dict(transport.calls),
+                        "background_calls": bg_calls, "recorded_background_calls": recorded_bg,
+                        "endpoints": config.api_stats(),
+                        "retrieval_cache": get_retrieval_cache().stats.to_dict()})
+        return results
+    finally:
+        config.install_transport(prev)
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Replay a recorded G.H.O.S.T. session against a local OpenAI stand-in.")
+    ap.add_argument("session", help="recorded session directory")
+    ap.add_argument("--speed", type=float, default=1.0, help="latency scale (1 = original, 0 = instant)")
+    ap.add_argument("--entry", choices=("chat", "main"), default="chat",
+                    help="drive chat_engine.stream_chat or main.handle_interaction")
+    ap.add_argument("--max-turn-ms", type=float, default=None, help="fail if any turn is slower")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    results = run_replay(args.session, speed=args.speed, entry=args.entry)
+    summary = results.pop()
+    failures = []
+    for r in results:
+        if r["api_calls"] > r["recorded_api_calls"]:
+            failures.append(f"turn {r['turn']}: {r['api_calls']} API calls (recorded {r['recorded_api_calls']})")
+        if r["embed_calls"] > 1:
+            failures.append(f"turn {r['turn']}: {r['embed_calls']} embedding calls on the reply path (max 1)")
+        if args.max_turn_ms is not None and r["latency_ms"] > args.max_turn_ms:
+            failures.append(f"turn {r['turn']}: {r['latency_ms']} ms > {args.max_turn_ms} ms")
+    if summary["recorded_background_calls"] is not None and \
+            summary["background_calls"] > summary["recorded_background_calls"]:
+        failures.append(f"session: {summary['background_calls']} background API calls "
+                        f"(recorded {summary['recorded_background_calls']})")
+    for endpoint, n in summary["unmatched"].items():
+        failures.append(f"{n} unmatched request(s) to {endpoint} (no recorded response)")
+
+    if args.json:
+        print(json.dumps({"turns": results, **summary, "failures": failures}, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'turn':>4}  {'latency ms':>10}  {'recorded ms':>11}  {'calls':>5}  {'rec calls':>9}  text")
+        for r in results:
+            rec = f"{r['recorded_ms']:.1f}" if r["recorded_ms"] is not None else "-"
+            print(f"{r['turn']:>4}  {r['latency_ms']:>10.1f}  {rec:>11}  {r['api_calls']:>5}  "
+                  f"{r['recorded_api_calls']:>9}  {(r['text'] or '')[:40]}")
+        bg = f"background {summary['background_calls']}"
+        if summary["recorded_background_calls"] is not None:
+            bg += f", recorded {summary['recorded_background_calls']}"
+        print(f"\n📡 calls per endpoint: {summary['calls']} ({bg})")
+        for name, st in summary["endpoints"].items():
+            print(f"   {name:<22} calls={st['calls']} coalesced={st['coalesced']} "
+                  f"mean={st['mean_latency_ms']} ms throttled={st['throttled_ms']} ms "
+                  f"out={st['bytes_out']} B in={st['bytes_in']} B")
+        cs = summary["retrieval_cache"]
+        print(f"🗂️ retrieval cache: hits={cs['hits']} misses={cs['misses']} "
+              f"embeds_saved={cs['embeds_saved']} refreshed={cs['refreshed']}")
+        for f in failures:
+            print(f"❌ {f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    # Run the imported module, not this __main__ copy: chat_engine and
+    # transcribe mark foreground() on ghost.modules.replay's thread-local
+    from ghost.modules.replay import main
+    sys.exit(main())
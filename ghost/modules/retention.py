@@ -0,0 +1,148 @@
+# ghost/modules/retention.py
+"""Retention policy for the long-term memory store.
+
+`memory_store.jsonl` used to grow forever: `retrieve` down-weighted old facts
+with an `age_factor` but nothing ever expired, so scan cost, file size and
+load time grew with every day of use.
+
+This module decides *what to forget*:
+
+1. **Budgets** – `max_items` and `max_bytes` (serialised JSONL size).
+2. **Keep-score** – weighted mix of
+   • recency: exponential decay since the fact was written or last retrieved
+     (`t` / `last`), half-life `half_life_days`;
+   • frequency: `log1p(hits)` where `hits` counts retrieve hits;
+   • slot priority: `slot_priority` map (e.g. NAME outranks PREF).
+   Lowest scores are evicted first.
+3. **Pinning** – items with `"pin": true`, or whose slot is in `pin_slots`,
+   are never evicted.
+4. **Incremental background eviction** – `Retainer` runs on a daemon thread,
+   is poked after every store write and removes at most `batch` items per
+   pass, so neither the conversation loop nor a single write ever pays for a
+   large clean-up.
+
+Configured through config.json:
+    "retention": {"max_items": 5000, "max_bytes": 50000000, "batch": 100,
+                  "half_life_days": 30, "pin_slots": ["NAME"],
+                  "slot_priority": {"NAME": 1.0, "LOCATION": 0.8}}
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+_DAY = 24 * 3600
+
+
+@dataclass
+class RetentionPolicy:
+    max_items: int = 5000
+    max_bytes: int = 50_000_000
+    batch: int = 100                 # max evictions per background pass
+    interval_sec: float = 60.0       # background re-check period
+    half_life_days: float = 30.0
+    w_recency: float = 0.5
+    w_frequency: float = 0.3
+    w_slot: float = 0.2
+    default_slot_priority: float = 0.3
+    slot_priority: Dict[str, float] = field(default_factory=lambda: {
+        "NAME": 1.0, "LOCATION": 0.8, "HABIT": 0.5, "PREF": 0.5, "OTHER": 0.2, "GENERIC": 0.2,
+    })
+    pin_slots: Sequence[str] = ("NAME",)
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "RetentionPolicy":
+        known = {k: v for k, v in cfg.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+    def is_pinned(self, item: dict) -> bool:
+        return bool(item.get("pin")) or item.get("slot", "generic") in self.pin_slots
+
+
+def keep_scores(items: Sequence[dict], policy: RetentionPolicy, now: float | None = None) -> np.ndarray:
+    """Vectorised keep-score per item (higher = keep longer)."""
+    now = time.time() if now is None else now
+    n = len(items)
+    last = np.fromiter((max(it.get("t", 0.0), it.get("last", 0.0)) for it in items), dtype=np.float64, count=n)
+    hits = np.fromiter((it.get("hits", 0) for it in items), dtype=np.float64, count=n)
+    prio = np.fromiter(
+        (policy.slot_priority.get(it.get("slot", "GENERIC"), policy.default_slot_priority) for it in items),
+        dtype=np.float64, count=n,
+    )
+    age_days = np.maximum(now - last, 0.0) / _DAY
+    recency = np.exp(-age_days * math.log(2) / policy.half_life_days)
+    freq = np.log1p(hits)
+    freq = freq / (1.0 + freq)  # squash into [0, 1)
+    return policy.w_recency * recency + policy.w_frequency * freq + policy.w_slot * prio
+
+
+def plan_eviction(
+    items: Sequence[dict],
+    sizes: Sequence[int],
+    policy: RetentionPolicy,
+    limit: int | None = None,
+    now: float | None = None,
+) -> List[int]:
+    """Indices to drop (lowest keep-score first) to get within budget.
+
+    At most *limit* indices are returned so callers can evict incrementally.
+    """
+    n = len(items)
+    total = int(sum(sizes))
+    if n <= policy.max_items and total <= policy.max_bytes:
+        return []
+
+    scores = keep_scores(items, policy, now)
+    candidates = [i for i in np.argsort(scores, kind="stable") if not policy.is_pinned(items[i])]
+    out: List[int] = []
+    for i in candidates:
+        if n <= policy.max_items and total <= policy.max_bytes:
+            break
+        if limit is not None and len(out) >= limit:
+            break
+        out.append(int(i))
+        n -= 1
+        total -= sizes[i]
+    return out
+
+
+class Retainer:
+    """Background worker that trims the store in small batches.
+
+    *evict_batch* is supplied by the store: it must apply `plan_eviction`
+    under the store's own write path and return how many items it removed.
+    """
+
+    def __init__(self, policy: RetentionPolicy, evict_batch: Callable[[int], int]):
+        self.policy = policy
+        self._evict_batch = evict_batch
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def notify(self) -> None:
+        """Called after store writes; starts the worker lazily."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ghost-retention", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.policy.interval_sec)
+            self._wake.clear()
+            try:
+                # Keep taking small bites until within budget, yielding in between
+                while (removed := self._evict_batch(self.policy.batch)):
+                    self.evicted += removed
+                    time.sleep(0.05)
+            except Exception as e:
+                print(f"❌ Memory retention pass failed: {e}")
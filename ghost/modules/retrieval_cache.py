@@ -0,0 +1,270 @@
+# ghost/modules/retrieval_cache.py
+"""Session-level cache for long-term memory lookups.
+
+`build_context` called `retrieve(user_text)` on every turn: one embedding
+round trip plus a full index scan, even when consecutive messages stayed on
+one topic and pulled the same facts.
+
+1. **Topic radius** – `RetrievalCache` keeps the last few query vectors with
+   their top-k facts. A query whose vectors lie within `radius` (cosine) of a
+   cached one's reuses that entry's facts instead of scanning the index.
+   With a `history` text (multi-query mode) the message and the recent user
+   turns are searched together, see `memory.search`. Both texts go out in one
+   batched `embed_queries` call (the history is skipped only if its exact
+   text is memoised), so a turn costs at most one embedding round trip and
+   one scan; `replay` fails a turn that makes more.
+2. **Query memo** – vectors are memoised by text, so a repeated message (or
+   the "user memory" seed of every conversation) costs no embedding call.
+3. **Invalidation** – entries are tagged with the store version they were
+   searched at and never served once the store has moved on
+   (`replace_or_add_fact`, eviction, another process). On a change the worker
+   re-runs the most recent entries with their stored vectors – a scan, no
+   embedding – so the next turn can still hit.
+
+Configured through config.json (all optional):
+    "retrieval_cache": {"radius": 0.92, "capacity": 16, "refresh": 4,
+                        "history_weight": 0.8}
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ghost.modules import memory
+from ghost.modules.openai_client import config
+from ghost.modules.tracing import bind, traced
+
+
+@dataclass
+class _Entry:
+    backend: str
+    qvecs: np.ndarray  # (m, dim): the message, then the history text if any
+    weights: Optional[List[float]]
+    k: int
+    version: int
+    items: List[memory.MemoryItem]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0          # served from a cached topic
+    misses: int = 0        # searched the index
+    embeds_saved: int = 0  # query vectors served from the memo
+    refreshed: int = 0     # stale entries re-searched after a store change
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class RetrievalCache:
+    """Topic-keyed top-k cache in front of `memory.search`."""
+
+    def __init__(
+        self,
+        radius: float | None = None,
+        capacity: int = 16,
+        refresh: int = 4,
+        memo_size: int = 64,
+        history_weight: float = 0.8,
+    ):
+        self._radius = radius
+        self.history_weight = history_weight
+        self.capacity = capacity
+        self.refresh = refresh
+        self.memo_size = memo_size
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Tuple[Tuple[str, ...], int], _Entry]" = OrderedDict()  # most recent last
+        self._memo: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._jobs: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pending = 0  # queued jobs not yet finished; guarded by _lock
+        self._idle = threading.Event()
+        self._idle.set()
+        self._refresh_queued = False
+        memory.on_store_change(self._on_change)
+
+    @classmethod
+    def from_config(cls) -> "RetrievalCache":
+        cfg = config.get("retrieval_cache", {})
+        return cls(
+            radius=cfg.get("radius"),
+            capacity=cfg.get("capacity", 16),
+            refresh=cfg.get("refresh", 4),
+            history_weight=cfg.get("history_weight", 0.8),
+        )
+
+    @property
+    def radius(self) -> float:
+        # Similarity scales differ per backend; see EmbeddingBackend
+        return self._radius if self._radius is not None else memory.get_backend().cache_radius
+
+    # ------------------------------------------------------------------
+    #                             LOOKUPS
+    # ------------------------------------------------------------------
+
+    @traced("retrieve")
+    def retrieve(self, query: str, k: int = 4, history: str | None = None) -> List[dict]:
+        """Prompt messages for *query*, like `memory.retrieve`.
+
+        With *history* (e.g. `Conversation.recent_text()`) both texts go out
+        in one embedding call and facts matching either are considered; the
+        history counts `history_weight` as much as the message.
+        """
+        backend = memory.get_backend().name
+        texts, weights = self._queries(query, history)
+        qvecs = self._embed(texts)
+        entry = self._lookup(backend, qvecs, k, memory.store_version())
+        if entry is None:
+            version, items = memory.search(qvecs, k, weights=weights)
+            self._put(texts, _Entry(backend, qvecs, weights, k, version, items))
+            with self._lock:
+                self.stats.misses += 1
+        else:
+            items = entry.items
+            with self._lock:
+                self.stats.hits += 1
+        return memory.use_memories(items)
+
+    def _queries(self, query: str, history: str | None) -> Tuple[List[str], Optional[List[float]]]:
+        if history and history.strip() and history != query:
+            return [query, history], [1.0, self.history_weight]
+        return [query], None
+
+    def _lookup(self, backend: str, qvecs: np.ndarray, k: int, version: int) -> Optional[_Entry]:
+        with self._lock:
+            live = [e for e in self._entries.values()
+                    if e.version == version and e.k == k and e.backend == backend
+                    and e.qvecs.shape == qvecs.shape]
+        if not live:
+            return None
+        # Every query row must stay on topic: (entries, m) row-wise cosines
+        sims = np.einsum("emd,md->em", np.stack([e.qvecs for e in live]), qvecs).min(axis=1)
+        best = int(np.argmax(sims))
+        return live[best] if sims[best] >= self.radius else None
+
+    def _put(self, texts: List[str], entry: _Entry) -> None:
+        with self._lock:
+            key = (tuple(texts), entry.k)
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """Query vectors for *texts*; memo misses go out in one batched call."""
+        backend = memory.get_backend()
+        out: Dict[int, np.ndarray] = {}
+        with self._lock:
+            for i, t in enumerate(texts):
+                vec = self._memo.get((backend.name, t))
+                if vec is not None:
+                    self._memo.move_to_end((backend.name, t))
+                    out[i] = vec
+            self.stats.embeds_saved += len(out)
+        todo = [i for i in range(len(texts)) if i not in out]
+        if todo:
+            fresh = memory.embed_queries([texts[i] for i in todo])
+            with self._lock:
+                for i, vec in zip(todo, fresh):
+                    out[i] = vec
+                    self._memo[(backend.name, texts[i])] = vec
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+        return np.stack([out[i] for i in range(len(texts))])
+
+    # ------------------------------------------------------------------
+    #                        BACKGROUND WORK
+    # ------------------------------------------------------------------
+
+    def _on_change(self, version: int) -> None:
+        # Runs on the store's writer / watcher thread: just queue the work
+        with self._lock:
+            if self._refresh_queued:
+                return
+            self._refresh_queued = True
+        self._submit(self._refresh)
+
+    def _refresh(self) -> None:
+        """Re-search the newest stale entries with their stored vectors; drop the rest."""
+        with self._lock:
+            self._refresh_queued = False
+        backend = memory.get_backend().name
+        version = memory.store_version()
+        with self._lock:
+            for key in [key for key, e in self._entries.items() if e.backend != backend]:
+                del self._entries[key]
+            stale = [(key, e) for key, e in self._entries.items() if e.version != version]
+            for key, _ in stale[:-self.refresh or None]:
+                del self._entries[key]
+            stale = stale[-self.refresh:] if self.refresh else []
+        for key, e in stale:
+            version, items = memory.search(e.qvecs, e.k, weights=e.weights)
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key] = _Entry(backend, e.qvecs, e.weights, e.k, version, items)
+                    self.stats.refreshed += 1
+
+    def _submit(self, job: Callable[[], None]) -> None:
+        with self._lock:
+            self._pending += 1
+            self._idle.clear()
+            self._jobs.put(bind(job))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ghost-retrieval-cache", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                job()
+            except Exception as e:
+                print(f"❌ Retrieval refresh error: {e}")
+            with self._lock:
+                self._pending -= 1
+                if self._pending == 0:
+                    self._idle.set()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until queued refresh work has finished."""
+        return self._idle.wait(timeout)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def memo_state(self) -> Tuple[List[List[str]], np.ndarray | None]:
+        """Memoised query vectors of the active backend: ``([text, ...], (n, dim))``."""
+        backend = memory.get_backend().name
+        with self._lock:
+            pairs = [(t, v) for (b, t), v in self._memo.items() if b == backend]
+        if not pairs:
+            return [], None
+        return [t for t, _ in pairs], np.stack([v for _, v in pairs])
+
+    def restore_memo(self, backend: str, texts: List[str], vecs: np.ndarray) -> None:
+        with self._lock:
+            for t, v in zip(texts, vecs):
+                self._memo[(backend, t)] = v
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+
+_cache: RetrievalCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Return the shared cache, creating it from config on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = RetrievalCache.from_config()
+        return _cache
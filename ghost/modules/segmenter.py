@@ -0,0 +1,493 @@
+# ghost/modules/segmenter.py
+"""Source-agnostic speech segmentation (VAD + RMS gate) for G.H.O.S.T.
+
+`capture_audio` used to run the whole endpointing logic inline against a live
+PyAudio stream, doing `np.frombuffer` → `astype(float32)` → RMS → `isnan` →
+`time.time()` for every 30 ms frame. That made it impossible to regression
+test endpointing on recorded audio.
+
+This module pulls the logic out into `Segmenter`:
+
+1. **Any source** – feed it int16 PCM (bytes or ndarray) from a microphone, a
+   WAV file or a synthetic buffer. Time is derived from the frame counter, not
+   the wall clock, so offline runs are deterministic.
+2. **Batched frames** – a batch of N frames is reshaped to `(N, FRAME_SAMPLES)`
+   and its RMS is computed in one vectorised pass into preallocated scratch
+   buffers. Only the WebRTC-VAD call remains per frame.
+3. **Preallocated audio** – pre-speech ring and utterance buffer are fixed
+   numpy arrays sized from `pre_speech_ms` / `max_segment_ms`.
+4. **Offline corpus mode** – `segment_corpus()` fans hundreds of WAV files out
+   over a process pool (much faster than realtime) and returns a per-file
+   report of detected segments and processing time.
+5. **Adaptive endpointing** – with an `Endpointing` policy the trigger level
+   follows a running noise-floor estimate and the end-of-speech timeout is set
+   per utterance from its own pause statistics, clamped to min/max bounds
+   (the upper bound never exceeds the caller's `silence_timeout_ms`).
+   Every segment records its end-of-turn latency (`eot_ms`: trailing silence
+   between the last speech frame and finalisation).
+6. **Echo gate** – while `echo` is set (the assistant's own reply is playing)
+   the trigger level is raised by `echo_rms_factor` and speech must last
+   `echo_onset_ms` before a segment opens, so the loudspeaker does not barge
+   in on itself while a real interruption still gets through.
+
+CLI:
+    python -m ghost.modules.segmenter recordings/ --workers 8 --report vad.json
+    python -m ghost.modules.segmenter recordings/ --fixed   # legacy 1200 ms baseline
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+import webrtcvad
+
+# ---------------------------------------------------------------------------
+#                                CONSTANTS
+# ---------------------------------------------------------------------------
+
+RATE = 16000
+FRAME_MS = 30
+VAD_RATES = (8000, 16000, 32000, 48000)
+
+# RMS threshold to avoid false triggers (e.g., keyboard clicks)
+MIN_RMS_THRESHOLD = 300  # adjust between 300-600 as needed
+
+# Offline batch size (frames per vectorised pass) ≈ 1 s of audio
+_BATCH_FRAMES = 32
+
+
+@dataclass
+class Endpointing:
+    """Adaptive endpointing policy (all bounds configurable via config.json)."""
+
+    min_rms: float = MIN_RMS_THRESHOLD   # trigger threshold never below this
+    max_rms: float = 3000.0              # … nor above this
+    noise_ratio: float = 3.0             # threshold = noise floor × ratio
+    noise_alpha: float = 0.05            # EMA weight of each non-speech frame
+    min_silence_ms: int = 300            # earliest possible end of turn
+    max_silence_ms: int = 1200           # latest end of turn (old fixed value)
+    initial_silence_ms: int = 700        # before any pause has been observed
+    pause_factor: float = 1.5            # timeout = longest typical pause × factor
+    pause_alpha: float = 0.3             # EMA weight of pauses across utterances
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "Endpointing":
+        known = {k: v for k, v in cfg.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+
+@dataclass
+class Segment:
+    start_ms: int
+    end_ms: int
+    reason: str  # "silence" | "max" | "eof"
+    last_speech_ms: int = 0
+    audio: np.ndarray | None = field(default=None, repr=False)
+
+    @property
+    def eot_ms(self) -> int:
+        """End-of-turn latency: trailing silence before the segment closed."""
+        return self.end_ms - self.last_speech_ms
+
+    @property
+    def n_frames(self) -> int:
+        return (self.end_ms - self.start_ms) // FRAME_MS
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d.pop("audio")
+        d["eot_ms"] = self.eot_ms
+        return d
+
+
+# ---------------------------------------------------------------------------
+#                               SEGMENTER
+# ---------------------------------------------------------------------------
+
+class Segmenter:
+    """Streaming VAD endpointer that turns int16 PCM into speech segments."""
+
+    def __init__(
+        self,
+        rate: int = RATE,
+        frame_ms: int = FRAME_MS,
+        vad_level: int = 3,
+        min_rms: float = MIN_RMS_THRESHOLD,
+        pre_speech_ms: int = 300,
+        silence_timeout_ms: int = 1200,
+        max_segment_ms: int = 15000,
+        keep_audio: bool = True,
+        batch_frames: int = _BATCH_FRAMES,
+        endpointing: Endpointing | None = None,
+        echo_rms_factor: float = 3.0,
+        echo_onset_ms: int = 150,
+    ):
+        if rate not in VAD_RATES:
+            raise ValueError(f"Unsupported sample rate for VAD: {rate}")
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_samples = rate * frame_ms // 1000
+        self.min_rms = min_rms
+        self.silence_timeout_ms = silence_timeout_ms
+        self.keep_audio = keep_audio
+        self.endpointing = endpointing
+        self.echo_rms_factor = echo_rms_factor
+        self.echo = False  # set by the capture loop while playback is audible
+        self._echo_onset = max(echo_onset_ms // frame_ms, 1)
+
+        # Adaptive state survives reset(): it describes the room / speaker
+        ep = endpointing
+        self.noise_floor = (ep.min_rms / ep.noise_ratio) if ep else 0.0
+        self._pause_ema: float | None = None
+
+        self._vad = webrtcvad.Vad(vad_level)
+        self._pre_frames = max(pre_speech_ms // frame_ms, 0)
+        self._max_frames = max(max_segment_ms // frame_ms, 1)
+
+        # Preallocated buffers
+        self._batch_cap = batch_frames
+        self._scratch = np.empty((batch_frames, self.frame_samples), dtype=np.float32)
+        self._rms = np.empty(batch_frames, dtype=np.float32)
+        self._ring = np.zeros((self._pre_frames, self.frame_samples), dtype=np.int16)
+        self._rec = (
+            np.empty((self._max_frames, self.frame_samples), dtype=np.int16)
+            if keep_audio else None
+        )
+        self._carry = np.empty(0, dtype=np.int16)
+        self.reset()
+
+    # ------------------------------------------------------------------
+    #                              STATE
+    # ------------------------------------------------------------------
+
+    def reset(self) -> None:
+        self._frame_idx = 0      # frames consumed since reset → timeline
+        self._ring_len = 0
+        self._ring_pos = 0
+        self._recording = False
+        self._seg_start = 0
+        self._rec_len = 0
+        self._silence_ms = 0
+        self._last_speech = 0
+        self._max_pause = 0
+        self._onset = 0          # triggering frames counted towards a start
+        self._carry = self._carry[:0]
+
+    @property
+    def recording(self) -> bool:
+        return self._recording
+
+    @property
+    def elapsed_ms(self) -> int:
+        return self._frame_idx * self.frame_ms
+
+    @property
+    def threshold(self) -> float:
+        """Current RMS trigger level."""
+        ep = self.endpointing
+        if ep is None:
+            level = self.min_rms
+        else:
+            level = min(max(self.noise_floor * ep.noise_ratio, ep.min_rms), ep.max_rms)
+        return level * self.echo_rms_factor if self.echo else level
+
+    @property
+    def silence_timeout(self) -> int:
+        """Silence (ms) that ends the current utterance.
+
+        Adaptive mode stays within ``[min_silence_ms, max_silence_ms]`` and
+        never waits longer than `silence_timeout_ms`, the caller's own limit.
+        """
+        ep = self.endpointing
+        if ep is None:
+            return self.silence_timeout_ms
+        upper = min(ep.max_silence_ms, self.silence_timeout_ms)
+        lower = min(ep.min_silence_ms, upper)
+        pauses = [p for p in (self._pause_ema, self._max_pause) if p]
+        timeout = ep.pause_factor * max(pauses) if pauses else ep.initial_silence_ms
+        return int(min(max(timeout, lower), upper))
+
+    # ------------------------------------------------------------------
+    #                              FEEDING
+    # ------------------------------------------------------------------
+
+    def feed(self, pcm: bytes | np.ndarray) -> List[Segment]:
+        """Consume int16 PCM (any length) and return segments finished in it."""
+        samples = np.frombuffer(pcm, dtype=np.int16) if isinstance(pcm, (bytes, bytearray, memoryview)) else pcm
+        if self._carry.size:
+            samples = np.concatenate((self._carry, samples))
+        n_frames = samples.size // self.frame_samples
+        used = n_frames * self.frame_samples
+        self._carry = samples[used:].copy()
+
+        out: List[Segment] = []
+        frames = samples[:used].reshape(n_frames, self.frame_samples)
+        for lo in range(0, n_frames, self._batch_cap):
+            out.extend(self._feed_batch(frames[lo:lo + self._batch_cap]))
+        return out
+
+    def flush(self) -> List[Segment]:
+        """End of stream: close an open segment (reason ``"eof"``)."""
+        if self._recording:
+            return [self._finish("eof")]
+        return []
+
+    def _batch_rms(self, frames: np.ndarray) -> np.ndarray:
+        n = frames.shape[0]
+        scratch = self._scratch[:n]
+        rms = self._rms[:n]
+        np.copyto(scratch, frames, casting="unsafe")
+        np.einsum("ij,ij->i", scratch, scratch, out=rms)
+        rms /= self.frame_samples
+        np.sqrt(rms, out=rms)
+        return rms
+
+    def _feed_batch(self, frames: np.ndarray) -> List[Segment]:
+        out: List[Segment] = []
+        rms = self._batch_rms(frames)
+        rate = self.rate
+        ep = self.endpointing
+        for i in range(frames.shape[0]):
+            frame = frames[i]
+            is_speech = self._vad.is_speech(frame.tobytes(), rate)
+            self._frame_idx += 1
+
+            if not self._recording:
+                if is_speech and rms[i] > self.threshold:
+                    self._onset += 1
+                    if self._onset >= (self._echo_onset if self.echo else 1):
+                        self._start(frame)
+                        continue
+                else:
+                    self._onset = max(self._onset - 1, 0)  # leaky: short dips don't reset
+                    # Playback is not room noise: keep it out of the floor
+                    if ep is not None and not is_speech and not self.echo:
+                        self.noise_floor += ep.noise_alpha * (float(rms[i]) - self.noise_floor)
+                self._push_ring(frame)
+                continue
+
+            self._append(frame)
+            if is_speech:
+                if self._silence_ms:
+                    self._max_pause = max(self._max_pause, self._silence_ms)
+                self._silence_ms = 0
+                self._last_speech = self._frame_idx
+            else:
+                self._silence_ms += self.frame_ms
+
+            if self._silence_ms > self.silence_timeout:
+                out.append(self._finish("silence"))
+            elif self._frame_idx - self._seg_start >= self._max_frames:
+                out.append(self._finish("max"))
+        return out
+
+    # ------------------------------------------------------------------
+    #                         SEGMENT BOOKKEEPING
+    # ------------------------------------------------------------------
+
+    def _push_ring(self, frame: np.ndarray) -> None:
+        if not self._pre_frames:
+            return
+        self._ring[self._ring_pos] = frame
+        self._ring_pos = (self._ring_pos + 1) % self._pre_frames
+        self._ring_len = min(self._ring_len + 1, self._pre_frames)
+
+    def _start(self, frame: np.ndarray) -> None:
+        self._recording = True
+        self._onset = 0
+        self._silence_ms = 0
+        self._rec_len = 0
+        self._seg_start = self._frame_idx - 1 - self._ring_len
+        if self._ring_len:
+            first = (self._ring_pos - self._ring_len) % self._pre_frames
+            for j in range(self._ring_len):
+                self._append(self._ring[(first + j) % self._pre_frames])
+        self._ring_len = 0
+        self._last_speech = self._frame_idx
+        self._max_pause = 0
+        self._append(frame)
+
+    def _append(self, frame: np.ndarray) -> None:
+        if self._rec is not None and self._rec_len < self._max_frames:
+            self._rec[self._rec_len] = frame
+        self._rec_len += 1
+
+    def _finish(self, reason: str) -> Segment:
+        audio = None
+        if self._rec is not None:
+            audio = self._rec[:min(self._rec_len, self._max_frames)].reshape(-1).copy()
+        seg = Segment(
+            start_ms=self._seg_start * self.frame_ms,
+            end_ms=self._frame_idx * self.frame_ms,
+            reason=reason,
+            last_speech_ms=self._last_speech * self.frame_ms,
+            audio=audio,
+        )
+        ep = self.endpointing
+        if ep is not None and self._max_pause:
+            prev = self._pause_ema if self._pause_ema is not None else self._max_pause
+            self._pause_ema = prev + ep.pause_alpha * (self._max_pause - prev)
+        self._recording = False
+        self._max_pause = 0
+        self._rec_len = 0
+        self._silence_ms = 0
+        return seg
+
+
+# ---------------------------------------------------------------------------
+#                             OFFLINE MODE
+# ---------------------------------------------------------------------------
+
+def _read_pcm(path: Path) -> tuple[np.ndarray, int]:
+    """Read a WAV file as mono int16 samples."""
+    import soundfile as sf
+
+    data, rate = sf.read(str(path), dtype="int16", always_2d=True)
+    if data.shape[1] > 1:
+        data = data.mean(axis=1).astype(np.int16)
+    else:
+        data = data[:, 0]
+    return np.ascontiguousarray(data), rate
+
+
+def segment_file(path: str | Path, **params) -> dict:
+    """Segment one WAV file and return its report entry."""
+    path = Path(path)
+    entry: dict = {"file": str(path)}
+    try:
+        t0 = time.perf_counter()
+        samples, rate = _read_pcm(path)
+        seg = Segmenter(rate=rate, keep_audio=False, **params)
+        segments = seg.feed(samples) + seg.flush()
+        proc_s = time.perf_counter() - t0
+        duration_s = samples.size / rate
+        entry.update(
+            duration_s=round(duration_s, 3),
+            proc_s=round(proc_s, 4),
+            rtf=round(proc_s / duration_s, 4) if duration_s else None,
+            segments=[s.to_dict() for s in segments],
+        )
+    except Exception as e:
+        entry["error"] = str(e)
+    return entry
+
+
+def _segment_file_args(args: tuple[str, dict]) -> dict:
+    path, params = args
+    return segment_file(path, **params)
+
+
+def find_wavs(inputs: Iterable[str | Path]) -> List[Path]:
+    files: List[Path] = []
+    for p in map(Path, inputs):
+        if p.is_dir():
+            files.extend(sorted(p.rglob("*.wav")))
+        elif p.suffix.lower() == ".wav":
+            files.append(p)
+    return files
+
+
+def segment_corpus(paths: Iterable[str | Path], workers: int | None = None, **params) -> dict:
+    """Segment many WAV files across a process pool and build a report."""
+    files = [str(p) for p in paths]
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if workers == 1 or len(files) <= 1:
+        entries = [segment_file(f, **params) for f in files]
+    else:
+        chunk = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(_segment_file_args, ((f, params) for f in files), chunksize=chunk))
+    wall_s = time.perf_counter() - t0
+
+    audio_s = sum(e.get("duration_s", 0.0) for e in entries)
+    eot = np.array(
+        [seg["eot_ms"] for e in entries for seg in e.get("segments", ()) if seg["reason"] != "eof"],
+        dtype=np.float64,
+    )
+    return {
+        "summary": {
+            "files": len(entries),
+            "errors": sum(1 for e in entries if "error" in e),
+            "segments": sum(len(e.get("segments", ())) for e in entries),
+            "audio_s": round(audio_s, 3),
+            "wall_s": round(wall_s, 3),
+            "x_realtime": round(audio_s / wall_s, 1) if wall_s else None,
+            "eot_ms": {
+                "mean": round(float(eot.mean()), 1),
+                "p50": float(np.percentile(eot, 50)),
+                "p95": float(np.percentile(eot, 95)),
+            } if eot.size else None,
+            "workers": workers,
+            "params": {k: (asdict(v) if isinstance(v, Endpointing) else v) for k, v in params.items()},
+        },
+        "files": entries,
+    }
+
+
+# ---------------------------------------------------------------------------
+#                                   CLI
+# ---------------------------------------------------------------------------
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Offline VAD segmentation of WAV corpora.")
+    ap.add_argument("inputs", nargs="+", help="WAV files or directories (searched recursively)")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--report", help="write the JSON report here (default: stdout)")
+    ap.add_argument("--min-rms", type=float, default=MIN_RMS_THRESHOLD)
+    ap.add_argument("--silence-ms", type=int, default=1200)
+    ap.add_argument("--pre-speech-ms", type=int, default=300)
+    ap.add_argument("--vad-level", type=int, default=3)
+    ap.add_argument("--fixed", action="store_true", help="disable adaptive endpointing (legacy baseline)")
+    ap.add_argument("--min-silence-ms", type=int, default=Endpointing.min_silence_ms)
+    ap.add_argument("--max-silence-ms", type=int, default=Endpointing.max_silence_ms)
+    args = ap.parse_args(argv)
+
+    endpointing = None if args.fixed else Endpointing(
+        min_rms=args.min_rms,
+        min_silence_ms=args.min_silence_ms,
+        max_silence_ms=args.max_silence_ms,
+    )
+
+    files = find_wavs(args.inputs)
+    if not files:
+        print("⚠️ No WAV files found.", file=sys.stderr)
+        return 1
+
+    report = segment_corpus(
+        files,
+        workers=args.workers,
+        min_rms=args.min_rms,
+        silence_timeout_ms=args.silence_ms,
+        pre_speech_ms=args.pre_speech_ms,
+        vad_level=args.vad_level,
+        endpointing=endpointing,
+    )
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        Path(args.report).write_text(text, encoding="utf-8")
+        s = report["summary"]
+        print(
+            f"✅ {s['files']} files, {s['segments']} segments, "
+            f"{s['audio_s']:.1f}s audio in {s['wall_s']:.2f}s (×{s['x_realtime']} realtime) → {args.report}"
+        )
+        if s["eot_ms"]:
+            e = s["eot_ms"]
+            print(f"⏱ end-of-turn latency: mean {e['mean']} ms, p50 {e['p50']:.0f} ms, p95 {e['p95']:.0f} ms")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,531 @@
+# ghost/modules/session.py
+"""Event-driven voice session engine for G.H.O.S.T.
+
+`main.run` used to alternate blocking `wait_for_voice()` calls (up to 15 s)
+with `time.sleep(0.1)` polling, only checked the silence timeout between
+captures, and ran wake word → capture → transcription → LLM → TTS strictly one
+after another on a single thread.
+
+`VoiceSession` replaces that loop with a small state machine driven by a
+single event queue:
+
+    IDLE ──wake──▶ LISTENING ──audio──▶ TRANSCRIBING ──transcript──▶ THINKING
+      ▲                ▲                                               │
+      │                └──────────── speech done ◀── SPEAKING ◀──first audio
+      └──── timeout / stop phrase
+
+1. **Explicit states** – `State.IDLE/LISTENING/TRANSCRIBING/THINKING/SPEAKING`;
+   every transition is timestamped in `transitions`.
+2. **Overlapping stages** – the microphone thread keeps listening while the
+   assistant thinks and speaks (barge-in; `listen` is expected to gate the
+   reply's own echo), and the reply is spoken sentence by sentence while the
+   LLM is still streaming the rest of it.
+3. **Timer-driven timeouts** – the conversation silence timeout is a
+   `threading.Timer` armed on entering LISTENING, not a check between captures.
+4. **Scriptable** – every stage is an injected callable and all inputs arrive
+   as `Event`s, so tests can `post()` scripted audio / text events with fake
+   handlers and read deterministic per-turn latencies from `turns`.
+   `selftest()` does exactly that against a `ScriptClock`, whose time only
+   moves when a fake stage reports the time it "spent":
+
+       python -m ghost.modules.session selftest
+"""
+
+from __future__ import annotations
+
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Iterable, List, Optional
+
+from ghost.modules import tracing
+from ghost.modules.conversation import Conversation
+
+
+class State(str, Enum):
+    IDLE = "idle"
+    LISTENING = "listening"
+    TRANSCRIBING = "transcribing"
+    THINKING = "thinking"
+    SPEAKING = "speaking"
+
+
+@dataclass
+class Event:
+    kind: str  # wake | speech_start | audio | text | transcript | first_audio |
+               # reply_done | speech_done | timeout | shutdown
+    payload: Any = None
+    turn: int = 0
+
+
+@dataclass
+class TurnStats:
+    turn: int
+    input_at: float
+    text: str = ""
+    transcript_at: float | None = None
+    first_audio_at: float | None = None
+    reply_done_at: float | None = None
+    interrupted: bool = False
+    reply: str = ""
+
+    @property
+    def first_audio_latency(self) -> float | None:
+        return None if self.first_audio_at is None else self.first_audio_at - self.input_at
+
+
+# Sentence boundary for incremental TTS (Hebrew/English/Russian punctuation)
+_SENTENCE_END = re.compile(r"[.!?…\n]+\s*")
+
+
+class VoiceSession:
+    """Single-owner state machine; all state changes happen on the loop thread."""
+
+    def __init__(
+        self,
+        *,
+        respond: Callable[[str, Conversation], Iterable[str]],
+        speak: Callable[[str], None],
+        wait_speaking: Callable[[], None] = lambda: None,
+        stop_speaking: Callable[[], None] = lambda: None,
+        transcribe: Callable[[str], str] | None = None,
+        listen: Callable[..., Optional[str]] | None = None,
+        wait_for_wake: Callable[[], None] | None = None,
+        new_conversation: Callable[[], Conversation] = Conversation,
+        stop_phrases: Iterable[str] = (),
+        farewell: str = "בשמחה. עד הפעם הבאה.",
+        timeout_farewell: str = "נראה שהשיחה נסתיימה. הפעם הבאה!",
+        silence_timeout: float = 10.0,
+        on_state: Callable[[State], None] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.respond = respond
+        self.speak = speak
+        self.wait_speaking = wait_speaking
+        self.stop_speaking = stop_speaking
+        self.transcribe = transcribe
+        self.listen = listen
+        self.wait_for_wake = wait_for_wake
+        self.new_conversation = new_conversation
+        self.stop_phrases = set(stop_phrases)
+        self.farewell = farewell
+        self.timeout_farewell = timeout_farewell
+        self.silence_timeout = silence_timeout
+        self.on_state = on_state
+        self.clock = clock
+
+        self.state = State.IDLE
+        self.conversation = Conversation()
+        self.transitions: List[tuple[float, State]] = []
+        self.turns: List[TurnStats] = []
+
+        self._events: "queue.Queue[Event]" = queue.Queue()
+        self._turn = 0  # bumped on every new user input / barge-in
+        self._in_conversation = threading.Event()
+        self._shutdown = threading.Event()
+        self._timer: Optional[threading.Timer] = None
+        self._workers = ThreadPoolExecutor(max_workers=3, thread_name_prefix="ghost-stage")
+        self._tts = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghost-tts")
+        self._loop_thread: Optional[threading.Thread] = None
+        self._mic_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    #                             PUBLIC API
+    # ------------------------------------------------------------------
+
+    def post(self, event: Event) -> None:
+        """Thread-safe: enqueue an event for the loop thread."""
+        self._events.put(event)
+
+    def run(self) -> None:
+        """Process events on the calling thread until `shutdown()`."""
+        if self.listen is not None:
+            self._mic_thread = threading.Thread(target=self._mic_loop, name="ghost-mic", daemon=True)
+            self._mic_thread.start()
+        if self.wait_for_wake is None:
+            self.post(Event("wake"))
+        try:
+            while True:
+                try:
+                    # Timeout keeps Ctrl-C responsive (Windows can't interrupt a bare get())
+                    ev = self._events.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if ev.kind == "shutdown":
+                    break
+                self._dispatch(ev)
+        finally:
+            self._shutdown.set()
+            self._cancel_timer()
+            self._workers.shutdown(wait=False)
+            self._tts.shutdown(wait=False)
+
+    def start(self) -> threading.Thread:
+        """Run the loop on a background thread (for scripted tests)."""
+        self._loop_thread = threading.Thread(target=self.run, name="ghost-session", daemon=True)
+        self._loop_thread.start()
+        return self._loop_thread
+
+    def shutdown(self, timeout: float | None = None) -> None:
+        self.post(Event("shutdown"))
+        if self._loop_thread is not None:
+            self._loop_thread.join(timeout)
+
+    def wait_for_state(self, state: State, timeout: float | None = None) -> bool:
+        """Block until the machine enters *state* (polls transitions; tests only)."""
+        # Real time, not self.clock: a scripted clock may never move on its own
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.state != state:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    # ------------------------------------------------------------------
+    #                           STATE HANDLING
+    # ------------------------------------------------------------------
+
+    def _set_state(self, state: State) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        self.transitions.append((self.clock(), state))
+        if state == State.LISTENING:
+            self._arm_timer()
+        else:
+            self._cancel_timer()
+        if self.on_state:
+            self.on_state(state)
+
+    def _dispatch(self, ev: Event) -> None:
+        handler = getattr(self, f"_on_{ev.kind}", None)
+        if handler is not None:
+            handler(ev)
+
+    def _on_wake(self, ev: Event) -> None:
+        if self.state != State.IDLE:
+            return
+        self.conversation = self.new_conversation()
+        self._in_conversation.set()
+        self._set_state(State.LISTENING)
+
+    def _on_speech_start(self, ev: Event) -> None:
+        if self.state == State.IDLE:
+            return
+        self._cancel_timer()
+        if self.state in (State.THINKING, State.SPEAKING):
+            # Barge-in: cut playback and drop the rest of the current reply
+            self._interrupt_turn()
+            self._set_state(State.LISTENING)
+
+    def _on_audio(self, ev: Event) -> None:
+        if self.state == State.IDLE or self.transcribe is None:
+            return
+        if not ev.payload:
+            # Capture gave up (too short / nothing heard): re-arm the timeout
+            if self.state == State.LISTENING:
+                self._arm_timer()
+            return
+        turn = self._new_turn()
+        self._set_state(State.TRANSCRIBING)
+        self._workers.submit(tracing.bind(self._transcribe_job), ev.payload, turn)
+
+    def _on_text(self, ev: Event) -> None:
+        if self.state == State.IDLE:
+            return
+        turn = self._new_turn()
+        self.post(Event("transcript", ev.payload, turn))
+
+    def _on_transcript(self, ev: Event) -> None:
+        if ev.turn != self._turn:
+            return
+        text = (ev.payload or "").strip()
+        stats = self.turns[-1]
+        stats.text = text
+        stats.transcript_at = self.clock()
+        if not text:
+            self._set_state(State.LISTENING)
+            return
+        if text in self.stop_phrases:
+            self._end_conversation(self.farewell)
+            return
+        self._set_state(State.THINKING)
+        self._workers.submit(tracing.bind(self._respond_job), text, ev.turn)
+
+    def _on_first_audio(self, ev: Event) -> None:
+        if ev.turn != self._turn:
+            return
+        self.turns[-1].first_audio_at = self.clock()
+        if self.state == State.THINKING:
+            self._set_state(State.SPEAKING)
+
+    def _on_reply_done(self, ev: Event) -> None:
+        if ev.turn != self._turn:
+            return
+        stats = self.turns[-1]
+        stats.reply = ev.payload or ""
+        stats.reply_done_at = self.clock()
+        if self.state == State.THINKING:
+            self._set_state(State.SPEAKING)
+        self._workers.submit(tracing.bind(self._wait_speaking_job), ev.turn)
+
+    def _on_speech_done(self, ev: Event) -> None:
+        if ev.turn == self._turn and self.state == State.SPEAKING:
+            self._set_state(State.LISTENING)
+
+    def _on_timeout(self, ev: Event) -> None:
+        if ev.turn == self._turn and self.state == State.LISTENING:
+            self._end_conversation(self.timeout_farewell)
+
+    # ------------------------------------------------------------------
+    #                              HELPERS
+    # ------------------------------------------------------------------
+
+    def _new_turn(self) -> int:
+        tracing.new_turn()
+        self._turn += 1
+        self.turns.append(TurnStats(turn=self._turn, input_at=self.clock()))
+        return self._turn
+
+    def _interrupt_turn(self) -> None:
+        if self.turns:
+            self.turns[-1].interrupted = True
+        self._turn += 1
+        self.stop_speaking()
+
+    def _end_conversation(self, farewell: str) -> None:
+        self._turn += 1
+        self._in_conversation.clear()
+        self._tts.submit(tracing.bind(self.speak), farewell)
+        self._set_state(State.IDLE)
+        if self.wait_for_wake is None and self.listen is None:
+            return  # scripted sessions re-enter via an explicit "wake" event
+        if self.wait_for_wake is None:
+            self.post(Event("wake"))
+
+    def _arm_timer(self) -> None:
+        self._cancel_timer()
+        if self.silence_timeout and self.silence_timeout > 0:
+            self._timer = threading.Timer(
+                self.silence_timeout, self.post, (Event("timeout", turn=self._turn),)
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    # ------------------------------------------------------------------
+    #                         STAGE WORKERS
+    # ------------------------------------------------------------------
+
+    def _mic_loop(self) -> None:
+        """Owns the microphone: wake word while idle, capture in conversation."""
+        while not self._shutdown.is_set():
+            if not self._in_conversation.is_set():
+                if self.wait_for_wake is None:
+                    self._in_conversation.wait(0.1)
+                    continue
+                self.wait_for_wake()
+                self.post(Event("wake"))
+                self._in_conversation.wait()
+                continue
+            path = self.listen(on_speech_start=lambda: self.post(Event("speech_start")))
+            if self._in_conversation.is_set():
+                self.post(Event("audio", path))
+
+    def _transcribe_job(self, path: str, turn: int) -> None:
+        try:
+            text = self.transcribe(path)
+        except Exception as e:
+            print(f"❌ Transcription failed: {e}")
+            text = ""
+        self.post(Event("transcript", text, turn))
+
+    def _respond_job(self, text: str, turn: int) -> None:
+        reply = ""
+        pending = ""
+        spoken = False
+        print("🤖 ", end="", flush=True)
+        try:
+            for chunk in self.respond(text, self.conversation):
+                # Keep draining after a barge-in so the responder can finish
+                # its own bookkeeping, but stop printing / speaking.
+                if turn != self._turn:
+                    continue
+                print(chunk, end="", flush=True)
+                reply += chunk
+                pending += chunk
+                *sentences, pending = _split_sentences(pending)
+                for sentence in sentences:
+                    self._tts.submit(tracing.bind(self._speak_job), sentence, turn, not spoken)
+                    spoken = True
+            if turn == self._turn and pending.strip():
+                self._tts.submit(tracing.bind(self._speak_job), pending, turn, not spoken)
+        except Exception as e:
+            print(f"\n❌ Response failed: {e}")
+        print()
+        self.post(Event("reply_done", reply, turn))
+
+    def _speak_job(self, sentence: str, turn: int, first: bool) -> None:
+        if turn != self._turn:
+            return
+        self.speak(sentence)
+        if first:
+            self.post(Event("first_audio", turn=turn))
+
+    def _wait_speaking_job(self, turn: int) -> None:
+        # Queue a marker behind the last sentence, then wait for playback
+        done = self._tts.submit(lambda: None)
+        done.result()
+        self.wait_speaking()
+        self.post(Event("speech_done", turn=turn))
+
+
+def _split_sentences(text: str) -> List[str]:
+    """Split into complete sentences; the last element is the unfinished tail."""
+    parts: List[str] = []
+    last = 0
+    for m in _SENTENCE_END.finditer(text):
+        sentence = text[last:m.end()].strip()
+        if sentence:
+            parts.append(sentence)
+        last = m.end()
+    parts.append(text[last:])
+    return parts
+
+
+# ---------------------------------------------------------------------------
+#                          SCRIPTED SELF-TEST
+# ---------------------------------------------------------------------------
+
+_FULL_TURN = [State.TRANSCRIBING, State.THINKING, State.SPEAKING, State.LISTENING]
+
+
+class ScriptClock:
+    """Fake clock for scripted sessions: only `advance()` moves it."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, sec: float) -> None:
+        with self._lock:
+            self.now += sec
+
+
+def selftest(timeout: float = 5.0) -> List[str]:
+    """Run scripted sessions with fake stages; returns the failed checks.
+
+    Stage costs are charged to a `ScriptClock`, so the per-turn latencies
+    are exact: audio → transcript is the transcription cost, audio → first
+    audio is transcription + time to the first sentence + TTS start.
+    """
+    failures: List[str] = []
+
+    def wait_until(pred: Callable[[], bool]) -> bool:
+        deadline = time.monotonic() + timeout
+        while not pred():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def check(ok: bool, what: str) -> None:
+        print(f"{'✅' if ok else '❌'} {what}")
+        if not ok:
+            failures.append(what)
+
+    clock = ScriptClock()
+    spoken: List[str] = []
+    stopped = threading.Event()
+    release = threading.Event()  # holds the second reply open for barge-in
+
+    def transcribe(path: str) -> str:
+        clock.advance(0.200)
+        return path  # scripted "audio" payloads are their own transcript
+
+    def respond(text: str, conversation: Conversation) -> Iterable[str]:
+        clock.advance(0.300)
+        yield f"{text}."
+        if text == "ארוך":
+            release.wait(timeout)
+            yield " ועוד משפט."
+
+    def speak(text: str) -> None:
+        clock.advance(0.050)
+        spoken.append(text)
+
+    session = VoiceSession(
+        respond=respond,
+        speak=speak,
+        stop_speaking=stopped.set,
+        transcribe=transcribe,
+        stop_phrases={"תודה"},
+        silence_timeout=0,
+        clock=clock,
+    )
+    session.start()
+    try:
+        session.post(Event("wake"))
+        check(session.wait_for_state(State.LISTENING, timeout), "wake → listening")
+
+        # 1. A full turn: exact latencies from the scripted clock
+        mark = len(session.transitions)
+        session.post(Event("audio", "שלום"))
+        check(wait_until(lambda: [st for _, st in session.transitions[mark:]] == _FULL_TURN),
+              "audio → transcribing → thinking → speaking → listening")
+        turn = session.turns[-1]
+        check(turn.text == "שלום" and turn.reply == "שלום.", "transcript and reply recorded")
+        check(turn.transcript_at - turn.input_at == 0.200, "audio → transcript latency is 200 ms")
+        check(round(turn.first_audio_latency, 6) == 0.550, "audio → first audio latency is 550 ms")
+        check(spoken == ["שלום."], "reply spoken once")
+
+        # 2. Barge-in while the reply is still streaming
+        session.post(Event("audio", "ארוך"))
+        check(session.wait_for_state(State.SPEAKING, timeout), "second turn speaking")
+        session.post(Event("speech_start"))
+        check(session.wait_for_state(State.LISTENING, timeout), "barge-in → listening")
+        release.set()
+        check(stopped.wait(timeout), "barge-in stopped playback")
+        check(session.turns[-1].interrupted, "turn marked interrupted")
+        session.post(Event("text", "תודה"))
+
+        # 3. Stop phrase ends the conversation with the farewell
+        check(session.wait_for_state(State.IDLE, timeout), "stop phrase → idle")
+        session.post(Event("audio", "אחרי"))  # ignored while idle
+        time.sleep(0.05)
+        check(spoken[-1] == session.farewell and "ועוד משפט." not in spoken,
+              "farewell spoken, interrupted tail dropped")
+        check(len(session.turns) == 3, "idle input ignored")
+    finally:
+        release.set()
+        session.shutdown(timeout)
+    return failures
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Voice session engine tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("selftest", help="run scripted sessions with fake stages and check their latencies")
+    ap.parse_args(argv)
+
+    failures = selftest()
+    print(f"{'✅ all checks passed' if not failures else f'❌ {len(failures)} check(s) failed'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
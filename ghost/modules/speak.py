@@ -1,46 +1,42 @@
-import os
 import time
-import pygame
 
-from ghost.modules.openai_client import config  
+from ghost.modules.openai_client import config
+from ghost.modules.playback import get_player
+from ghost.modules.tracing import span
 
 client = config.client
 model_tts = config.get("model_tts", "tts-1")
 default_voice = config.get("default_voice", "nova")
 
-def speak(text: str, voice: str = None):
+def speak(text: str, voice: str = None, wait: bool = True):
+    """Synthesize *text* and play it from memory.
+
+    With ``wait=False`` the call returns as soon as the audio is queued, so the
+    caller can start listening again (and barge in via `stop_speaking`).
+    """
     voice = voice or default_voice
     print(f"🔊 Speaking with voice: {voice}")
+    t0 = time.perf_counter()
 
     try:
-        response = client.audio.speech.create(
-            model=model_tts,
-            voice=voice,
-            input=text,
-            response_format="wav"
-        )
+        with span("tts_synth", chars=len(text)):
+            response = client.audio.speech.create(
+                model=model_tts,
+                voice=voice,
+                input=text,
+                response_format="pcm"
+            )
     except Exception as e:
         print(f"❌ TTS generation failed: {e}")
         return
 
-    os.makedirs("audio", exist_ok=True)
-    timestamp = int(time.time() * 1000)
-    wav_path = f"audio/response_{timestamp}.wav"
-
-    try:
-        with open(wav_path, "wb") as f:
-            f.write(response.content)
-
-        pygame.mixer.init()
-        pygame.mixer.music.load(wav_path)
-        pygame.mixer.music.play()
-
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-
-        pygame.mixer.music.unload()
-        os.remove(wav_path)
+    player = get_player()
+    player.play(response.content, requested_at=t0)
+    if wait:
+        player.wait()
         print("✅ Finished speaking.")
 
-    except Exception as e:
-        print(f"❌ Audio playback failed: {e}")
+
+def stop_speaking():
+    """Barge-in: cut off whatever is currently playing or queued."""
+    get_player().stop()
@@ -0,0 +1,626 @@
+# ghost/modules/store.py
+"""Multi-process safe, versioned JSONL store for long-term memory.
+
+`show_memories.py`, a second G.H.O.S.T. instance or a future server worker
+may all touch `memory_store.jsonl` while `_atomic_write` replaces it. Without
+locking two writers silently lost each other's facts, and every reader
+re-parsed the whole file.
+
+Layout next to the store path (``ghost/memory_store.jsonl``):
+
+    memory_store.jsonl            # mirror of the latest version (legacy readers)
+    memory_store.jsonl.lock       # single-writer file lock
+    memory_store.jsonl.d/HEAD     # current version number
+    memory_store.jsonl.d/v00000042.jsonl   # immutable snapshots
+
+1. **Single writer** – writes are *mutations* (``fn(items) -> changed``)
+   queued to one writer thread per process. The writer takes the cross-process
+   file lock, applies every queued mutation to the **latest** version, writes
+   one new snapshot and bumps HEAD. Nobody overwrites a version they did not
+   read, so no facts are lost.
+2. **Lock-free readers** – snapshots are never modified after HEAD points at
+   them, so readers memory-map them without taking the lock. One `Snapshot`
+   is shared by every thread of a process: it is parsed once, under its own
+   lock, and read by offset (never through the map's shared file position).
+3. **Change notification** – `subscribe()` callbacks fire after local commits,
+   and `watch()` polls HEAD so other processes' versions are noticed too.
+   Callers rebuild in-process indexes only when a new version lands;
+   `on_commit()` hooks maintain persisted derived data under the lock.
+4. **Lazy fields** – fields named in `raw_fields` (embeddings) are left as
+   `RawJSON` slices of the memory map instead of Python float lists, and are
+   written back byte-for-byte.
+
+Stress tests (several writer and reader processes, checks for lost updates and
+torn reads; threads of one process racing on one shared snapshot):
+    python -m ghost.modules.store stress --writers 4 --readers 4 --writes 50
+    python -m ghost.modules.store threads --threads 4 --items 20000
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import queue
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+_KEEP_SNAPSHOTS = 3
+_MAX_BATCH = 32
+
+
+# ---------------------------------------------------------------------------
+#                               FILE LOCK
+# ---------------------------------------------------------------------------
+
+class FileLock:
+    """Exclusive advisory lock on a side file (fcntl / msvcrt)."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._fh = None
+
+    def acquire(self, timeout: float | None = None) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._fh = open(self.path, "a+b")
+        while True:
+            try:
+                if os.name == "nt":
+                    self._fh.seek(0)
+                    msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except OSError:
+                if deadline is not None and time.monotonic() > deadline:
+                    self._fh.close()
+                    self._fh = None
+                    raise TimeoutError(f"Could not lock {self.path}")
+                time.sleep(0.005)
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        try:
+            if os.name == "nt":
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+def _replace(src: Path, dst: Path, attempts: int = 20) -> None:
+    """os.replace with retries (Windows refuses while a reader has *dst* open)."""
+    for i in range(attempts):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if i == attempts - 1:
+                raise
+            time.sleep(0.01)
+
+
+# ---------------------------------------------------------------------------
+#                               SNAPSHOTS
+# ---------------------------------------------------------------------------
+
+class RawJSON:
+    """A JSON array left unparsed inside a snapshot's memory map.
+
+    Large numeric fields (embeddings) stay on disk / in the page cache until
+    someone actually needs them; writers copy the bytes through verbatim.
+    """
+
+    __slots__ = ("_buf", "_start", "_end")
+
+    def __init__(self, buf: mmap.mmap, start: int, end: int):
+        self._buf = buf
+        self._start = start
+        self._end = end
+
+    @property
+    def raw(self) -> bytes:
+        return self._buf[self._start:self._end]
+
+    @property
+    def span(self) -> tuple[int, int]:
+        """Byte range inside the snapshot file (stable: snapshots are immutable)."""
+        return self._start, self._end
+
+    def load(self):
+        return json.loads(self.raw)
+
+
+def _raw_pattern(field: str) -> "re.Pattern[bytes]":
+    # Only a comma-preceded key can be a real key: inside a JSON string the
+    # quote would be escaped. Arrays of numbers contain no nested "]".
+    return re.compile(rb',\s*"' + re.escape(field.encode()) + rb'":\s*(\[[^\]]*\])')
+
+
+def dumps(item: dict) -> bytes:
+    """Serialise one record, splicing `RawJSON` fields back in unparsed."""
+    raws = [(k, v) for k, v in item.items() if isinstance(v, RawJSON)]
+    if not raws:
+        return json.dumps(item, ensure_ascii=False).encode("utf-8")
+    head = json.dumps({k: v for k, v in item.items() if not isinstance(v, RawJSON)}, ensure_ascii=False)
+    tail = b"".join(b", " + json.dumps(k).encode() + b": " + v.raw for k, v in raws)
+    if head == "{}":
+        return b"{" + tail[2:] + b"}"
+    return head[:-1].encode("utf-8") + tail + b"}"
+
+
+class Snapshot:
+    """One immutable store version, read through a memory map."""
+
+    def __init__(
+        self,
+        version: int,
+        path: Optional[Path],
+        factory: Callable[[dict], dict] = dict,
+        raw_fields: Sequence[str] = (),
+    ):
+        self.version = version
+        self.path = path
+        self._factory = factory
+        self._raw = [(f, _raw_pattern(f)) for f in raw_fields]
+        self._mm: Optional[mmap.mmap] = None
+        self._items: Optional[List[dict]] = None
+        self._sizes: Optional[List[int]] = None
+        self._parse_lock = threading.Lock()  # one shared snapshot, many reader threads
+        # (size, mtime_ns) of the mapped file; byte spans saved against one
+        # snapshot are only valid for a file with the same identity
+        self.file_id: Optional[tuple[int, int]] = None
+        if path is None:
+            return
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            if version:
+                raise  # versioned snapshots must exist; caller re-reads HEAD
+            return  # empty legacy store
+        with f:
+            st = os.fstat(f.fileno())
+            self.file_id = (st.st_size, st.st_mtime_ns)
+            if st.st_size:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def raw(self, start: int, end: int) -> RawJSON:
+        """Lazy field for a byte range previously taken from `RawJSON.span`."""
+        return RawJSON(self._mm, start, end)
+
+    def lines(self) -> Iterator[bytes]:
+        """Raw JSONL lines straight from the mapping (no parsing)."""
+        for _, line in self._lines():
+            yield line
+
+    def _lines(self) -> Iterator[tuple[int, bytes]]:
+        if self._mm is None:
+            return
+        # Offsets and slices only: seek/readline would move the map's file
+        # position, which every thread reading this snapshot shares
+        mm = self._mm
+        start, end = 0, len(mm)
+        while start < end:
+            nl = mm.find(b"\n", start)
+            stop = end if nl < 0 else nl
+            line = mm[start:stop].rstrip(b"\r")
+            if line:
+                yield start, line
+            start = stop + 1
+
+    def _decode(self, start: int, line: bytes) -> dict:
+        raws = {}
+        for field, pattern in self._raw:
+            m = pattern.search(line)
+            if m is None:
+                continue  # absent, or first key – parsed normally below
+            raws[field] = RawJSON(self._mm, start + m.start(1), start + m.end(1))
+            line = line[:m.start()] + line[m.end():]
+            # later patterns search the shortened line; keep offsets valid
+            start -= m.end() - m.start()
+        item = json.loads(line)
+        item.update(raws)
+        return item
+
+    def _parse(self) -> None:
+        with self._parse_lock:
+            if self._items is not None:
+                return  # another thread parsed it while we waited
+            items, sizes = [], []
+            for start, line in self._lines():
+                items.append(self._factory(self._decode(start, line) if self._raw else json.loads(line)))
+                sizes.append(len(line) + 1)
+            self._sizes = sizes
+            self._items = items  # last: readers test _items without the lock
+
+    @property
+    def items(self) -> List[dict]:
+        if self._items is None:
+            self._parse()
+        return self._items
+
+    @property
+    def sizes(self) -> List[int]:
+        if self._sizes is None:
+            self._parse()
+        return self._sizes
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+# ---------------------------------------------------------------------------
+#                                 STORE
+# ---------------------------------------------------------------------------
+
+Mutation = Callable[[List[dict]], bool]
+
+
+class VersionedStore:
+    """Versioned JSONL store: queued single writer, mmap snapshot readers."""
+
+    def __init__(self, path: str | Path, factory: Callable[[dict], dict] = dict, raw_fields: Sequence[str] = ()):
+        self.path = Path(path)
+        self.raw_fields = tuple(raw_fields)
+        self.dir = self.path.with_name(self.path.name + ".d")
+        self.head = self.dir / "HEAD"
+        self.lock = FileLock(self.path.with_name(self.path.name + ".lock"))
+        self.factory = factory
+
+        self._queue: "queue.Queue[tuple[Mutation, Future]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._subscribers: List[Callable[[int], None]] = []
+        self._commit_hooks: List[Callable[[int, List[dict]], None]] = []
+        self._snap: Optional[Snapshot] = None
+        self._snap_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._seen_version = -1
+
+    # ------------------------------------------------------------------
+    #                              READING
+    # ------------------------------------------------------------------
+
+    def version(self) -> int:
+        """Current HEAD version (0 = legacy single file / empty store)."""
+        try:
+            return int(self.head.read_text("ascii").strip() or 0)
+        except (FileNotFoundError, ValueError, PermissionError):
+            return 0
+
+    def _snapshot_path(self, version: int) -> Path:
+        if version == 0:
+            return self.path  # pre-versioning store
+        return self.dir / f"v{version:08d}.jsonl"
+
+    def snapshot(self) -> Snapshot:
+        """Latest immutable snapshot; reuses the open one if HEAD is unchanged."""
+        with self._snap_lock:
+            while True:
+                v = self.version()
+                if self._snap is not None and self._snap.version == v:
+                    return self._snap
+                try:
+                    self._snap = Snapshot(v, self._snapshot_path(v), self.factory, self.raw_fields)
+                    return self._snap
+                except FileNotFoundError:
+                    continue  # garbage-collected under us; HEAD has moved on
+
+    # ------------------------------------------------------------------
+    #                              WRITING
+    # ------------------------------------------------------------------
+
+    def submit(self, fn: Mutation) -> Future:
+        """Queue *fn* to run against the latest items under the writer lock."""
+        fut: Future = Future()
+        self._queue.put((fn, fut))
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="ghost-store-writer", daemon=True)
+                self._writer.start()
+        return fut
+
+    def update(self, fn: Mutation, timeout: float | None = None) -> bool:
+        """Apply *fn* and block until committed; returns what *fn* returned."""
+        if threading.current_thread() is self._writer:
+            raise RuntimeError("VersionedStore.update() called from the writer thread")
+        return self.submit(fn).result(timeout)
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < _MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                version, results = self._commit(batch)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            # Notify before resolving so update() callers see fresh indexes
+            if version is not None:
+                self._notify(version)
+            for fut, res, err in results:
+                if err is not None:
+                    fut.set_exception(err)
+                else:
+                    fut.set_result(res)
+
+    def _commit(self, batch: List[tuple[Mutation, Future]]) -> tuple[Optional[int], list]:
+        with self.lock:
+            current = self.version()
+            with self._snap_lock:
+                cached = self._snap if self._snap is not None and self._snap.version == current else None
+            snap = None
+            if cached is not None:
+                items = [self.factory(it) for it in cached.items]  # already parsed in-process
+            else:
+                snap = Snapshot(current, self._snapshot_path(current), self.factory, self.raw_fields)
+                items = snap.items
+
+            changed = False
+            results = []
+            for fn, fut in batch:
+                try:
+                    res = fn(items)
+                    changed = changed or bool(res)
+                    results.append((fut, res, None))
+                except Exception as e:
+                    results.append((fut, None, e))
+
+            new_version = None
+            if changed:
+                new_version = current + 1
+                self._write_version(new_version, items)
+                for hook in self._commit_hooks:
+                    try:
+                        hook(new_version, items)
+                    except Exception as e:
+                        print(f"❌ Store commit hook failed: {e}")
+            if snap is not None:
+                snap.close()  # after writing: RawJSON fields still point into it
+        return new_version, results
+
+    def _write_version(self, version: int, items: List[dict]) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        target = self._snapshot_path(version)
+        with tempfile.NamedTemporaryFile("wb", delete=False, dir=self.dir, suffix=".tmp") as tmp:
+            for it in items:
+                tmp.write(dumps(it) + b"\n")
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, target)
+
+        # Legacy mirror: hard link when possible (no second write), else copy
+        mirror_tmp = self.path.with_name(self.path.name + ".tmp")
+        try:
+            if mirror_tmp.exists():
+                mirror_tmp.unlink()
+            os.link(target, mirror_tmp)
+        except OSError:
+            shutil.copyfile(target, mirror_tmp)
+        try:
+            _replace(mirror_tmp, self.path)
+        except PermissionError:
+            print(f"⚠️ Could not refresh {self.path} (open elsewhere); snapshots are current.")
+
+        head_tmp = self.dir / "HEAD.tmp"
+        head_tmp.write_text(str(version), "ascii")
+        _replace(head_tmp, self.head)
+        self._gc(version)
+
+    def _gc(self, version: int) -> None:
+        for old in self.dir.glob("v*.jsonl"):
+            try:
+                if int(old.stem[1:]) <= version - _KEEP_SNAPSHOTS:
+                    old.unlink()
+            except (ValueError, OSError):
+                continue  # still mapped by a reader (Windows) – next time
+
+    # ------------------------------------------------------------------
+    #                          NOTIFICATION
+    # ------------------------------------------------------------------
+
+    def on_commit(self, hook: Callable[[int, List[dict]], None]) -> None:
+        """*hook(version, items)* runs after each local commit, still under the
+        file lock, so derived files (e.g. the text index) stay in step with
+        the versions they describe.
+        """
+        self._commit_hooks.append(hook)
+
+    def subscribe(self, callback: Callable[[int], None]) -> None:
+        """*callback(version)* runs whenever a new version is observed.
+
+        Callbacks run on the writer / watcher thread and must not block on
+        `update()`.
+        """
+        self._subscribers.append(callback)
+
+    def _notify(self, version: int) -> None:
+        if version == self._seen_version:
+            return
+        self._seen_version = version
+        for cb in list(self._subscribers):
+            try:
+                cb(version)
+            except Exception as e:
+                print(f"❌ Store subscriber failed: {e}")
+
+    def watch(self, interval: float = 0.5) -> None:
+        """Poll HEAD in the background so other processes' writes are noticed."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._seen_version = self.version()
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                v = self.version()
+                if v != self._seen_version:
+                    self._notify(v)
+
+        self._watcher = threading.Thread(target=loop, name="ghost-store-watch", daemon=True)
+        self._watcher.start()
+
+
+# ---------------------------------------------------------------------------
+#                              STRESS TEST
+# ---------------------------------------------------------------------------
+
+def _stress_writer(path: str, wid: int, writes: int) -> None:
+    store = VersionedStore(path)
+    for i in range(writes):
+        fact = {"t": time.time(), "text": f"writer {wid} fact {i}", "fp": f"w{wid}-{i}"}
+        store.update(lambda items, fact=fact: items.append(fact) or True)
+
+
+def _stress_reader(path: str, seconds: float, out: "multiprocessing.Queue") -> None:
+    store = VersionedStore(path)
+    deadline = time.monotonic() + seconds
+    last, reads, errors = -1, 0, 0
+    while time.monotonic() < deadline:
+        snap = store.snapshot()
+        try:
+            len(snap.items)  # full parse: a torn file would raise here
+            if snap.version < last:
+                errors += 1
+            last = snap.version
+            reads += 1
+        except Exception:
+            errors += 1
+    out.put((reads, errors))
+
+
+def stress(writers: int = 4, readers: int = 4, writes: int = 50) -> bool:
+    import multiprocessing
+
+    with tempfile.TemporaryDirectory() as d:
+        path = str(Path(d) / "memory_store.jsonl")
+        out = multiprocessing.Queue()
+        t0 = time.perf_counter()
+        procs = [multiprocessing.Process(target=_stress_writer, args=(path, w, writes)) for w in range(writers)]
+        rprocs = [multiprocessing.Process(target=_stress_reader, args=(path, 3.0, out)) for _ in range(readers)]
+        for p in procs + rprocs:
+            p.start()
+        for p in procs + rprocs:
+            p.join()
+        wall = time.perf_counter() - t0
+
+        store = VersionedStore(path)
+        snap = store.snapshot()
+        got = {it["fp"] for it in snap.items}
+        expected = {f"w{w}-{i}" for w in range(writers) for i in range(writes)}
+        lost = expected - got
+        reads = [out.get() for _ in rprocs]
+        read_errors = sum(e for _, e in reads)
+        snap.close()
+
+    print(f"✍️  {writers}×{writes} writes → version {snap.version} in {wall:.2f}s")
+    print(f"👀 {sum(r for r, _ in reads)} snapshot reads by {readers} readers, {read_errors} errors")
+    print(f"{'✅' if not lost else '❌'} lost facts: {len(lost)}")
+    return not lost and not read_errors
+
+
+def thread_stress(threads: int = 4, items: int = 20_000, rounds: int = 20) -> bool:
+    """Many threads of one process read a fresh shared snapshot at once.
+
+    The process-level `stress` cannot catch this: there every reader has its
+    own `Snapshot`. Here all threads race on the first parse of the same
+    cached one while the writer commits from it, as the index, the retrieval
+    worker and the background analysis threads do in the live process.
+    """
+    wrong = lost = 0
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "memory_store.jsonl"
+        vec = json.dumps([0.125] * 32)
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(items):
+                f.write(f'{{"text": "fact {i}", "fp": "f{i}", "v": {vec}}}\n')
+        store = VersionedStore(path, raw_fields=("v",))
+        expected = items
+        for r in range(rounds):
+            snap = store.snapshot()  # new version each round: nothing parsed yet
+            barrier = threading.Barrier(threads + 1)
+            counts: List[int] = []
+
+            def read(n=expected):
+                barrier.wait()
+                got = snap.items
+                ok = len(got) == n and got[items - 1]["fp"] == f"f{items - 1}" and len(got[0]["v"].load()) == 32
+                counts.append(len(got) if ok else -len(got))
+
+            pool = [threading.Thread(target=read) for _ in range(threads)]
+            for t in pool:
+                t.start()
+            barrier.wait()
+            fact = {"text": f"round {r}", "fp": f"r{r}"}
+            store.update(lambda its, fact=fact: its.append(fact) or True)
+            expected += 1
+            for t in pool:
+                t.join()
+            wrong += sum(1 for c in counts if c < 0)
+
+        final = store.snapshot()
+        lost = expected - len(final.items)
+        final.close()
+    print(f"🧵 {threads} threads × {rounds} rounds on a {items}-line snapshot in {time.perf_counter() - t0:.2f}s")
+    print(f"{'✅' if not wrong else '❌'} wrong reads: {wrong}/{threads * rounds}")
+    print(f"{'✅' if not lost else '❌'} lost facts: {lost}")
+    return not wrong and not lost
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Versioned memory store utilities.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    st = sub.add_parser("stress", help="multi-process writer/reader stress test")
+    st.add_argument("--writers", type=int, default=4)
+    st.add_argument("--readers", type=int, default=4)
+    st.add_argument("--writes", type=int, default=50)
+    th = sub.add_parser("threads", help="threads of one process racing on one shared snapshot")
+    th.add_argument("--threads", type=int, default=4)
+    th.add_argument("--items", type=int, default=20_000)
+    th.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "stress":
+        return 0 if stress(args.writers, args.readers, args.writes) else 1
+    if args.cmd == "threads":
+        return 0 if thread_stress(args.threads, args.items, args.rounds) else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
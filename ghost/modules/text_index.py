@@ -0,0 +1,240 @@
+# ghost/modules/text_index.py
+"""Persisted inverted index over memory fact text.
+
+Keyword search used to mean decoding every record (embedding included) and
+substring-matching it. The index maps normalised tokens to fact fingerprints
+(`fp`) and lives next to the store:
+
+    memory_store.jsonl.idx        # base: {"version": N, "postings": {token: [fp]}}
+    memory_store.jsonl.idx.log    # deltas: {"from": N, "v": N+1, "add": {fp: [tokens]}, "del": {...}}
+
+1. **Updated on write** – `sync` is registered as a `VersionedStore.on_commit`
+   hook, so it runs under the store's file lock for every new version and
+   appends one small delta line (only the facts added / removed).
+2. **Compaction** – once the delta log passes `_COMPACT_BYTES` the base is
+   rewritten and the log truncated; readers skip deltas the base already has.
+3. **Readers** – load base + log once, then replay only new log lines; a
+   version gap (missed or torn log) triggers a reload or a rebuild.
+
+Tokens are case-folded and ASCII-folded (`unidecode`), so Hebrew queries match
+Hebrew facts. The last query word also matches as a prefix.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from unidecode import unidecode
+
+_COMPACT_BYTES = 1 << 20
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Distinct normalised search tokens of *text* (order preserved)."""
+    return list(dict.fromkeys(_TOKEN.findall(unidecode(text.casefold()))))
+
+
+class TextIndex:
+    """Token → fingerprint postings for one store path."""
+
+    def __init__(self, store_path: str | Path):
+        p = Path(store_path)
+        self.base = p.with_name(p.name + ".idx")
+        self.log = p.with_name(p.name + ".idx.log")
+        self.version = -1
+        # Lists straight from JSON; turned into sets only when touched
+        self.postings: Dict[str, Union[List[str], Set[str]]] = {}
+        self._docs: Optional[Dict[str, List[str]]] = None  # fp → tokens, writers only
+        self._vocab: Optional[List[str]] = None
+        self._base_key = None
+        self._log_pos = 0
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    #                           IN-MEMORY STATE
+    # ------------------------------------------------------------------
+
+    def _set(self, tok: str) -> Set[str]:
+        fps = self.postings.get(tok)
+        if not isinstance(fps, set):
+            fps = self.postings[tok] = set(fps or ())
+        return fps
+
+    def _add(self, fp: str, tokens: List[str]) -> None:
+        for tok in tokens:
+            self._set(tok).add(fp)
+        if self._docs is not None:
+            self._docs[fp] = tokens
+
+    def _remove(self, fp: str, tokens: List[str]) -> None:
+        for tok in tokens:
+            fps = self._set(tok)
+            fps.discard(fp)
+            if not fps:
+                del self.postings[tok]
+        if self._docs is not None:
+            self._docs.pop(fp, None)
+
+    def _apply(self, delta: dict) -> None:
+        for fp, tokens in delta.get("del", {}).items():
+            self._remove(fp, tokens)
+        for fp, tokens in delta.get("add", {}).items():
+            self._add(fp, tokens)
+        self.version = delta["v"]
+        self._vocab = None
+
+    def _reset(self, version: int = -1) -> None:
+        self.version = version
+        self.postings = {}
+        self._docs = None
+        self._vocab = None
+
+    def docs(self) -> Dict[str, List[str]]:
+        """fp → tokens, inverted from the postings on first use (writers only)."""
+        if self._docs is None:
+            docs: Dict[str, List[str]] = {}
+            for tok, fps in self.postings.items():
+                for fp in fps:
+                    docs.setdefault(fp, []).append(tok)
+            self._docs = docs
+        return self._docs
+
+    # ------------------------------------------------------------------
+    #                              LOADING
+    # ------------------------------------------------------------------
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.base)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load_base(self) -> None:
+        self._reset()
+        self._log_pos = 0
+        self._base_key = self._stat_key()
+        if self._base_key is None:
+            return
+        try:
+            data = json.loads(self.base.read_bytes())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._base_key = None  # replaced mid-read; retried by refresh()
+            return
+        self.postings = data.get("postings", {})
+        self.version = data.get("version", -1)
+
+    def _replay(self) -> None:
+        try:
+            f = open(self.log, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if os.fstat(f.fileno()).st_size < self._log_pos:
+                self._base_key = None  # log was compacted; reload base
+                return
+            f.seek(self._log_pos)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # EOF or a line still being written
+                self._log_pos = f.tell()
+                delta = json.loads(line)
+                if delta["v"] <= self.version:
+                    continue  # already in the base
+                if delta["from"] != self.version:
+                    self._base_key = None  # gap; start over
+                    return
+                self._apply(delta)
+
+    def refresh(self, version: int) -> bool:
+        """Bring the in-memory index up to store *version*; False if it can't."""
+        with self._lock:
+            for _ in range(3):
+                if self.version == version:
+                    return True
+                if self._base_key is None or self._base_key != self._stat_key():
+                    self._load_base()
+                self._replay()
+            return self.version == version
+
+    # ------------------------------------------------------------------
+    #                              WRITING
+    # ------------------------------------------------------------------
+
+    def rebuild(self, version: int, items: Iterable[dict]) -> None:
+        """Index *items* from scratch as *version* (caller holds the store lock)."""
+        with self._lock:
+            self._reset(version)
+            self._docs = {}
+            for it in items:
+                if it.get("fp"):
+                    self._add(it["fp"], tokenize(it.get("text", "")))
+            self._write_base()
+
+    def _write_base(self) -> None:
+        self.base.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.base.with_name(self.base.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            postings = {tok: list(fps) for tok, fps in self.postings.items()}
+            json.dump({"version": self.version, "postings": postings}, f, ensure_ascii=False)
+        os.replace(tmp, self.base)
+        with open(self.log, "wb"):
+            pass
+        self._base_key = self._stat_key()
+        self._log_pos = 0
+
+    def sync(self, version: int, items: List[dict]) -> None:
+        """`VersionedStore.on_commit` hook: record what changed in *version*."""
+        with self._lock:
+            if not self.refresh(version - 1):
+                self.rebuild(version, items)
+                return
+            docs = self.docs()
+            current = {it["fp"]: it for it in items if it.get("fp")}
+            delta = {
+                "from": self.version,
+                "v": version,
+                "add": {fp: tokenize(it.get("text", "")) for fp, it in current.items() if fp not in docs},
+                "del": {fp: tokens for fp, tokens in docs.items() if fp not in current},
+            }
+            with open(self.log, "ab") as f:
+                f.write(json.dumps(delta, ensure_ascii=False).encode("utf-8") + b"\n")
+                self._log_pos = f.tell()
+            self._apply(delta)
+            if self._log_pos > _COMPACT_BYTES:
+                self._write_base()
+
+    # ------------------------------------------------------------------
+    #                              SEARCH
+    # ------------------------------------------------------------------
+
+    def _prefix(self, prefix: str) -> Set[str]:
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        out: Set[str] = set()
+        for i in range(bisect_left(self._vocab, prefix), len(self._vocab)):
+            tok = self._vocab[i]
+            if not tok.startswith(prefix):
+                break
+            out.update(self.postings[tok])
+        return out
+
+    def search(self, query: str) -> Set[str]:
+        """Fingerprints of facts containing every word of *query*."""
+        tokens = tokenize(query)
+        with self._lock:
+            result: Optional[Set[str]] = None
+            for i, tok in enumerate(tokens):
+                fps = self._prefix(tok) if i == len(tokens) - 1 else set(self.postings.get(tok, ()))
+                result = fps if result is None else result & fps
+                if not result:
+                    break
+            return result or set()
@@ -0,0 +1,339 @@
+# ghost/modules/tracing.py
+"""Per-turn latency tracing for the G.H.O.S.T. pipeline.
+
+Every interesting stage of a voice turn (wake-word mic hand-off, VAD end,
+denoise, WAV write, each transcription attempt, the intelligibility vote,
+embeddings, retrieval, summarisation, LLM time-to-first-token / total per
+attempt and retry back-off, fact extraction, memory writes, TTS first audio) is wrapped in a *span*:
+
+    with span("retrieve", k=k):
+        ...
+
+    @traced("embed")
+    def _embed(text): ...
+
+Spans are appended as one JSON object per line to a size-rotated trace file
+(`logging.handlers.RotatingFileHandler`). Each record carries the process
+session id, the turn id, the stage name, its duration and any extra
+attributes.
+
+The turn id is a context variable: `new_turn()` sets it where the turn is
+driven (the text loop, `VoiceSession`, replay), and work handed to another
+thread keeps the turn it was submitted in when wrapped with `bind(fn)`, so
+background analysis of turn 3 is not logged as turn 4.
+
+Disabled tracing (the default) costs one global check: `span()` hands back a
+shared no-op context manager and `traced` functions call straight through.
+While the sampling profiler runs (`profiler.py`), spans also keep a per-thread
+stack of open stage names so samples can be attributed to a stage
+(`current_stage`), whether or not tracing is enabled.
+
+Enable via config.json:
+    "tracing": {"enabled": true, "path": "logs/trace.jsonl",
+                "max_bytes": 5000000, "backups": 5}
+or the GHOST_TRACE=1 environment variable.
+
+Report (p50/p95/p99 per stage across all sessions in the trace files):
+    python -m ghost.modules.tracing [logs/trace.jsonl ...]
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import glob
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# ---------------------------------------------------------------------------
+#                                  STATE
+# ---------------------------------------------------------------------------
+
+DEFAULT_PATH = "logs/trace.jsonl"
+
+_enabled = False
+_logger = logging.getLogger("ghost.trace")
+_logger.propagate = False
+_session_id = uuid.uuid4().hex[:12]
+_turn_ids = itertools.count(1)
+_turn_id: contextvars.ContextVar[int] = contextvars.ContextVar("ghost_turn", default=0)
+_track = False
+_stage_gen = 0  # bumped by track_stages(); older spans neither pop nor show
+_stages: Dict[int, Tuple[int, List[str]]] = {}  # thread id → (generation, open span names, innermost last)
+
+
+def configure(
+    enabled: bool = False,
+    path: str = DEFAULT_PATH,
+    max_bytes: int = 5_000_000,
+    backups: int = 5,
+) -> None:
+    """(Re)configure tracing; called once from `openai_client` with config.json values."""
+    global _enabled
+    enabled = enabled or os.environ.get("GHOST_TRACE", "") not in ("", "0")
+    for h in list(_logger.handlers):
+        _logger.removeHandler(h)
+        h.close()
+    _enabled = enabled
+    if not enabled:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def track_stages(on: bool) -> None:
+    """Keep (or stop keeping) the per-thread stack of open span names.
+
+    Every call starts a new generation: spans still open from before it
+    neither pop nor report entries of the new one, so toggling while spans
+    are open can't misattribute a stage.
+    """
+    global _track, _stage_gen
+    _stage_gen += 1
+    _track = on
+    if not on:
+        _stages.clear()  # safe now: older spans' pops check the generation
+
+
+def current_stage(thread_id: int) -> str | None:
+    """Innermost open span on *thread_id*; None when not tracking or outside spans."""
+    entry = _stages.get(thread_id)
+    if entry is None or entry[0] != _stage_gen:
+        return None
+    stack = entry[1]
+    try:
+        return stack[-1] if stack else None
+    except IndexError:  # popped by its own thread meanwhile
+        return None
+
+
+def _push(stage: str) -> Optional[int]:
+    """Push *stage* on this thread's stack; the generation to pop with, or None."""
+    if not _track:
+        return None
+    gen, tid = _stage_gen, threading.get_ident()
+    entry = _stages.get(tid)
+    if entry is None or entry[0] != gen:
+        entry = _stages[tid] = (gen, [])
+    entry[1].append(stage)
+    return gen
+
+
+def _pop(gen: int) -> None:
+    entry = _stages.get(threading.get_ident())
+    if entry is not None and entry[0] == gen and entry[1]:
+        entry[1].pop()
+
+
+def new_turn() -> int:
+    """Start a new turn in the current context; its spans are tagged with the id."""
+    turn = next(_turn_ids)
+    _turn_id.set(turn)
+    return turn
+
+
+def current_turn() -> int:
+    return _turn_id.get()
+
+
+def bind(fn: Callable) -> Callable:
+    """*fn* run in a copy of the current context, i.e. under the current turn id.
+
+    Wrap work handed to another thread (executor jobs, worker threads) with
+    it at submit time.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+# ---------------------------------------------------------------------------
+#                                  SPANS
+# ---------------------------------------------------------------------------
+
+def record(stage: str, ms: float, **attrs) -> None:
+    """Write one finished span (use when start/end live in different places)."""
+    if not _enabled:
+        return
+    rec = {
+        "ts": round(time.time(), 3),
+        "sid": _session_id,
+        "turn": _turn_id.get(),
+        "stage": stage,
+        "ms": round(ms, 3),
+    }
+    if attrs:
+        rec.update(attrs)
+    _logger.info(json.dumps(rec, ensure_ascii=False, default=str))
+
+
+class _Span:
+    __slots__ = ("stage", "attrs", "_t0", "_gen")
+
+    def __init__(self, stage: str, attrs: dict):
+        self.stage = stage
+        self.attrs = attrs
+
+    def __enter__(self):
+        self._gen = _push(self.stage)
+        self._t0 = time.perf_counter()
+        return self
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._gen is not None:
+            _pop(self._gen)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record(self.stage, (time.perf_counter() - self._t0) * 1000, **self.attrs)
+        return False
+
+
+class _StageSpan:
+    """Stage bookkeeping only: profiling is on, trace logging is off."""
+
+    __slots__ = ("stage", "_gen")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._gen = _push(self.stage)
+        return self
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._gen is not None:
+            _pop(self._gen)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(stage: str, **attrs):
+    """Context manager timing *stage*; a shared no-op when tracing is off."""
+    if not _enabled:
+        return _StageSpan(stage) if _track else _NOOP
+    return _Span(stage, attrs)
+
+
+def traced(stage: str) -> Callable:
+    """Decorator form of `span` for whole functions."""
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled and not _track:
+                return fn(*args, **kwargs)
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------------------------------------------------------------------------
+#                                 REPORT
+# ---------------------------------------------------------------------------
+
+def _percentile(sorted_vals: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    idx = max(0, min(len(sorted_vals) - 1, math.ceil(p / 100 * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+
+def load_spans(paths: Iterable[str]) -> Iterable[dict]:
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        except OSError:
+            continue
+
+
+def summarize(spans: Iterable[dict]) -> Dict[str, dict]:
+    by_stage: Dict[str, List[float]] = {}
+    sessions = set()
+    for s in spans:
+        by_stage.setdefault(s["stage"], []).append(float(s["ms"]))
+        sessions.add(s.get("sid"))
+    out: Dict[str, dict] = {}
+    for stage, vals in by_stage.items():
+        vals.sort()
+        out[stage] = {
+            "n": len(vals),
+            "p50": _percentile(vals, 50),
+            "p95": _percentile(vals, 95),
+            "p99": _percentile(vals, 99),
+            "max": vals[-1],
+        }
+    out["_sessions"] = {"n": len(sessions)}
+    return out
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Per-stage latency percentiles from G.H.O.S.T. trace files.")
+    ap.add_argument("paths", nargs="*", help=f"trace files (default: {DEFAULT_PATH}*)")
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = ap.parse_args(argv)
+
+    paths = args.paths or sorted(glob.glob(DEFAULT_PATH + "*"))
+    stats = summarize(load_spans(paths))
+    sessions = stats.pop("_sessions")["n"]
+    if not stats:
+        print("⚠️ No spans found.", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return 0
+
+    print(f"📊 {sum(s['n'] for s in stats.values())} spans across {sessions} session(s) "
+          f"from {len(paths)} file(s)\n")
+    width = max(len(k) for k in stats)
+    print(f"{'stage':<{width}}  {'n':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  {'max ms':>9}")
+    for stage in sorted(stats, key=lambda k: -stats[k]["p50"]):
+        s = stats[stage]
+        print(f"{stage:<{width}}  {s['n']:>6}  {s['p50']:>9.1f}  {s['p95']:>9.1f}  {s['p99']:>9.1f}  {s['max']:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 import os
 from ghost.modules.openai_client import config
+from ghost.modules.tracing import span
+from ghost.modules.replay import current_recorder, foreground
 client = config.client
 
 model_transcribe = config.get("model_transcribe", "gpt-4o-transcribe")
@@ -9,13 +11,16 @@ def transcribe_audio(file_path="audio/input.wav"):
         print("⚠️ Empty or missing audio file. Please record something first.")
         return ""
 
+    if rec := current_recorder():
+        rec.note_audio(file_path)
+
     languages = ["he", "en", "ru"]  # fallback sequence
     result_text = ""
 
     for lang in languages:
         print(f"🧠 Transcribing (language: {lang})...")
         try:
-            with open(file_path, "rb") as audio_file:
+            with span("transcribe", lang=lang), foreground(), open(file_path, "rb") as audio_file:
                 result = client.audio.transcriptions.create(
                     model=model_transcribe,
                     file=audio_file,
@@ -20,7 +20,10 @@ The algorithm now follows three tiers that trade speed for accuracy:
 3. **One‑token LLM vote (fallback)** — Delegates the final verdict to a cheap
    OpenAI model (configurable, default *gpt‑3.5‑turbo*). This guarantees very
    low false‑negatives at the cost of a tiny latency hit. If the API call
-   fails, we default to *accept* to avoid blocking the UX.
+   fails, we default to *accept* to avoid blocking the UX. Votes are
+   memoised per text (LRU) for `verdict_ttl_sec` (default one week), and
+   warm_state.py carries them across restarts; after that the model is
+   asked again.
 
 Empirically the new pipeline keeps >99 % of valid user sentences while still
 rejecting >95 % of random garbage generated during hot‑mic glitches.
@@ -29,11 +32,14 @@ rejecting >95 % of random garbage generated during hot‑mic glitches.
 from __future__ import annotations
 
 import re
-from functools import lru_cache
+import threading
+import time
+from collections import OrderedDict
 from statistics import mean
-from typing import Final
+from typing import Dict, Final, List, Optional
 
 from ghost.modules.openai_client import config
+from ghost.modules.tracing import span
 
 client = config.client
 
@@ -77,9 +83,52 @@ def _looks_like_row_mash(txt: str) -> bool:
     return False
 
 
-@lru_cache(maxsize=4096)
+_SCORE_CACHE_SIZE: Final = 4096
+_VERDICT_TTL: Final = config.get("verdict_ttl_sec", 7 * 24 * 3600)
+_scores: "OrderedDict[str, float]" = OrderedDict()   # heuristic score per text
+_verdicts: "OrderedDict[str, tuple]" = OrderedDict()  # (LLM vote, time.time()) per text
+_cache_lock = threading.Lock()
+
+
+def _remember(cache: OrderedDict, key: str, value) -> None:
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > _SCORE_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _recall(cache: OrderedDict, key: str):
+    """Cached value for *key* (None if absent), marked most recently used."""
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cached_verdict(txt: str) -> Optional[bool]:
+    hit = _recall(_verdicts, txt)
+    if hit is None:
+        return None
+    verdict, t = hit
+    if time.time() - t > _VERDICT_TTL:
+        with _cache_lock:
+            _verdicts.pop(txt, None)
+        return None
+    return verdict
+
+
 def _heuristic_score(txt: str) -> float:
-    """Returns 0–1 score where **1=very intelligible**, **0=noise**."""
+    """Returns 0–1 score where **1=very intelligible**, **0=noise** (memoised)."""
+    score = _recall(_scores, txt)
+    if score is None:
+        score = _score(txt)
+        _remember(_scores, txt, score)
+    return score
+
+
+def _score(txt: str) -> float:
     length = len(txt)
     if length == 0:
         return 0.0
@@ -135,25 +184,51 @@ def looks_intelligible(text: str) -> bool:  # noqa: C901 – complexity fine her
         return False
 
     # --- 3. fallback LLM vote -------------------------------------------------
+    verdict = _cached_verdict(txt)
+    if verdict is not None:
+        return verdict
     try:
-        resp = client.chat.completions.create(
-            model=_VALID_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Answer YES if the following USER text is a meaningful, coherent sentence or question "
-                        "in *any* language. Answer NO if it's mostly random characters, gibberish, or unclear."
-                    ),
-                },
-                {"role": "user", "content": txt},
-            ],
-            max_tokens=1,
-            temperature=0,
-        )
+        with span("intelligible_llm"):
+            resp = client.chat.completions.create(
+                model=_VALID_MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": (
+                            "Answer YES if the following USER text is a meaningful, coherent sentence or question "
+                            "in *any* language. Answer NO if it's mostly random characters, gibberish, or unclear."
+                        ),
+                    },
+                    {"role": "user", "content": txt},
+                ],
+                max_tokens=1,
+                temperature=0,
+            )
         answer = (resp.choices[0].message.content or "").strip().upper()
-        return answer.startswith("Y")
+        verdict = answer.startswith("Y")
+        _remember(_verdicts, txt, (verdict, time.time()))
+        return verdict
     except Exception:
         # Fail‑open: better to accept than to block the flow due to network hiccup
         return True
 
+
+# ---------------------------------------------------------------------------
+#                 ── 4. CACHE STATE (warm restart) ──
+# ---------------------------------------------------------------------------
+
+def verdict_cache_state() -> Dict[str, List[list]]:
+    """Memoised scores / LLM votes as JSON-able rows (see warm_state.py)."""
+    with _cache_lock:
+        return {"scores": [[k, v] for k, v in _scores.items()],
+                "verdicts": [[k, v, t] for k, (v, t) in _verdicts.items()]}
+
+
+def restore_verdict_cache(state: Dict[str, List[list]]) -> None:
+    now = time.time()
+    for k, v in state.get("scores", ()):
+        _remember(_scores, k, float(v))
+    for k, v, t in state.get("verdicts", ()):
+        if now - t <= _VERDICT_TTL:
+            _remember(_verdicts, k, (bool(v), float(t)))
+
@@ -0,0 +1,401 @@
+# ghost/modules/warm_state.py
+"""Warm-state snapshot for fast restarts.
+
+After a restart G.H.O.S.T. rebuilt everything from scratch: it parsed the
+whole memory store and every embedding in it, re-embedded "user memory" for
+the session seed, lost the short-term conversation and its rolling summary,
+and re-learnt the intelligibility verdicts. This module saves all of that and
+loads it back with one memory-mapped read per file.
+
+1. **Two files** – ``<store>.warm`` holds the memory index
+   (`memory.index_state`); ``<store>.warm.session`` holds the embedding caches
+   (retrieval query memo, rescoring vectors), the verdict caches
+   (`utils.verdict_cache_state`) and the tracked conversation with its
+   summary. Each is a JSON header followed by 64-byte aligned NumPy arrays,
+   and `read_file` maps it once and copies them out.
+2. **Write only what changed** – the index file (hundreds of MB on a large
+   store) is rewritten only when the store version moves; the small session
+   file follows every turn.
+3. **Versioning + staleness** – the header carries `FORMAT`; a file from
+   another format is ignored. The index is used as is only if the store is
+   still at the saved version, snapshot file, backend and precision. An older
+   index is kept as the base for the next rebuild, so only new facts are
+   parsed. The conversation is dropped once it is older than
+   `conversation_ttl`.
+4. **When** – `start()` saves every `interval` seconds (only if something
+   changed) and once more at clean shutdown.
+
+    python -m ghost.modules.warm_state bench --n 20000
+    python -m ghost.modules.warm_state info
+
+Configured through config.json (all optional):
+    "warm_state": {"path": "ghost/memory_store.jsonl.warm", "interval": 120,
+                   "conversation_ttl": 900, "enabled": true}
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ghost.modules import memory, utils
+from ghost.modules.conversation import Conversation
+from ghost.modules.openai_client import config
+from ghost.modules.retrieval_cache import get_retrieval_cache
+
+FORMAT = 2
+_MAGIC = b"GHOSTWRM"
+_ALIGN = 64
+_PREFIX = struct.Struct("<8sQ")  # magic, header length
+
+
+def _cfg() -> dict:
+    return config.get("warm_state", {})
+
+
+def default_path() -> Path:
+    return Path(_cfg().get("path", str(memory.DB_FILE) + ".warm"))
+
+
+def session_path(path: Path) -> Path:
+    """The conversation / cache file saved next to the index file *path*."""
+    return path.with_name(path.name + ".session")
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+# ---------------------------------------------------------------------------
+#                                FILE FORMAT
+# ---------------------------------------------------------------------------
+
+def write_file(path: Path, header: dict, arrays: Dict[str, np.ndarray]) -> int:
+    """Write *header* + *arrays* atomically; returns the file size."""
+    layout, offset = {}, 0
+    arrays = {k: np.ascontiguousarray(a) for k, a in arrays.items()}
+    for name, a in arrays.items():
+        offset = _align(offset)
+        layout[name] = {"offset": offset, "dtype": a.dtype.str, "shape": list(a.shape)}
+        offset += a.nbytes
+    header = {**header, "format": FORMAT, "arrays": layout}
+    raw = json.dumps(header, ensure_ascii=False).encode()
+    base = _align(_PREFIX.size + len(raw))
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(_MAGIC, len(raw)))
+        f.write(raw)
+        for name, a in arrays.items():
+            f.write(b"\0" * (base + layout[name]["offset"] - f.tell()))
+            f.write(memoryview(a).cast("B"))
+        size = f.tell()
+    os.replace(tmp, path)
+    return size
+
+
+def read_file(path: Path) -> Optional[Tuple[dict, Dict[str, np.ndarray]]]:
+    """Map *path* once and copy its arrays out; None if missing or another format."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, n = _PREFIX.unpack_from(mm, 0)
+        if magic != _MAGIC:
+            return None
+        header = json.loads(mm[_PREFIX.size:_PREFIX.size + n])
+        if header.get("format") != FORMAT:
+            return None
+        base = _align(_PREFIX.size + n)
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            shape = tuple(spec["shape"])
+            view = np.frombuffer(mm, dtype=np.dtype(spec["dtype"]), count=int(np.prod(shape)),
+                                 offset=base + spec["offset"])
+            arrays[name] = view.reshape(shape).copy()  # own the data so the map can close
+            del view
+        return header, arrays
+    finally:
+        mm.close()
+
+
+# ---------------------------------------------------------------------------
+#                              SAVE / RESTORE
+# ---------------------------------------------------------------------------
+
+_tracked: Optional[Conversation] = None
+_save_lock = threading.Lock()
+_last_signature: Optional[tuple] = None
+_saved_index: Optional[Tuple[Path, int]] = None  # index file on disk and its store version
+
+
+def track(conversation: Conversation) -> None:
+    """Make *conversation* the one saved with the warm state."""
+    global _tracked
+    _tracked = conversation
+
+
+def _signature() -> tuple:
+    """Changes whenever the session file is worth rewriting (every turn does)."""
+    convo = _tracked
+    return (
+        id(convo), convo.window() if convo is not None else None,
+        tuple(get_retrieval_cache().stats.to_dict().values()),
+    )
+
+
+def _changed(path: Path) -> bool:
+    return _signature() != _last_signature or _saved_index != (path, memory.store_version())
+
+
+def save(path: Path | None = None) -> int:
+    """Write the warm state now; returns the bytes written.
+
+    The index file is rewritten only if the store version moved since it was
+    last saved (or restored); the session file is always written.
+    """
+    global _last_signature, _saved_index
+    path = path or default_path()
+    with _save_lock:
+        written = 0
+        if _saved_index != (path, memory.store_version()) or not path.exists():
+            meta, mem = memory.index_state()
+            written += write_file(path, {"saved_at": time.time(), "memory": meta},
+                                  {f"memory.{k}": v for k, v in mem.items()})
+            _saved_index = (path, meta["version"])
+
+        signature = _signature()
+        header = {"saved_at": time.time(), "backend": memory.get_backend().name,
+                  "verdicts": utils.verdict_cache_state()}
+        arrays = {}
+        for name, (keys, vecs) in (("memo", get_retrieval_cache().memo_state()),
+                                   ("vec_cache", memory.vec_cache_state())):
+            if keys:
+                header[name] = keys
+                arrays[name] = vecs
+        if _tracked is not None:
+            header["conversation"] = _tracked.state()
+        written += write_file(session_path(path), header, arrays)
+        _last_signature = signature
+        return written
+
+
+def restore(path: Path | None = None) -> Optional[Conversation]:
+    """Load the warm state into the running modules.
+
+    Returns the saved conversation if it is recent enough to resume, else
+    None. Never raises: a bad or missing file just means a cold start.
+    """
+    global _saved_index
+    path = path or default_path()
+    t0 = time.perf_counter()
+    try:
+        state = "no index"
+        loaded = read_file(path)
+        if loaded is not None:
+            header, arrays = loaded
+            mem = {k.split(".", 1)[1]: v for k, v in arrays.items() if k.startswith("memory.")}
+            if memory.restore_index(header["memory"], mem):
+                state = "fresh"
+                with _save_lock:
+                    _saved_index = (path, header["memory"]["version"])  # already on disk
+            else:
+                state = "stale index"
+
+        convo = None
+        loaded = read_file(session_path(path))
+        if loaded is not None:
+            header, arrays = loaded
+            utils.restore_verdict_cache(header.get("verdicts", {}))
+            backend = header.get("backend")
+            if "memo" in arrays:
+                get_retrieval_cache().restore_memo(backend, header["memo"], arrays["memo"])
+            if "vec_cache" in arrays:
+                memory.restore_vec_cache(backend, header["vec_cache"], arrays["vec_cache"])
+            ttl = _cfg().get("conversation_ttl", 900)
+            if "conversation" in header and time.time() - header["saved_at"] <= ttl:
+                convo = Conversation.from_state(header["conversation"])
+        print(f"♻️ Warm state loaded ({state}) in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        return convo
+    except Exception as e:
+        print(f"⚠️ Warm state ignored: {e}")
+        return None
+
+
+def _loop(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            if _changed(default_path()):
+                save()
+        except Exception as e:
+            print(f"❌ Warm state save failed: {e}")
+
+
+_started = False
+
+
+def start() -> None:
+    """Save periodically in the background and once more at clean shutdown."""
+    global _started
+    if _started or not _cfg().get("enabled", True):
+        return
+    _started = True
+    threading.Thread(target=_loop, args=(_cfg().get("interval", 120),), name="ghost-warm-state",
+                     daemon=True).start()
+    atexit.register(_save_at_exit)
+
+
+def _save_at_exit() -> None:
+    try:
+        save()
+    except Exception as e:
+        print(f"❌ Warm state save failed: {e}")
+
+
+# ---------------------------------------------------------------------------
+#                               BENCHMARK
+# ---------------------------------------------------------------------------
+
+_PROBE_QUERY = "what do you remember about my sister?"
+
+
+def _probe(warm: bool) -> dict:
+    """Start → context ready for the first message (all work before the LLM call)."""
+    from ghost.modules.context_manager import build_context
+
+    t0 = time.perf_counter()
+    convo = restore() if warm else None
+    t_restore = time.perf_counter()
+    if convo is None:
+        convo = Conversation(get_retrieval_cache().retrieve("user memory"))
+    build_context(_PROBE_QUERY, convo)
+    t1 = time.perf_counter()
+    return {"restore_ms": round((t_restore - t0) * 1000, 1), "first_context_ms": round((t1 - t0) * 1000, 1)}
+
+
+def _make_store(n: int) -> None:
+    """Synthetic store with *n* facts embedded by the configured backend."""
+    backend = memory.get_backend()
+    dim = backend.embed(["probe"]).shape[1]
+    rng = np.random.default_rng(0)
+    now = time.time()
+
+    def fill(items: List[dict]) -> bool:
+        for i in range(n):
+            v = rng.standard_normal(dim).astype(np.float32)
+            items.append(memory.MemoryItem({
+                "t": now - i, "text": f"synthetic fact {i}", "fp": f"synthetic fact {i}",
+                "slot": "OTHER", "b": backend.name, "v": (v / np.linalg.norm(v)).round(6).tolist(),
+            }))
+        return True
+
+    memory._write(fill)
+
+
+def bench(n: int, runs: int = 3) -> Dict[str, dict]:
+    """Cold vs warm time to first context, each in a fresh interpreter."""
+    import subprocess
+    import tempfile
+
+    root = Path(__file__).resolve().parents[2]
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg = json.loads(Path("config.json").read_text("utf-8"))
+        cfg.update({"memory_store_path": str(Path(tmp) / "store.jsonl"),
+                    "warm_state": {"path": str(Path(tmp) / "store.jsonl.warm")}})
+        Path(tmp, "config.json").write_text(json.dumps(cfg), "utf-8")
+
+        def run(*args: str) -> dict:
+            env = {**os.environ, "PYTHONPATH": str(root)}
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable, "-m", "ghost.modules.warm_state", *args], cwd=tmp, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            res = json.loads(out.strip().splitlines()[-1])
+            res["process_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            return res
+
+        run("_make", str(n))
+        results: Dict[str, List[dict]] = {"cold": [], "warm": []}
+        for _ in range(runs):
+            Path(tmp, "store.jsonl.warm").unlink(missing_ok=True)
+            session_path(Path(tmp, "store.jsonl.warm")).unlink(missing_ok=True)
+            results["cold"].append(run("_probe", "cold"))
+            run("_save")
+            results["warm"].append(run("_probe", "warm"))
+        size = sum(p.stat().st_size for p in (Path(tmp, "store.jsonl.warm"),
+                                              session_path(Path(tmp, "store.jsonl.warm"))))
+    summary = {k: {m: round(float(np.median([r[m] for r in rs])), 1) for m in rs[0]} for k, rs in results.items()}
+    summary["warm"]["file_mb"] = round(size / 2**20, 1)
+    return summary
+
+
+def main(argv: List[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="G.H.O.S.T. warm-state snapshot.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("save", help="write the warm state now")
+    sub.add_parser("info", help="describe the saved warm state")
+    b = sub.add_parser("bench", help="cold vs warm time to first context on a synthetic store")
+    b.add_argument("--n", type=int, default=20_000)
+    b.add_argument("--runs", type=int, default=3)
+    for hidden in ("_make", "_probe", "_save"):  # bench helpers, run in a subprocess
+        p = sub.add_parser(hidden)
+        p.add_argument("arg", nargs="?")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "save":
+        print(f"✅ Warm state: {save() / 2**20:.1f} MB → {default_path()}")
+    elif args.cmd == "info":
+        index, session = read_file(default_path()), read_file(session_path(default_path()))
+        if index is None and session is None:
+            print("⚠️ אין warm state שמור.")
+            return 1
+        for loaded in (index, session):
+            if loaded is None:
+                continue
+            header, arrays = loaded
+            age = time.time() - header["saved_at"]
+            if "memory" in header:
+                mem = header["memory"]
+                print(f"index: format {header['format']}, saved {age:.0f}s ago, store v{mem['version']} "
+                      f"(now v{memory._store.version()}), {len(mem['items'])} facts, "
+                      f"{mem['backend']} / {mem['kind']}")
+            else:
+                turns = len(header.get("conversation", {}).get("ring", ()))
+                print(f"session: format {header['format']}, saved {age:.0f}s ago, "
+                      f"{turns} verbatim messages, {len(header.get('verdicts', {}))} verdict caches")
+            for name, a in arrays.items():
+                print(f"  {name:<18} {a.dtype} {a.shape}")
+    elif args.cmd == "bench":
+        for kind, row in bench(args.n, args.runs).items():
+            print(f"{kind:<5} " + "  ".join(f"{k}={v}" for k, v in row.items()))
+    elif args.cmd == "_make":
+        _make_store(int(args.arg))
+        print("{}")
+    elif args.cmd == "_probe":
+        print(json.dumps(_probe(args.arg == "warm")))
+    elif args.cmd == "_save":
+        track(Conversation(get_retrieval_cache().retrieve("user memory")))
+        save()
+        print("{}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
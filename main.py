@@ -1,9 +1,9 @@
 # main.py
 import json
 import struct
-import time
 import os
-from datetime import datetime, timedelta
+import time
+from functools import partial
 
 import pyaudio
 import pvporcupine
@@ -11,8 +11,13 @@ import pvporcupine
 from ghost.modules.chat_engine import stream_chat
 from ghost.modules.transcribe import transcribe_audio
 from ghost.modules.audio_capture import capture_audio as wait_for_voice
-from ghost.modules.speak import speak
-from ghost.modules.memory import retrieve, extract_fact, replace_or_add_fact
+from ghost.modules.speak import speak, stop_speaking
+from ghost.modules.playback import get_player
+from ghost.modules.session import VoiceSession
+from ghost.modules.conversation import Conversation
+from ghost.modules import profiler, tracing, warm_state
+from ghost.modules.retrieval_cache import get_retrieval_cache
+from ghost.modules.memory_analysis import get_analyzer
 
 # ── CONFIGURATION ────────────────────────────────────────────────
 MODE = "text"  # "voice" or "text"
@@ -41,11 +46,13 @@ def wait_for_wakeword(keyword_path: str, access_key: str):
         frames_per_buffer=porcupine.frame_length
     )
     print("…listening for wake word…", end="", flush=True)
+    detected_at = None
     try:
         while True:
             pcm = stream.read(porcupine.frame_length, exception_on_overflow=False)
             pcm_unpacked = struct.unpack_from("h" * porcupine.frame_length, pcm)
             if porcupine.process(pcm_unpacked) >= 0:
+                detected_at = time.perf_counter()
                 print("\n🔔 Wake word detected!\n")
                 break
     finally:
@@ -53,9 +60,12 @@ def wait_for_wakeword(keyword_path: str, access_key: str):
         stream.close()
         pa.terminate()
         porcupine.delete()
+        if detected_at is not None:
+            # Detection → microphone released for capture (not detection latency)
+            tracing.record("wake_handoff", (time.perf_counter() - detected_at) * 1000)
 
 
-def handle_interaction(user_text: str, conversation: list[dict]):
+def handle_interaction(user_text: str, conversation: Conversation):
     if user_text.strip() in STOP_PHRASES:
         if MODE == "voice":
             speak("בשמחה. עד הפעם הבאה.")
@@ -70,131 +80,78 @@ def handle_interaction(user_text: str, conversation: list[dict]):
         response_text += chunk
 
     if MODE == "voice":
-        speak(response_text)
-
-    conversation.append({"role": "user", "content": user_text})
-    conversation.append({"role": "assistant", "content": response_text})
-
-    # <<< שינינו כאן כדי לבדוק האם באמת נוספה זיכרון חדש >>>
-    fact = extract_fact(user_text, response_text)
-    if fact:
-        added = replace_or_add_fact(fact)   # מחזיר True אם המערכת הוסיפה/החליפה
-        if added:
-            print(f"\n📌 New fact: {fact}")
+        # Non-blocking: the next capture starts while the reply is playing and
+        # cuts it off (barge-in) as soon as the user speaks.
+        speak(response_text, wait=False)
 
+    # stream_chat records the turn in *conversation* and queues fact extraction
     return True
 
-    if user_text.strip() in STOP_PHRASES:
-        if MODE == "voice":
-            speak("בשמחה. עד הפעם הבאה.")
-        else:
-            print("🧠 סיום שיחה.")
-        return False
-
-    response_text = ""
-    print("🤖 ", end="", flush=True)
-    for chunk in stream_chat(user_text, conversation):
-        print(chunk, end="", flush=True)
-        response_text += chunk
-
-    if MODE == "voice":
-        speak(response_text)
-
-    conversation.append({"role": "user", "content": user_text})
-    conversation.append({"role": "assistant", "content": response_text})
-
-    fact = extract_fact(user_text, response_text)
-    if fact:
-        print(f"\n📌 New fact: {fact}")
-        replace_or_add_fact(fact)
-
-    return True
-
-    if user_text.strip() in STOP_PHRASES:
-        if MODE == "voice":
-            speak("בשמחה. עד הפעם הבאה.")
-        else:
-            print("🧠 סיום שיחה.")
-        return False
-
-    response_text = ""
-    print("🤖 ", end="", flush=True)
-    for chunk in stream_chat(user_text, conversation):
-        print(chunk, end="", flush=True)
-        response_text += chunk
-
-    if MODE == "voice":
-        speak(response_text)
+def new_conversation(restored: list) -> Conversation:
+    """The conversation resumed from warm state (first call only), else a fresh one."""
+    conversation = restored.pop() if restored else Conversation(get_retrieval_cache().retrieve("user memory"))
+    warm_state.track(conversation)
+    return conversation
 
-    conversation.append({"role": "user", "content": user_text})
-    conversation.append({"role": "assistant", "content": response_text})
+# ── MAIN LOOP ───────────────────────────────────────────────────
+def run_voice(restored: list):
+    if not ACCESS_KEY or not os.path.isfile(KEYWORD_PATH):
+        raise RuntimeError("Porcupine config missing.")
+
+    def on_wake():
+        wait_for_wakeword(KEYWORD_PATH, ACCESS_KEY)
+        print("…entering conversation mode…")
+
+    # Defer memory analysis while a reply is playing
+    get_analyzer().busy = lambda: get_player().busy
+
+    session = VoiceSession(
+        wait_for_wake=on_wake,
+        # Louder / longer trigger while our own reply plays (echo gate)
+        listen=partial(wait_for_voice, playing=lambda: get_player().busy),
+        transcribe=transcribe_audio,
+        respond=stream_chat,
+        speak=lambda text: speak(text, wait=False),
+        wait_speaking=get_player().wait,
+        stop_speaking=stop_speaking,
+        new_conversation=lambda: new_conversation(restored),
+        stop_phrases=STOP_PHRASES,
+        silence_timeout=SILENCE_TIMEOUT_SEC,
+    )
+    try:
+        session.run()
+    except KeyboardInterrupt:
+        print("\n🛑 Exiting.")
 
-    fact = extract_fact(user_text, response_text)
-    if fact:
-        print(f"\n📌 New fact: {fact}")
-        replace_or_add_fact(fact)
 
-    return True
-    # Process chat
-    response_text = ""
-    for chunk in stream_chat(user_text, conversation):
-        print(chunk, end="", flush=True)
-        response_text += chunk
+def run():
+    # Index, caches and an interrupted conversation from the last run (warm_state.py)
+    restored = [c for c in [warm_state.restore()] if c is not None]
+    warm_state.start()
+    # Sampling profiler: SIGUSR2 / `/profile` on stdin / loopback socket (profiler.py)
+    profiler.install(stdin=MODE == "voice")
 
     if MODE == "voice":
-        speak(response_text)
-        
-    
-
-    # Update memory
-    conversation.append({"role": "user", "content": user_text})
-    conversation.append({"role": "assistant", "content": response_text})
-
-    fact = extract_fact(user_text, response_text)
-    if fact:
-        print(f"\n📌 New fact: {fact}")
-        replace_or_add_fact(fact)
+        run_voice(restored)
+        return
 
-    return True
-
-# ── MAIN LOOP ───────────────────────────────────────────────────
-def run():
     while True:
-        if MODE == "voice":
-            if not ACCESS_KEY or not os.path.isfile(KEYWORD_PATH):
-                raise RuntimeError("Porcupine config missing.")
-            wait_for_wakeword(KEYWORD_PATH, ACCESS_KEY)
-            print("…entering conversation mode…")
-
-        conversation = retrieve("user memory")
-        last_input = datetime.now()
+        conversation = new_conversation(restored)
         in_conversation = True
 
         while in_conversation:
-            if MODE == "voice":
-                audio_path = wait_for_voice()
-                now = datetime.now()
-                if audio_path:
-                    last_input = now
-                    user_text = transcribe_audio(audio_path)
-                    if not user_text:
-                        continue
-                    in_conversation = handle_interaction(user_text, conversation)
-                elif (now - last_input) > timedelta(seconds=SILENCE_TIMEOUT_SEC):
-                    speak("נראה שהשיחה נסתיימה. הפעם הבאה!")
-                    break
-                else:
-                    time.sleep(0.1)
-
-            elif MODE == "text":
-                try:
-                    user_text = input("\n👤 ")
-                    if user_text.strip() == "":
-                        continue
-                    in_conversation = handle_interaction(user_text, conversation)
-                except KeyboardInterrupt:
-                    print("\n🛑 Exiting.")
-                    return
+            try:
+                user_text = input("\n👤 ")
+                if user_text.strip() == "":
+                    continue
+                if (reply := profiler.handle_console(user_text)) is not None:
+                    print(reply)
+                    continue
+                tracing.new_turn()
+                in_conversation = handle_interaction(user_text, conversation)
+            except KeyboardInterrupt:
+                print("\n🛑 Exiting.")
+                return
 
         print("…waiting for next interaction…")
 